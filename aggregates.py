@@ -0,0 +1,119 @@
+"""Agregados incrementais dos resultados exibidos no painel.
+
+``RunningAggregates`` é atualizado uma vez por resultado (``add``) e guarda
+contadores por status, intenção, sistema e prioridade, contadores por
+janela de tempo, um histograma logarítmico de latência (percentis sem
+guardar as amostras) e o índice dos tickets escalados. Ler o painel custa o
+número de grupos e faixas, não o número de resultados acumulados.
+"""
+
+# Imports de bibliotecas padrão para relógio, faixas do histograma e janelas de tempo
+import bisect
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+# Largura (s) de cada janela de contagem e quantas janelas recentes ficam na memória
+AGGREGATE_BUCKET_SECONDS = int(os.getenv("AGGREGATE_BUCKET_SECONDS", "60"))
+AGGREGATE_MAX_BUCKETS = int(os.getenv("AGGREGATE_MAX_BUCKETS", "120"))
+
+OUTCOMES = ("resolved", "escalated", "errors", "other")
+
+def outcome(status: str) -> str:
+    """Classe do status final: resolvido, escalado (inclui ``Escalado - Erro``), erro ou outro."""
+    if status == "Resolvido":
+        return "resolved"
+    if status.startswith("Escalado"):
+        return "escalated"
+    if status == "Erro":
+        return "errors"
+    return "other"
+
+def _counter() -> Dict[str, int]:
+    return {"total": 0, **{name: 0 for name in OUTCOMES}}
+
+class LatencyHistogram:
+    """Histograma com faixas geométricas de 10% (1 ms a ~10 min); memória e leitura constantes."""
+
+    def __init__(self, smallest_ms: float = 1.0, growth: float = 1.1, bins: int = 140):
+        self.bounds = [smallest_ms * growth ** i for i in range(bins)]
+        self.counts = [0] * (bins + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil ``p`` interpolado dentro da faixa que o contém (None sem amostras)."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank:
+                if index >= len(self.bounds):
+                    return self.max_ms
+                low = self.bounds[index - 1] if index else 0.0
+                value = low + (self.bounds[index] - low) * (rank - seen) / count
+                return min(value, self.max_ms)
+            seen += count
+        return self.max_ms
+
+class RunningAggregates:
+    """Contadores do painel mantidos resultado a resultado."""
+
+    def __init__(self, bucket_seconds: int = AGGREGATE_BUCKET_SECONDS, max_buckets: int = AGGREGATE_MAX_BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_buckets
+        self.totals = _counter()
+        self.by_status: Dict[str, int] = {}
+        self.by_intent: Dict[str, Dict[str, int]] = {}
+        self.by_system: Dict[str, Dict[str, int]] = {}
+        self.by_priority: Dict[str, Dict[str, int]] = {}
+        self.latency = LatencyHistogram()
+        self.buckets: "OrderedDict[int, Dict[str, int]]" = OrderedDict()
+        # Posições dos escalados na lista de resultados (a aba de escalados não filtra tudo de novo)
+        self.escalated: List[int] = []
+
+    def add(self, result: Dict[str, Any], latency_ms: Optional[float] = None, at: Optional[float] = None) -> None:
+        """Contabiliza um resultado (``status``, ``intent``, ``system`` e ``priority``)."""
+        kind = outcome(result.get("status", ""))
+        if kind == "escalated":
+            self.escalated.append(self.totals["total"])
+        for counter in (
+            self.totals,
+            self.by_intent.setdefault(result.get("intent") or "N/A", _counter()),
+            self.by_system.setdefault(result.get("system") or "N/A", _counter()),
+            self.by_priority.setdefault(result.get("priority") or "N/A", _counter()),
+            self._bucket(at if at is not None else time.time()),
+        ):
+            counter["total"] += 1
+            counter[kind] += 1
+        status = result.get("status", "Desconhecido")
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        if latency_ms is not None:
+            self.latency.add(latency_ms)
+
+    def _bucket(self, at: float) -> Dict[str, int]:
+        start = int(at // self.bucket_seconds * self.bucket_seconds)
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = _counter()
+            # Resultados chegam em ordem de tempo: a janela mais antiga é a primeira
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return bucket
+
+    def timeline(self) -> List[Dict[str, Any]]:
+        """Contagens por janela de tempo, da mais antiga para a mais recente."""
+        return [{"start": start, **counts} for start, counts in self.buckets.items()]
+
+    def percentiles(self, ps: Sequence[float] = (50, 95, 99)) -> Dict[str, Optional[float]]:
+        return {f"p{p:g}": self.latency.percentile(p) for p in ps}
@@ -0,0 +1,306 @@
+"""API HTTP assíncrona de ingestão e processamento de tickets.
+
+Servidor mínimo sobre ``asyncio.start_server`` (sem dependências extras) que
+recebe tickets de um helpdesk externo e os executa no grafo compilado em um
+pool de workers compartilhado.
+
+Rotas:
+    POST /tickets           ticket único, lista ou ``{"tickets": [...]}``;
+                            ``?wait=true`` responde com o resultado (200),
+                            senão devolve um job (202) para consulta posterior
+    GET  /jobs/{job_id}     estado e resultados de um job
+    GET  /health            situação do serviço e da fila
+
+Quando a fila atinge ``API_MAX_QUEUE`` tickets, novas requisições recebem 429
+com ``Retry-After``.
+
+Exemplo:
+    python api.py --port 8080
+    curl -X POST "localhost:8080/tickets?wait=true" -d @ticket.json
+"""
+
+# Imports de bibliotecas padrão para servidor assíncrono, pool de threads e JSON
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from graph import build_graph, wait_deferred_diagnoses
+from main import process_ticket, summarize_result
+import results_store
+from resilience import TICKET_DEADLINE_SECONDS
+from tools import email_service
+from tools.ticket_features import attach_features
+
+# Workers que executam o grafo (compartilhados entre todas as requisições)
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+
+# Tickets aceitos e ainda não concluídos antes de responder 429
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "100"))
+
+# Espera máxima de uma requisição síncrona antes de cair para job assíncrono
+API_SYNC_TIMEOUT = float(os.getenv("API_SYNC_TIMEOUT", str(TICKET_DEADLINE_SECONDS)))
+
+# Tempo que jobs concluídos ficam disponíveis para consulta
+API_JOB_TTL = float(os.getenv("API_JOB_TTL", "3600"))
+
+# Tamanho máximo do corpo da requisição, em bytes
+API_MAX_BODY = int(os.getenv("API_MAX_BODY", str(1024 * 1024)))
+
+_REQUIRED_FIELDS = ["id", "requester", "title", "description"]
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+class BadRequest(ValueError):
+    """Corpo ou parâmetros inválidos (resposta 400)."""
+
+class PayloadTooLarge(BadRequest):
+    """Corpo acima de ``API_MAX_BODY`` (resposta 413)."""
+
+def parse_tickets(body: bytes) -> List[Dict[str, Any]]:
+    """Valida o corpo e devolve a lista de tickets no formato de ``data/tickets.json``."""
+    try:
+        payload = json.loads(body or b"null")
+    except json.JSONDecodeError as e:
+        raise BadRequest(f"JSON inválido: {e}")
+    if isinstance(payload, dict) and "tickets" in payload:
+        payload = payload["tickets"]
+    tickets = payload if isinstance(payload, list) else [payload]
+    if not tickets or not all(isinstance(t, dict) for t in tickets):
+        raise BadRequest("Envie um ticket, uma lista de tickets ou {\"tickets\": [...]}")
+
+    for ticket in tickets:
+        # id 0 é válido; só ausência, null ou texto vazio contam como faltando
+        missing = [field for field in _REQUIRED_FIELDS if field not in ticket or ticket[field] in (None, "")]
+        if missing:
+            raise BadRequest(f"Ticket sem os campos obrigatórios: {', '.join(missing)}")
+        ticket.setdefault("requester_name", ticket["requester"])
+        ticket.setdefault("manager", None)
+        ticket.setdefault("status", "open")
+    # Atributos enviados pelo cliente são descartados e recalculados
+    return attach_features(tickets, refresh=True)
+
+class TicketService:
+    """Pool de workers, fila limitada e registro de jobs compartilhados pelo servidor."""
+
+    def __init__(self, workers: int = API_WORKERS, max_queue: int = API_MAX_QUEUE, app=None):
+        self.app = app or build_graph()
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._stats = {"accepted": 0, "rejected": 0, "completed": 0}
+
+    def _run(self, ticket: Dict[str, Any]) -> Dict[str, Any]:
+        return summarize_result(process_ticket(self.app, ticket, 1, 1))
+
+    def _finished(self, future) -> None:
+        # Callback de cada future: libera a vaga ao concluir, falhar ou ser cancelado
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self._stats["completed"] += 1
+
+    def submit(self, tickets: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Cria um job para os tickets; None quando a fila não comporta o lote."""
+        with self._lock:
+            if self._pending + len(tickets) > self.max_queue:
+                self._stats["rejected"] += len(tickets)
+                return None
+            self._pending += len(tickets)
+            self._stats["accepted"] += len(tickets)
+            self._prune()
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "created_at": time.time(),
+                "futures": [self._pool.submit(self._run, ticket) for ticket in tickets],
+            }
+            self._jobs[job["job_id"]] = job
+        for future in job["futures"]:
+            future.add_done_callback(self._finished)
+        return job
+
+    def _prune(self) -> None:
+        # Chamado com o lock: remove jobs concluídos além do TTL
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if now - job["created_at"] > API_JOB_TTL and all(f.done() for f in job["futures"])]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @staticmethod
+    def describe(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Representação JSON de um job, com resultados dos tickets já concluídos."""
+        futures = job["futures"]
+        results = []
+        for future in futures:
+            if not future.done():
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({"status": "Erro", "error": str(e)})
+        done = len(results)
+        status = "done" if done == len(futures) else ("running" if any(f.running() for f in futures) or done else "queued")
+        return {"job_id": job["job_id"], "status": status, "completed": done, "total": len(futures), "results": results}
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"ok": True, "pending": self._pending, "max_queue": self.max_queue, "jobs": len(self._jobs), **self._stats}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+        wait_deferred_diagnoses()
+        email_service.flush_digests()
+        results_store.flush()
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Lê (método, alvo, cabeçalhos, corpo); None quando o cliente fecha a conexão."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise BadRequest("Linha de requisição inválida")
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise BadRequest("Content-Length inválido")
+    if length < 0:
+        raise BadRequest("Content-Length inválido")
+    if length > API_MAX_BODY:
+        raise PayloadTooLarge(f"Corpo acima de {API_MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+def _response(status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, keep_alive: bool = True) -> bytes:
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(data)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+class TicketAPI:
+    """Servidor HTTP/1.1 (com keep-alive) sobre um ``TicketService``."""
+
+    def __init__(self, service: TicketService, sync_timeout: float = API_SYNC_TIMEOUT):
+        self.service = service
+        self.sync_timeout = sync_timeout
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """Roteia a requisição e devolve (status, payload, cabeçalhos extras)."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = parse_qs(url.query)
+
+        if path == "/health":
+            return 200, self.service.health(), {}
+
+        if path.startswith("/jobs/"):
+            if method != "GET":
+                return 405, {"error": "Use GET"}, {}
+            job = self.service.job(path[len("/jobs/"):])
+            if job is None:
+                return 404, {"error": "Job não encontrado"}, {}
+            return 200, self.service.describe(job), {}
+
+        if path == "/tickets":
+            if method != "POST":
+                return 405, {"error": "Use POST"}, {}
+            tickets = parse_tickets(body)
+            job = self.service.submit(tickets)
+            if job is None:
+                return 429, {"error": "Fila cheia, tente novamente em instantes"}, {"Retry-After": "1"}
+
+            wait = query.get("wait", ["false"])[0].lower() in ("1", "true", "yes")
+            if wait:
+                # asyncio.wait não cancela nada no timeout: os tickets seguem na fila e o job continua consultável
+                futures = [asyncio.wrap_future(f) for f in job["futures"]]
+                _, pending = await asyncio.wait(futures, timeout=self.sync_timeout)
+                if not pending:
+                    return 200, self.service.describe(job), {}
+            accepted = {"job_id": job["job_id"], "status_url": f"/jobs/{job['job_id']}", "total": len(tickets)}
+            return 202, accepted, {"Location": accepted["status_url"]}
+
+        return 404, {"error": f"Rota não encontrada: {path}"}, {}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload, extra = await self.dispatch(method, target, body)
+                except BadRequest as e:
+                    keep_alive = False
+                    status, payload, extra = (413 if isinstance(e, PayloadTooLarge) else 400), {"error": str(e)}, {}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    print(f"ERRO na API: {e}")
+                    status, payload, extra = 500, {"error": "Erro interno"}, {}
+                writer.write(_response(status, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        address = server.sockets[0].getsockname()
+        print(f"API de tickets ouvindo em http://{address[0]}:{address[1]}")
+        async with server:
+            await server.serve_forever()
+
+def main() -> None:
+    """Sobe a API em primeiro plano até Ctrl+C."""
+    parser = argparse.ArgumentParser(description="API HTTP de ingestão e processamento de tickets")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8080")))
+    args = parser.parse_args()
+
+    service = TicketService()
+    try:
+        asyncio.run(TicketAPI(service).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
 """Interface Streamlit para o fluxo automatizado de tickets."""
 
+from datetime import date, datetime, timedelta
 from typing import Any, Dict, List
 import os
 import sys
+import time
 import traceback
 
 import streamlit as st
 
 try:
-    from graph import build_graph
-    from tools import ticket_manager
+    import clustering
+    from aggregates import RunningAggregates
+    import results_store
+    import scheduler
+    from graph import build_graph, diagnose_on_demand
+    from tools import ticket_manager, identity_service
 except Exception as e:
     st.error(f"Erro ao importar módulos: {e}")
     st.code(traceback.format_exc())
@@ -17,6 +23,9 @@ except Exception as e:
 
 Ticket = Dict[str, Any]
 
+# Resultados por pagina na aba de resultados
+RESULTS_PAGE_SIZE = 50
+
 
 def configure_page() -> None:
     """Define metadados da pagina e o conteudo do cabecalho no Streamlit."""
@@ -65,8 +74,7 @@ def render_sidebar_summary(tickets: List[Ticket]) -> bool:
     auto_process = st.sidebar.checkbox("Processar automaticamente ao carregar", value=False)
     st.sidebar.success(f"{len(tickets)} tickets abertos na fila")
 
-    results = st.session_state.get("results") or []
-    escalated = sum(1 for item in results if "Escalado" in item.get("status", ""))
+    escalated = get_aggregates().totals["escalated"]
     if escalated:
         st.sidebar.warning(f"{escalated} tickets escalados")
 
@@ -113,53 +121,85 @@ def render_ticket_list_tab(tickets: List[Ticket]) -> None:
             st.info(ticket["description"])
 
 
+def get_aggregates() -> RunningAggregates:
+    """Agregados da execucao mais recente (vazios antes da primeira)."""
+    return st.session_state.get("aggregates") or RunningAggregates()
+
+
 def process_all_tickets(tickets: List[Ticket]) -> List[Dict[str, Any]]:
-    """Executa o fluxo do LangGraph para cada ticket e apresenta o progresso."""
+    """Executa o fluxo do LangGraph para cada ticket e apresenta o progresso.
+
+    Os agregados do painel (``st.session_state["aggregates"]``) sao
+    atualizados a cada resultado, sem recontar a lista depois.
+    """
     progress_bar = st.progress(0)
     status_text = st.empty()
 
     app = build_graph()
+    # Lista e agregados entram juntos na sessao: um rerun no meio do lote os ve coerentes
     results: List[Dict[str, Any]] = []
-
-    for idx, ticket in enumerate(tickets, start=1):
-        status_text.text(f"Processando Ticket #{ticket['id']} ({idx}/{len(tickets)})...")
-
-        with st.expander(f"Log do Ticket #{ticket['id']} - {ticket['title']}", expanded=True):
-            try:
-                result = app.invoke({"ticket": ticket})
-
-                ticket_result = {
-                    "ticket_id": ticket["id"],
-                    "title": ticket["title"],
-                    "status": result.get("final_status", "Desconhecido"),
-                    "intent": result.get("intent", "N/A"),
-                    "system": result.get("system", "N/A"),
-                    "resolution": result.get("resolution_summary", ""),
-                    "error": result.get("error_message", ""),
-                }
-                results.append(ticket_result)
-
-                if ticket_result["status"] == "Resolvido":
-                    st.success(f"Ticket #{ticket['id']} resolvido com sucesso!")
-                else:
-                    st.warning(f"Ticket #{ticket['id']} escalado para analise manual.")
-
-                st.json(result)
-            except Exception as exc:
-                st.error(f"Erro ao processar ticket #{ticket['id']}: {exc}")
-                failure = {
-                    "ticket_id": ticket["id"],
-                    "title": ticket["title"],
-                    "status": "Erro",
-                    "intent": "N/A",
-                    "system": "N/A",
-                    "resolution": "",
-                    "error": str(exc),
-                }
-                results.append(failure)
-
-        progress_bar.progress(idx / len(tickets))
-
+    st.session_state["results"] = results
+    aggregates = st.session_state["aggregates"] = RunningAggregates()
+
+    # Mesma ordem de atendimento da CLI: prioridade estimada, urgentes primeiro
+    tickets = scheduler.priority_order(tickets)
+
+    # Tickets do mesmo incidente herdam a triagem do primeiro ticket do grupo
+    representatives = clustering.cluster_tickets(tickets) if clustering.CLUSTERING_ENABLED else {}
+    triages: Dict[Any, Dict[str, Any]] = {}
+
+    # Consulta o diretório em lote para todos os solicitantes da fila
+    with identity_service.batch_lookup([t["requester"] for t in tickets]):
+        for idx, ticket in enumerate(tickets, start=1):
+            status_text.text(f"Processando Ticket #{ticket['id']} ({idx}/{len(tickets)})...")
+
+            with st.expander(f"Log do Ticket #{ticket['id']} - {ticket['title']}", expanded=True):
+                started = time.perf_counter()
+                try:
+                    representative = representatives.get(ticket["id"], ticket["id"])
+                    result = results_store.run_graph(app, {"ticket": ticket, **triages.get(representative, {})})
+                    if representative == ticket["id"] and result.get("intent"):
+                        triages[representative] = clustering.triage_fields(result)
+
+                    ticket_result = {
+                        "ticket_id": ticket["id"],
+                        "title": ticket["title"],
+                        "status": result.get("final_status", "Desconhecido"),
+                        "intent": result.get("intent", "N/A"),
+                        "system": result.get("system", "N/A"),
+                        "priority": result.get("priority", "N/A"),
+                        "resolution": result.get("resolution_summary", ""),
+                        "error": result.get("error_message", ""),
+                    }
+                    results.append(ticket_result)
+                    aggregates.add(ticket_result, (time.perf_counter() - started) * 1000)
+
+                    if ticket_result["status"] == "Resolvido":
+                        st.success(f"Ticket #{ticket['id']} resolvido com sucesso!")
+                    else:
+                        st.warning(f"Ticket #{ticket['id']} escalado para analise manual.")
+
+                    st.json(result)
+                except Exception as exc:
+                    st.error(f"Erro ao processar ticket #{ticket['id']}: {exc}")
+                    failure = {
+                        "ticket_id": ticket["id"],
+                        "title": ticket["title"],
+                        "status": "Erro",
+                        "intent": "N/A",
+                        "system": "N/A",
+                        "priority": "N/A",
+                        "resolution": "",
+                        "error": str(exc),
+                    }
+                    results.append(failure)
+                    aggregates.add(failure, (time.perf_counter() - started) * 1000)
+
+            progress_bar.progress(idx / len(tickets))
+
+    # Grava ja as linhas do lote para o historico da aba de resultados
+    results_store.flush()
+    load_history.clear()
     status_text.text("Processamento concluido!")
     st.balloons()
     return results
@@ -206,20 +246,23 @@ def render_results_tab() -> None:
     results = st.session_state.get("results") or []
     if not results:
         st.info("Nenhum resultado disponivel. Processe alguns tickets na aba 'Processar Tickets'.")
+        render_history()
         return
 
+    aggregates = get_aggregates()
     col1, col2, col3 = st.columns(3)
-    resolved = sum(1 for item in results if item["status"] == "Resolvido")
-    escalated = sum(1 for item in results if "Escalado" in item["status"])
-    errors = sum(1 for item in results if item["status"] == "Erro")
-
-    col1.metric("Resolvidos", resolved)
-    col2.metric("Escalados", escalated)
-    col3.metric("Erros", errors)
+    col1.metric("Resolvidos", aggregates.totals["resolved"])
+    col2.metric("Escalados", aggregates.totals["escalated"])
+    col3.metric("Erros", aggregates.totals["errors"])
+    render_running_aggregates(aggregates)
 
     st.markdown("---")
 
-    for result in results:
+    # Uma pagina por vez, mais recentes primeiro: o custo nao cresce com o historico
+    pages = max(1, -(-len(results) // RESULTS_PAGE_SIZE))
+    page = st.number_input("Pagina", min_value=1, max_value=pages, value=1, step=1) if pages > 1 else 1
+    end = len(results) - (page - 1) * RESULTS_PAGE_SIZE
+    for result in reversed(results[max(0, end - RESULTS_PAGE_SIZE):end]):
         status = result["status"]
         if status == "Resolvido":
             status_icon = ":white_check_mark:"
@@ -247,6 +290,95 @@ def render_results_tab() -> None:
             if result.get("error"):
                 st.error(f"**Erro:** {result['error']}")
 
+    render_history()
+
+
+def render_running_aggregates(aggregates: RunningAggregates) -> None:
+    """Latencia, cortes por intencao/sistema/prioridade e contagens por janela de tempo."""
+    percentiles = aggregates.percentiles()
+    col1, col2, col3 = st.columns(3)
+    for col, (name, value) in zip((col1, col2, col3), percentiles.items()):
+        col.metric(f"Latencia {name}", f"{value:.0f} ms" if value is not None else "-")
+
+    with st.expander("Detalhamento", expanded=False):
+        for title, groups in (("Intencao", aggregates.by_intent), ("Sistema", aggregates.by_system),
+                              ("Prioridade", aggregates.by_priority)):
+            st.write(f"**Por {title.lower()}**")
+            st.dataframe([{title: name, **counts} for name, counts in groups.items()], use_container_width=True)
+        timeline = aggregates.timeline()
+        if timeline:
+            st.write("**Por janela de tempo**")
+            st.bar_chart(
+                [{"janela": datetime.fromtimestamp(row["start"]).strftime("%H:%M"), "resolvidos": row["resolved"],
+                  "escalados": row["escalated"], "erros": row["errors"]} for row in timeline],
+                x="janela",
+                y=["resolvidos", "escalados", "erros"],
+            )
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_history(days: int) -> Dict[str, Any]:
+    """Agregados dos resultados gravados nos ultimos ``days`` dias (releitura a cada 30 s)."""
+    since = date.today() - timedelta(days=days - 1)
+    return results_store.load_summary(since)
+
+
+def render_history() -> None:
+    """Agregados de todas as execucoes gravadas em ``data/results``, nao so da sessao."""
+    st.markdown("---")
+    st.subheader("Historico de execucoes")
+    days = st.selectbox("Periodo", [1, 7, 30, 90], index=1, format_func=lambda d: f"Ultimos {d} dias")
+    summary = load_history(days)
+    if not summary["rows"]:
+        st.info("Nenhum resultado gravado no periodo.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Tickets", summary["rows"])
+    col2.metric("Resolvidos", summary["status"]["resolved"])
+    col3.metric("Escalados", summary["status"]["escalated"])
+    col4.metric("Erros", summary["status"]["errors"])
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Tempo p50", f"{summary['total_ms']['p50']:.0f} ms")
+    col2.metric("Tempo p95", f"{summary['total_ms']['p95']:.0f} ms")
+    col3.metric("Tokens por ticket", f"{summary['tokens']['mean']:.0f}")
+
+    st.write("**Por intencao**")
+    st.dataframe(
+        [{"intencao": intent or "-", **counts} for intent, counts in summary["by_intent"].items()],
+        use_container_width=True,
+    )
+    st.write("**Tempo por no**")
+    st.dataframe(
+        [{"no": node, **{key: round(value, 1) for key, value in stats.items()}} for node, stats in summary["nodes"].items()],
+        use_container_width=True,
+    )
+
+
+def run_diagnosis_on_demand(ticket: Dict[str, Any]) -> None:
+    """Diagnostica um ticket escalado e guarda o resultado na sessao."""
+    full_ticket = ticket_manager.get_ticket_by_id(ticket["ticket_id"]) or {
+        "id": ticket["ticket_id"],
+        "title": ticket["title"],
+        "description": ticket["title"],
+    }
+    with st.spinner(f"Diagnosticando ticket #{ticket['ticket_id']}..."):
+        diagnoses = st.session_state.setdefault("diagnoses", {})
+        diagnoses[ticket["ticket_id"]] = diagnose_on_demand(full_ticket, ticket.get("system", ""))
+
+
+def render_diagnosis(ticket: Dict[str, Any]) -> None:
+    """Mostra o diagnostico ja solicitado para o ticket, se houver."""
+    diagnosis = (st.session_state.get("diagnoses") or {}).get(ticket["ticket_id"])
+    if not diagnosis:
+        return
+    with st.expander("Diagnostico", expanded=True):
+        st.write(diagnosis["diagnosis"])
+        st.write(f"**Confianca:** {diagnosis['confidence']}")
+        for action in diagnosis["suggested_actions"]:
+            st.write(f"- {action}")
+
 
 def render_escalated_tab() -> None:
     """Lista os tickets que ainda precisam de acompanhamento manual."""
@@ -254,7 +386,7 @@ def render_escalated_tab() -> None:
     st.markdown("Tickets que precisam de atencao manual da equipe de suporte.")
 
     results = st.session_state.get("results") or []
-    escalated_tickets = [item for item in results if "Escalado" in item.get("status", "")]
+    escalated_tickets = [results[index] for index in get_aggregates().escalated]
 
     if not escalated_tickets:
         st.success("Nenhum ticket escalado! Todos os tickets foram resolvidos automaticamente.")
@@ -288,7 +420,11 @@ def render_escalated_tab() -> None:
             with st.expander("Erro na automacao", expanded=False):
                 st.error(ticket["error"])
 
-        action_col1, action_col2, action_col3 = st.columns(3)
+        action_col0, action_col1, action_col2, action_col3 = st.columns(4)
+        with action_col0:
+            # Diagnostico sob demanda: so gasta a chamada ao LLM quando alguem pede
+            if st.button("Diagnosticar", key=f"diagnose_{ticket['ticket_id']}"):
+                run_diagnosis_on_demand(ticket)
         with action_col1:
             st.button(f"Ver usuario", key=f"user_{ticket['ticket_id']}", disabled=True)
         with action_col2:
@@ -296,6 +432,8 @@ def render_escalated_tab() -> None:
         with action_col3:
             st.button(f"Marcar resolvido", key=f"resolve_{ticket['ticket_id']}", disabled=True)
 
+        render_diagnosis(ticket)
+
         st.markdown("---")
 
 
@@ -0,0 +1 @@
+"""Ferramentas de benchmark e simulação local do pipeline de tickets."""
@@ -0,0 +1,107 @@
+"""Gera corpora sintéticos de tickets no mesmo formato de ``data/tickets.json``.
+
+Exemplo:
+    python -m bench.generate_tickets --count 10000 --seed 42 --output /tmp/tickets.json
+"""
+
+# Imports de bibliotecas padrão para CLI, datas e sorteios
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Modelos (título, descrição) por tipo de problema, no tom dos tickets reais
+TEMPLATES = {
+    "login_email": [
+        ("Não consigo entrar na minha conta de email", "Não consigo entrar no email corporativo desde {quando}. Aparece erro de senha incorreta."),
+        ("Outlook pede senha o tempo todo", "O Outlook fica pedindo a senha e não aceita. {urgencia}"),
+    ],
+    "account_locked": [
+        ("Bloqueio de conta Azure AD", "Minha conta do Azure está bloqueada. {urgencia}"),
+        ("Conta bloqueada", "Errei a senha algumas vezes e agora minha conta está bloqueada {quando}."),
+    ],
+    "password_reset": [
+        ("Reset de senha Windows", "Esqueci minha senha do Windows e não consigo mais fazer login no notebook da empresa."),
+        ("Preciso trocar minha senha", "Minha senha expirou {quando} e preciso de um reset. {urgencia}"),
+    ],
+    "vpn_access": [
+        ("Problema com VPN", "VPN não conecta de jeito nenhum. Já tentei reiniciar o computador mas continua o mesmo erro."),
+        ("VPN desconectando", "A VPN cai a cada poucos minutos {quando}. {urgencia}"),
+    ],
+    "system_access": [
+        ("Acesso ao sistema financeiro", "Preciso de permissão de acesso ao sistema financeiro para fechar o mês."),
+    ],
+    "out_of_scope": [
+        ("Impressora não imprime", "A impressora do terceiro andar não imprime nada {quando}."),
+        ("Cadeira quebrada", "Minha cadeira está quebrada, preciso de uma nova."),
+    ],
+}
+
+# Distribuição aproximada dos tipos observada na fila real
+WEIGHTS = {
+    "login_email": 0.2,
+    "account_locked": 0.25,
+    "password_reset": 0.25,
+    "vpn_access": 0.1,
+    "system_access": 0.1,
+    "out_of_scope": 0.1,
+}
+
+_FIRST_NAMES = ["joao", "maria", "carlos", "ana", "pedro", "julia", "lucas", "fernanda", "rafael", "beatriz"]
+_LAST_NAMES = ["silva", "oliveira", "pereira", "rodrigues", "santos", "costa", "lima", "souza", "almeida", "gomes"]
+_QUANDO = ["hoje cedo", "ontem", "desde segunda", "depois da atualização", "há algumas horas"]
+_URGENCIA = ["Preciso acessar urgentemente.", "Tenho uma reunião importante.", "", "Está impactando meu trabalho."]
+
+def generate_tickets(count: int, seed: int = 0, requesters: int = 0, labels: bool = False) -> List[Dict]:
+    """Gera ``count`` tickets abertos; ``requesters`` limita os solicitantes distintos.
+
+    Com ``labels``, cada ticket traz ``{"labels": {"intent": ...}}`` com o tipo
+    do modelo usado, para avaliar classificadores.
+    """
+    rng = random.Random(seed)
+    kinds = list(WEIGHTS)
+    weights = [WEIGHTS[k] for k in kinds]
+    pool = requesters or max(1, count // 3)
+    start = datetime(2025, 11, 6, 8, 0, 0)
+
+    tickets: List[Dict] = []
+    for ticket_id in range(1, count + 1):
+        person = rng.randrange(pool)
+        first = _FIRST_NAMES[person % len(_FIRST_NAMES)]
+        last = _LAST_NAMES[(person // len(_FIRST_NAMES)) % len(_LAST_NAMES)]
+        suffix = person // (len(_FIRST_NAMES) * len(_LAST_NAMES))
+        username = f"{first}.{last}{suffix or ''}"
+        kind = rng.choices(kinds, weights)[0]
+        title, description = rng.choice(TEMPLATES[kind])
+        ticket = {
+            "id": ticket_id,
+            "requester": f"{username}@empresa.com",
+            "requester_name": f"{first.title()} {last.title()}",
+            "manager": f"gestor{person % 20}@empresa.com" if rng.random() < 0.7 else None,
+            "title": title,
+            "description": description.format(quando=rng.choice(_QUANDO), urgencia=rng.choice(_URGENCIA)).strip(),
+            "status": "open",
+            "created_at": (start + timedelta(seconds=37 * ticket_id)).isoformat(),
+        }
+        if labels:
+            ticket["labels"] = {"intent": kind}
+        tickets.append(ticket)
+    return tickets
+
+def main() -> None:
+    """Escreve o corpus gerado em JSON."""
+    parser = argparse.ArgumentParser(description="Gera tickets sintéticos no formato de data/tickets.json")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requesters", type=int, default=0, help="solicitantes distintos (padrão: count/3)")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    tickets = generate_tickets(args.count, args.seed, args.requesters)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(tickets, f, indent=2, ensure_ascii=False)
+    print(f"{len(tickets)} tickets gravados em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark de carga dos backends de identidade.
+
+Mede operações por segundo e latência de get/lock-check/unlock/reset em vários
+níveis de concorrência, para dimensionar o pool antes de conectar ao AD real.
+
+Exemplo:
+    python -m bench.identity_benchmark --backend standin --pool-size 8 \\
+        --concurrency 1,4,16,32 --ops 2000 --rtt-ms 2 --output resultados.json
+"""
+
+# Imports de bibliotecas padrão para CLI, concorrência e medição de tempo
+import argparse
+import json
+import statistics
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from tools.identity_backends import (
+    IdentityBackend,
+    InMemoryBackend,
+    SimulatedBackend,
+    backend_from_env,
+    create_ldap_standin,
+)
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Percentil por vizinho mais próximo de uma lista de amostras."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def _build_backend(args: argparse.Namespace, users: List[Dict]) -> IdentityBackend:
+    """Cria o backend pedido na linha de comando."""
+    kind = args.backend
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "simulated":
+        latency = {op: f"fixed:{args.rtt_ms}" for op in ("get_user", "lock_check", "unlock", "reset")} if args.rtt_ms else {}
+        return SimulatedBackend(seed=args.seed, latency=latency)
+    if kind == "standin":
+        return create_ldap_standin(users, pool_size=args.pool_size, round_trip_ms=args.rtt_ms)
+    # "env" usa a mesma configuração do serviço (IDENTITY_BACKEND, LDAP_*)
+    return backend_from_env()
+
+def _operations(backend: IdentityBackend, users: List[Dict]) -> Dict[str, Callable[[int], None]]:
+    """Mapeia cada operação medida para uma chamada única ao backend."""
+    def pick(i: int) -> Dict:
+        return users[i % len(users)]
+
+    return {
+        "get": lambda i: backend.fetch_users([pick(i)["email"]]),
+        "lock_check": lambda i: backend.fetch_lock_status([pick(i)["user_id"]]),
+        "unlock": lambda i: backend.unlock(pick(i)["user_id"], "AD"),
+        "reset": lambda i: backend.reset_password(pick(i)["user_id"], "AD", "Temp#12345"),
+    }
+
+def run_operation(fn: Callable[[int], None], ops: int, concurrency: int) -> Dict:
+    """Executa ``ops`` chamadas distribuídas entre ``concurrency`` threads."""
+    latencies: List[float] = []
+
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies.extend(pool.map(timed, range(ops)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "ops": ops,
+        "ops_per_sec": round(ops / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+def main() -> None:
+    """Roda a matriz operação x concorrência e imprime/salva os resultados."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "simulated", "standin", "env"], default="standin")
+    parser.add_argument("--seed", type=int, default=0, help="semente do backend simulado")
+    parser.add_argument("--users", type=int, default=500, help="usuários sintéticos no diretório")
+    parser.add_argument("--ops", type=int, default=1000, help="chamadas por operação e nível")
+    parser.add_argument("--concurrency", default="1,4,16", help="níveis de concorrência separados por vírgula")
+    parser.add_argument("--pool-size", type=int, default=8, help="conexões no pool LDAP")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="latência simulada por requisição (stand-in/simulado)")
+    parser.add_argument("--operations", default="get,lock_check,unlock,reset")
+    parser.add_argument("--output", help="arquivo JSON para salvar os resultados")
+    args = parser.parse_args()
+
+    users = [
+        {"email": f"user{n}.{string.ascii_lowercase[n % 26]}@empresa.com", "user_id": f"user{n}.{string.ascii_lowercase[n % 26]}", "locked": n % 3 == 0}
+        for n in range(args.users)
+    ]
+    backend = _build_backend(args, users)
+    operations = _operations(backend, users)
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+
+    results = []
+    print(f"{'operação':<12}{'conc.':>7}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in args.operations.split(","):
+        for level in levels:
+            row = {"operation": name, **run_operation(operations[name], args.ops, level)}
+            results.append(row)
+            print(f"{name:<12}{level:>7}{row['ops_per_sec']:>12}{row['p50_ms']:>10}{row['p99_ms']:>10}")
+    backend.close()
+
+    if args.output:
+        payload = {
+            "backend": args.backend,
+            "pool_size": args.pool_size,
+            "rtt_ms": args.rtt_ms,
+            "users": args.users,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        print(f"Resultados salvos em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Servidor local compatível com a API de chat da OpenAI para benchmarks e CI.
+
+Reconhece o tipo de prompt gerado por ``classifier.py`` (classificação,
+sistema, automação, prioridade, diagnóstico e e-mails), devolve respostas
+canônicas derivadas do texto do ticket e aplica uma latência configurável por
+tipo de prompt, sem depender de credenciais reais.
+
+Exemplo:
+    python -m bench.mock_llm_server --port 8765 --latency "default=fixed:40,diagnose=lognormal:300:0.3"
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python main.py
+"""
+
+# Imports de bibliotecas padrão para HTTP, concorrência e sorteios
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from tools.identity_backends import parse_latency
+
+# Tipos de prompt reconhecidos, na ordem em que são testados
+PROMPT_TYPES = ["classify", "system", "automation", "priority", "diagnose", "email"]
+
+# Tipos de prompt com rótulo na primeira linha (os que passam pela cascata de modelos)
+LABEL_TYPES = {"classify", "system", "automation", "priority"}
+
+_SYSTEMS = ["Email", "AD", "Windows", "Desconhecido"]
+_INTENTS = ["login_email", "login_azure", "login_windows", "account_locked", "password_reset",
+            "vpn_access", "system_access", "out_of_scope"]
+
+# Explicação que modelos sem decodificação restrita costumam acrescentar ao rótulo
+_CHATTER = "\n\nO ticket descreve um problema de acesso compatível com esta opção, conforme o título e a descrição."
+
+_AUTOMATABLE = {"login_email", "login_azure", "login_windows", "account_locked", "password_reset"}
+
+def _fold(text: str) -> str:
+    """Remove acentos e coloca em minúsculas para casar palavras-chave."""
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+def _field(prompt: str, name: str) -> str:
+    """Extrai o valor de uma linha ``NOME: valor`` do prompt."""
+    match = re.search(rf"^{name}:\s*(.*)$", prompt, re.MULTILINE)
+    return match.group(1) if match else ""
+
+def detect_prompt_type(prompt: str) -> str:
+    """Identifica qual função do classifier gerou o prompt."""
+    head = _fold(prompt.split("\n", 1)[0])
+    if "classificador de tickets" in head:
+        return "classify"
+    if "analista de sistemas" in head:
+        return "system"
+    if "especialista em automacao" in head:
+        return "automation"
+    if "triagem" in head:
+        return "priority"
+    if "diagnostico" in head:
+        return "diagnose"
+    return "email"
+
+def _intent_for(text: str) -> str:
+    """Heurística determinística que imita a resposta de classificação."""
+    if "vpn" in text:
+        return "vpn_access"
+    if "acesso ao sistema" in text or "permissao" in text:
+        return "system_access"
+    if "bloque" in text:
+        return "account_locked"
+    if "senha" in text or "reset" in text:
+        return "password_reset"
+    if "email" in text or "outlook" in text:
+        return "login_email"
+    if "azure" in text:
+        return "login_azure"
+    if "windows" in text or "notebook" in text:
+        return "login_windows"
+    return "out_of_scope"
+
+def canned_response(prompt_type: str, prompt: str) -> str:
+    """Resposta canônica para o tipo de prompt, derivada do ticket."""
+    text = _fold(f"{_field(prompt, 'TÍTULO')} {_field(prompt, 'DESCRIÇÃO')}")
+    if prompt_type == "classify":
+        return _intent_for(text)
+    if prompt_type == "system":
+        if "email" in text or "outlook" in text:
+            return "Email"
+        if "azure" in text or " ad " in f" {text} ":
+            return "AD"
+        if "windows" in text or "notebook" in text:
+            return "Windows"
+        return "Desconhecido"
+    if prompt_type == "automation":
+        intent = _field(prompt, "CATEGORIA IDENTIFICADA").strip()
+        if intent in _AUTOMATABLE:
+            return "PODE_AUTOMATIZAR: SIM\nRAZÃO: Desbloqueio/reset de credenciais coberto pelo playbook"
+        return "PODE_AUTOMATIZAR: NÃO\nRAZÃO: Requer análise manual da equipe de suporte"
+    if prompt_type == "priority":
+        priority = "high" if "urgente" in text or "bloque" in text else "medium"
+        return f"PRIORIDADE: {priority}\nCOMPLEXIDADE: simple\nJUSTIFICATIVA: Impacto individual em acesso"
+    if prompt_type == "diagnose":
+        return (
+            "DIAGNÓSTICO: Credenciais inválidas ou conta bloqueada após tentativas de login\n"
+            "AÇÕES:\n- Verificar bloqueio da conta\n- Resetar a senha\n"
+            "CONFIANÇA: high"
+        )
+    return "ASSUNTO: Atualização do seu ticket\nCORPO:\nOlá,\n\nSeu ticket foi atualizado.\n\nAtenciosamente,\nSuporte"
+
+def wrong_response(prompt_type: str, content: str, draw: float) -> str:
+    """Resposta errada plausível (outro rótulo) para emular erros do modelo pequeno."""
+    if prompt_type == "classify":
+        options = [c for c in _INTENTS if c != content]
+        return options[int(draw * 1e6) % len(options)]
+    if prompt_type == "system":
+        options = [c for c in _SYSTEMS if c != content]
+        return options[int(draw * 1e6) % len(options)]
+    if prompt_type == "automation":
+        if "SIM" in content.split("\n", 1)[0]:
+            return "PODE_AUTOMATIZAR: NÃO\nRAZÃO: Requer análise manual"
+        return "PODE_AUTOMATIZAR: SIM\nRAZÃO: Coberto pelo playbook"
+    if prompt_type == "priority":
+        first, _, rest = content.partition("\n")
+        swapped = "PRIORIDADE: low" if "high" in first else "PRIORIDADE: high"
+        return f"{swapped}\n{rest}"
+    return content
+
+def split_tokens(content: str):
+    """Tokens aproximados da resposta (palavras e espaços), usados em logprobs e streaming."""
+    return re.findall(r"\S+|\s+", content) or [content]
+
+def token_logprobs(content: str, confidence: float):
+    """Logprobs por token: a primeira linha soma ``log(confidence)``; o resto é quase certo."""
+    tokens = split_tokens(content)
+    first_line = []
+    for token in tokens:
+        if "\n" in token:
+            break
+        first_line.append(token)
+    share = math.log(max(confidence, 1e-6)) / max(1, len(first_line))
+    return [
+        {"token": token, "logprob": share if i < len(first_line) else -0.01, "bytes": None, "top_logprobs": []}
+        for i, token in enumerate(tokens)
+    ]
+
+class MockLLMServer:
+    """Servidor HTTP em thread de fundo que emula ``/v1/chat/completions``.
+
+    ``latency`` mapeia tipos de prompt (ou ``default``) para especificações de
+    ``parse_latency``; ``seed`` torna a sequência de latências reproduzível.
+    ``rpm_limit`` emula a cota do provedor: acima dela a resposta é 429 com
+    ``Retry-After``. Chamadas ao ``small_model`` erram o rótulo em
+    ``small_error_rate`` dos prompts (de forma determinística por prompt), com
+    confiança menor nos erros, para exercitar a cascata de modelos.
+
+    A latência sorteada é o tempo até o primeiro token; cada token seguinte
+    leva ``token_ms``. Com ``stream: true`` a resposta sai em SSE, token a
+    token, e o cliente pode fechar a conexão no meio (contado em
+    ``streams_cancelled``). ``label_chatter`` acrescenta uma explicação após o
+    rótulo de classificação e sistema, truncada em ``max_tokens``.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[Dict[str, str]] = None,
+        seed: int = 0,
+        responses: Optional[Dict[str, Callable[[str], str]]] = None,
+        rpm_limit: Optional[int] = None,
+        small_model: Optional[str] = None,
+        small_error_rate: float = 0.1,
+        token_ms: float = 0.0,
+        label_chatter: bool = False,
+    ):
+        self._latency = {name: parse_latency(spec) for name, spec in (latency or {}).items()}
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._responses = responses or {}
+        self.requests: Dict[str, int] = {}
+        self.rate_limited = 0
+        self._rpm_limit = rpm_limit
+        self._seed = seed
+        self.small_model = small_model
+        self.small_error_rate = small_error_rate
+        self.models: Dict[str, int] = {}
+        self.token_ms = token_ms
+        self.label_chatter = label_chatter
+        self.streams_cancelled = 0
+        self._window: deque = deque()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """URL base para OPENAI_BASE_URL."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _delay(self, prompt_type: str) -> float:
+        sampler = self._latency.get(prompt_type) or self._latency.get("default")
+        if sampler is None:
+            return 0.0
+        with self._rng_lock:
+            return sampler(self._rng)
+
+    def _over_quota(self) -> Optional[float]:
+        """Registra a requisição na janela de 60 s; retorna o Retry-After se exceder."""
+        if not self._rpm_limit:
+            return None
+        now = time.monotonic()
+        with self._rng_lock:
+            while self._window and now - self._window[0] >= 60.0:
+                self._window.popleft()
+            if len(self._window) >= self._rpm_limit:
+                self.rate_limited += 1
+                return max(0.001, 60.0 - (now - self._window[0]))
+            self._window.append(now)
+        return None
+
+    def complete(self, body: Dict) -> Tuple[int, Dict, Dict[str, str]]:
+        """Gera (status, payload, headers) para uma requisição de chat."""
+        retry_after = self._over_quota()
+        if retry_after is not None:
+            error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            return 429, error, {"Retry-After": f"{retry_after:.3f}", "retry-after-ms": str(int(retry_after * 1000))}
+
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content") or ""
+        prompt_type = detect_prompt_type(prompt)
+        model = body.get("model", "mock")
+        with self._rng_lock:
+            self.requests[prompt_type] = self.requests.get(prompt_type, 0) + 1
+            self.models[model] = self.models.get(model, 0) + 1
+
+        time.sleep(self._delay(prompt_type))
+        custom = self._responses.get(prompt_type)
+        content = custom(prompt) if custom else canned_response(prompt_type, prompt)
+
+        confidence = 0.99
+        if model == self.small_model and prompt_type in LABEL_TYPES:
+            digest = hashlib.sha1(f"{self._seed}:{prompt}".encode("utf-8")).digest()
+            draw = int.from_bytes(digest[:8], "big") / 2**64
+            if draw < self.small_error_rate:
+                content = wrong_response(prompt_type, content, draw)
+                confidence = 0.35 + 0.45 * draw / self.small_error_rate
+            else:
+                confidence = 0.6 + 0.4 * (draw - self.small_error_rate) / (1 - self.small_error_rate)
+
+        if self.label_chatter and prompt_type in ("classify", "system"):
+            content = "".join(split_tokens(content + _CHATTER)[:body.get("max_tokens") or 16])
+
+        # Sem streaming, a resposta só sai depois do último token
+        if not body.get("stream"):
+            time.sleep(len(split_tokens(content)) * self.token_ms / 1000)
+
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        payload = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+                "logprobs": {"content": token_logprobs(content, confidence)} if body.get("logprobs") else None,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return 200, payload, {}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Cabeçalho e corpo saem em escritas separadas; sem isso o ACK atrasado soma ~40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                # Silencia o log padrão por requisição
+                pass
+
+            def _send(self, status: int, payload: Dict, headers: Dict[str, str]) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Rota não suportada: {self.path}"}}, {})
+                    return
+                status, payload, headers = server.complete(body)
+                if body.get("stream") and status == 200:
+                    self._stream(payload)
+                else:
+                    self._send(status, payload, headers)
+
+            def _stream(self, payload: Dict) -> None:
+                """Envia a resposta em SSE, um token por evento, no ritmo de ``token_ms``."""
+                choice = payload["choices"][0]
+                content = choice["message"]["content"]
+                logprobs = (choice.get("logprobs") or {}).get("content")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def event(delta: Dict, logprob=None, finish: Optional[str] = None) -> bytes:
+                    chunk = {
+                        "id": payload["id"], "object": "chat.completion.chunk", "created": payload["created"],
+                        "model": payload["model"],
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish,
+                                     "logprobs": {"content": [logprob]} if logprob else None}],
+                    }
+                    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+                try:
+                    self.wfile.write(event({"role": "assistant", "content": ""}))
+                    self.wfile.flush()
+                    for i, token in enumerate(split_tokens(content)):
+                        if i:
+                            time.sleep(server.token_ms / 1000)
+                        self.wfile.write(event({"content": token}, logprobs[i] if logprobs else None))
+                        self.wfile.flush()
+                    self.wfile.write(event({}, finish="stop") + b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._rng_lock:
+                        server.streams_cancelled += 1
+
+        return Handler
+
+    def start(self) -> "MockLLMServer":
+        """Inicia o servidor em uma thread daemon."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Encerra o servidor e libera a porta."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def parse_latency_map(value: str) -> Dict[str, str]:
+    """Lê ``tipo=spec,tipo=spec`` (ex.: ``default=fixed:40,diagnose=fixed:300``)."""
+    pairs = [item.split("=", 1) for item in value.split(",") if "=" in item]
+    return {name.strip(): spec.strip() for name, spec in pairs}
+
+def main() -> None:
+    """Executa o servidor em primeiro plano até Ctrl+C."""
+    parser = argparse.ArgumentParser(description="Servidor mock compatível com a API de chat da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="", help="latência por tipo de prompt, ex.: default=fixed:40")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rpm-limit", type=int, default=0, help="cota emulada de requisições por minuto (0 = sem limite)")
+    parser.add_argument("--small-model", help="nome do modelo pequeno emulado (erra parte dos rótulos)")
+    parser.add_argument("--small-error-rate", type=float, default=0.1)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="tempo de geração de cada token após o primeiro")
+    parser.add_argument("--label-chatter", action="store_true", help="acrescenta explicação após os rótulos")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, parse_latency_map(args.latency), args.seed, rpm_limit=args.rpm_limit or None,
+                           small_model=args.small_model, small_error_rate=args.small_error_rate,
+                           token_ms=args.token_ms, label_chatter=args.label_chatter)
+    print(f"Mock LLM ouvindo em {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+if __name__ == "__main__":
+    main()
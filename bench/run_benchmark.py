@@ -0,0 +1,148 @@
+"""Benchmark ponta a ponta do processamento de tickets contra o LLM mock.
+
+Para cada tamanho de corpus, gera tickets sintéticos, sobe o servidor mock,
+executa o mesmo fluxo do ``main.py`` em um processo novo e mede tickets/s,
+latência por ticket (p50/p95/p99) e pico de RSS. O resultado é salvo em JSON
+para acompanhar regressões.
+
+Exemplo:
+    python -m bench.run_benchmark --sizes 10,100,1000 --latency "default=fixed:20"
+"""
+
+# Imports de bibliotecas padrão para CLI, processos, medição e arquivos temporários
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Percentil por vizinho mais próximo (0 quando não há amostras)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def _peak_rss_mb() -> float:
+    """Pico de memória residente do processo atual, em MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB; macOS em bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_size(size: int, options: Dict) -> Dict:
+    """Processa um corpus de ``size`` tickets em um processo isolado."""
+    from bench.generate_tickets import generate_tickets
+    from bench.mock_llm_server import MockLLMServer
+
+    # Ambiente determinístico: LLM mock e identidade simulada com semente fixa
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ["IDENTITY_BACKEND"] = "simulated"
+    os.environ["IDENTITY_SIM_SEED"] = str(options["seed"])
+    os.environ["USE_LLM_EMAILS"] = "true" if options["llm_emails"] else "false"
+    # Sem cota configurada, o limitador não deve ser o gargalo medido
+    os.environ.setdefault("LLM_RPM_LIMIT", "1000000")
+    os.environ.setdefault("LLM_TPM_LIMIT", "1000000000")
+
+    with tempfile.TemporaryDirectory() as tmp, MockLLMServer(latency=options["latency"], seed=options["seed"], rpm_limit=options["rpm_limit"]) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Índice de diagnósticos isolado por execução, fora de data/
+        os.environ["DIAGNOSIS_INDEX_PATH"] = str(Path(tmp) / "diagnosis_index")
+        os.environ["RESULTS_PATH"] = str(Path(tmp) / "results")
+        corpus = Path(tmp) / "tickets.json"
+        corpus.write_text(json.dumps(generate_tickets(size, options["seed"]), ensure_ascii=False), encoding="utf-8")
+
+        from tools import email_service, ticket_manager, identity_service
+        from graph import build_graph, wait_deferred_diagnoses
+        from main import process_ticket
+        ticket_manager.DATA_PATH = corpus
+
+        started = time.perf_counter()
+        tickets = ticket_manager.get_open_tickets()
+        app = build_graph()
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+
+        # A saída do fluxo é descartada, mas o custo de formatação continua medido
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with identity_service.batch_lookup([t["requester"] for t in tickets]):
+                for idx, ticket in enumerate(tickets, 1):
+                    ticket_start = time.perf_counter()
+                    result = process_ticket(app, ticket, idx, len(tickets))
+                    latencies.append(time.perf_counter() - ticket_start)
+                    status = result.get("final_status", "Desconhecido")
+                    statuses[status] = statuses.get(status, 0) + 1
+            # Diagnósticos adiados e resumos de e-mail contam na vazão, não na latência por ticket
+            wait_deferred_diagnoses()
+            email_service.flush_digests()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "tickets": size,
+            "elapsed_s": round(elapsed, 3),
+            "tickets_per_sec": round(size / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round(max(latencies) * 1000, 2) if latencies else 0.0,
+            },
+            "peak_rss_mb": _peak_rss_mb(),
+            "llm_requests": dict(server.requests),
+            "llm_rate_limited": server.rate_limited,
+            "final_status": statuses,
+        }
+
+def main() -> None:
+    """Executa a matriz de tamanhos e grava o relatório JSON."""
+    from bench.mock_llm_server import parse_latency_map
+
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta com LLM mock")
+    parser.add_argument("--sizes", default="10,100,1000", help="tamanhos de corpus (10 a 100000)")
+    parser.add_argument("--latency", default="default=fixed:20", help="latência do mock por tipo de prompt")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rpm-limit", type=int, default=0, help="cota emulada no mock (0 = sem limite)")
+    parser.add_argument("--no-llm-emails", action="store_true", help="usa templates estáticos nos e-mails")
+    parser.add_argument("--output", help="arquivo JSON (padrão: bench/results/benchmark-<timestamp>.json)")
+    args = parser.parse_args()
+
+    options = {
+        "latency": parse_latency_map(args.latency),
+        "seed": args.seed,
+        "llm_emails": not args.no_llm_emails,
+        "rpm_limit": args.rpm_limit or None,
+    }
+    runs = []
+    print(f"{'tickets':>8}{'tickets/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        # Um processo por tamanho para que o pico de RSS não se acumule entre execuções
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            run = pool.submit(run_size, size, options).result()
+        runs.append(run)
+        lat = run["latency_ms"]
+        print(f"{size:>8}{run['tickets_per_sec']:>12}{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}{run['peak_rss_mb']:>9}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Relatório salvo em {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Servidores locais que emulam as fontes de ``tools/ticket_sources.py``.
+
+``HelpdeskStandin`` responde ``GET /api/v1/tickets`` com paginação por
+``(updated_at, id)``, token Bearer, gzip e keep-alive; ``IMAPStandin``
+implementa o subconjunto de IMAP4rev1 usado pelo ``IMAPSource`` (LOGIN,
+SELECT/EXAMINE, UID SEARCH, UID FETCH, NOOP, LOGOUT). Ambos guardam contadores
+de requisições e conexões para medir a sincronização incremental.
+
+Exemplo:
+    python -m bench.source_standins --tickets 5000 --queues ti,rh --emails 500
+"""
+
+# Imports de bibliotecas padrão para HTTP, sockets, e-mail e concorrência
+import argparse
+import bisect
+import gzip
+import json
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from bench.generate_tickets import generate_tickets
+
+class HelpdeskStandin:
+    """Helpdesk REST em memória, com filas e relógio de alteração por ticket."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token: Optional[str] = "standin",
+                 latency_ms: float = 0.0):
+        self.token = token
+        self.latency_ms = latency_ms
+        self._tickets: Dict[str, Dict[str, Any]] = {}
+        # Por fila: chaves (updated_at, id) ordenadas, para paginar com bisect
+        self._index: Dict[str, List[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._clock = datetime(2025, 11, 6, 8, 0, 0)
+        self.stats = {"requests": 0, "connections": 0, "tickets_served": 0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _tick(self) -> str:
+        # Relógio próprio, estritamente crescente: cada alteração tem um updated_at novo
+        self._clock += timedelta(milliseconds=1)
+        return self._clock.isoformat(timespec="milliseconds")
+
+    def add(self, tickets: List[Dict[str, Any]], queue: str = "default") -> None:
+        """Cria ou substitui tickets na fila (ids remotos como texto)."""
+        with self._lock:
+            for ticket in tickets:
+                self._put({**ticket, "id": str(ticket["id"]), "queue": queue})
+
+    def update(self, ticket_id: Any, **fields: Any) -> None:
+        """Altera campos de um ticket existente, movendo-o para o fim da ordem de alteração."""
+        with self._lock:
+            self._put({**self._tickets[str(ticket_id)], **fields})
+
+    def _put(self, ticket: Dict[str, Any]) -> None:
+        old = self._tickets.get(ticket["id"])
+        if old is not None:
+            keys = self._index[old["queue"]]
+            keys.pop(bisect.bisect_left(keys, (old["updated_at"], old["id"])))
+        ticket["updated_at"] = self._tick()
+        self._tickets[ticket["id"]] = ticket
+        # O relógio só cresce: a nova chave sempre vai para o fim
+        self._index.setdefault(ticket["queue"], []).append((ticket["updated_at"], ticket["id"]))
+
+    def page(self, queue: Optional[str], since: str, after_id: str, limit: int) -> Dict[str, Any]:
+        """Tickets com (updated_at, id) > (since, after_id), em ordem."""
+        with self._lock:
+            queues = [queue] if queue else list(self._index)
+            keys = sorted(k for q in queues for k in self._index.get(q, [])) if len(queues) > 1 else \
+                self._index.get(queues[0], []) if queues else []
+            start = bisect.bisect_right(keys, (since, after_id)) if since else 0
+            selected = keys[start:start + limit]
+            return {"tickets": [self._tickets[ticket_id] for _, ticket_id in selected],
+                    "has_more": start + limit < len(keys)}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with server._lock:
+                    server.stats["connections"] += 1
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                with server._lock:
+                    server.stats["requests"] += 1
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                url = urlsplit(self.path)
+                if url.path != "/api/v1/tickets":
+                    return self._send(404, {"error": "not found"})
+                if server.token and self.headers.get("Authorization") != f"Bearer {server.token}":
+                    return self._send(401, {"error": "unauthorized"})
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                page = server.page(query.get("queue"), query.get("updated_since", ""), query.get("after_id", ""),
+                                   min(int(query.get("limit", "100")), 1000))
+                with server._lock:
+                    server.stats["tickets_served"] += len(page["tickets"])
+                self._send(200, page)
+
+        return Handler
+
+    def start(self) -> "HelpdeskStandin":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "HelpdeskStandin":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def ticket_email(ticket: Dict[str, Any], domain: str = "empresa.com") -> bytes:
+    """Mensagem RFC 822 equivalente a um ticket sintético."""
+    message = EmailMessage()
+    message["From"] = f"{ticket['requester_name']} <{ticket['requester']}>"
+    message["To"] = f"suporte@{domain}"
+    message["Subject"] = ticket["title"]
+    message["Date"] = format_datetime(datetime.fromisoformat(ticket["created_at"]).astimezone())
+    message["Message-ID"] = f"<ticket-{ticket['id']}@{domain}>"
+    message.set_content(ticket["description"])
+    return bytes(message)
+
+_COMMAND = re.compile(r"^(\S+) (?:(UID) )?(\S+)(?: (.*))?$", re.IGNORECASE)
+
+def _uid_set(spec: str, uids: List[int]) -> List[int]:
+    """Expande ``1,3,5:7,9:*`` sobre os UIDs existentes."""
+    highest = uids[-1] if uids else 0
+    wanted = set()
+    for part in spec.split(","):
+        low, _, high = part.partition(":")
+        lo = highest if low == "*" else int(low)
+        hi = lo if not high else (highest if high == "*" else int(high))
+        lo, hi = min(lo, hi), max(lo, hi)
+        wanted.update(uid for uid in uids[bisect.bisect_left(uids, lo):bisect.bisect_right(uids, hi)])
+    return sorted(wanted)
+
+class IMAPStandin:
+    """Servidor IMAP mínimo com uma caixa ``INBOX`` em memória (sem TLS)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, user: str = "suporte@empresa.com",
+                 password: str = "standin", uidvalidity: int = 1):
+        self.user = user
+        self.password = password
+        self.uidvalidity = uidvalidity
+        self._uids: List[int] = []
+        self._messages: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "commands": 0, "messages_served": 0}
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def deliver(self, messages: List[bytes]) -> None:
+        """Entrega mensagens novas na caixa, com UIDs crescentes."""
+        with self._lock:
+            for raw in messages:
+                uid = (self._uids[-1] if self._uids else 0) + 1
+                self._uids.append(uid)
+                self._messages[uid] = raw
+
+    def reset_uidvalidity(self) -> None:
+        """Simula a recriação da caixa: UIDVALIDITY novo, mensagens mantidas."""
+        with self._lock:
+            self.uidvalidity += 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            # Respostas saem em um único write por comando (evita esperas de ACK atrasado)
+            wbufsize = 1 << 16
+
+            def send(self, line: str) -> None:
+                self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+            def done(self, line: str) -> None:
+                self.send(line)
+                self.wfile.flush()
+
+            def handle(self) -> None:
+                with server._lock:
+                    server.stats["connections"] += 1
+                authenticated = False
+                self.done("* OK [CAPABILITY IMAP4rev1] IMAP stand-in pronto")
+                for raw in self.rfile:
+                    match = _COMMAND.match(raw.decode("utf-8", "replace").rstrip("\r\n"))
+                    if not match:
+                        self.done("* BAD comando inválido")
+                        continue
+                    tag, uid, command, args = match.group(1), match.group(2), match.group(3).upper(), match.group(4) or ""
+                    with server._lock:
+                        server.stats["commands"] += 1
+                    if command == "CAPABILITY":
+                        self.send("* CAPABILITY IMAP4rev1")
+                    elif command == "NOOP":
+                        pass
+                    elif command == "LOGOUT":
+                        self.send("* BYE encerrando")
+                        self.done(f"{tag} OK LOGOUT completed")
+                        return
+                    elif command == "LOGIN":
+                        user, _, password = args.partition(" ")
+                        if user.strip('"') != server.user or password.strip('"') != server.password:
+                            self.done(f"{tag} NO [AUTHENTICATIONFAILED] credenciais inválidas")
+                            continue
+                        authenticated = True
+                    elif not authenticated:
+                        self.done(f"{tag} NO faça LOGIN primeiro")
+                        continue
+                    elif command in ("SELECT", "EXAMINE"):
+                        with server._lock:
+                            exists, validity = len(server._uids), server.uidvalidity
+                            next_uid = (server._uids[-1] if server._uids else 0) + 1
+                        self.send(f"* {exists} EXISTS")
+                        self.send("* 0 RECENT")
+                        self.send(f"* OK [UIDVALIDITY {validity}] UIDs válidos")
+                        self.send(f"* OK [UIDNEXT {next_uid}] próximo UID")
+                        mode = "READ-ONLY" if command == "EXAMINE" else "READ-WRITE"
+                        self.done(f"{tag} OK [{mode}] {command} completed")
+                        continue
+                    elif uid and command == "SEARCH":
+                        spec = args.split()[-1]
+                        with server._lock:
+                            found = _uid_set(spec, server._uids)
+                        self.send("* SEARCH" + "".join(f" {u}" for u in found))
+                    elif uid and command == "FETCH":
+                        spec = args.split(" ", 1)[0]
+                        with server._lock:
+                            found = [(u, server._messages[u], bisect.bisect_left(server._uids, u) + 1)
+                                     for u in _uid_set(spec, server._uids)]
+                            server.stats["messages_served"] += len(found)
+                        for u, message, seq in found:
+                            self.wfile.write(f"* {seq} FETCH (UID {u} BODY[] {{{len(message)}}}\r\n".encode() + message + b")\r\n")
+                    else:
+                        self.done(f"{tag} BAD comando não suportado: {command}")
+                        continue
+                    self.done(f"{tag} OK {command} completed")
+
+        return Handler
+
+    def start(self) -> "IMAPStandin":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "IMAPStandin":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main() -> None:
+    """Sobe os dois stand-ins com tickets sintéticos e imprime um ``sources.json`` para eles."""
+    parser = argparse.ArgumentParser(description="Stand-ins locais de helpdesk REST e IMAP")
+    parser.add_argument("--tickets", type=int, default=1000, help="tickets no helpdesk, divididos entre as filas")
+    parser.add_argument("--queues", default="ti", help="filas do helpdesk, separadas por vírgula")
+    parser.add_argument("--emails", type=int, default=100, help="mensagens na caixa IMAP")
+    parser.add_argument("--http-port", type=int, default=8780)
+    parser.add_argument("--imap-port", type=int, default=1143)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    queues = [q.strip() for q in args.queues.split(",") if q.strip()]
+    helpdesk = HelpdeskStandin(port=args.http_port)
+    for index, queue in enumerate(queues):
+        helpdesk.add(generate_tickets(args.tickets, seed=args.seed)[index::len(queues)], queue=queue)
+    imap = IMAPStandin(port=args.imap_port)
+    imap.deliver([ticket_email(t) for t in generate_tickets(args.emails, seed=args.seed + 1)])
+
+    sources = [{"name": f"helpdesk-{q}", "type": "helpdesk", "base_url": helpdesk.base_url, "queue": q,
+                "token": helpdesk.token} for q in queues]
+    sources.append({"name": "email", "type": "imap", "host": imap.address[0], "port": imap.address[1],
+                    "ssl": False, "user": imap.user, "password": imap.password})
+    print(json.dumps({"sources": sources}, indent=2))
+    with helpdesk, imap:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
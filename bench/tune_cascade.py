@@ -0,0 +1,130 @@
+"""Ajusta os limiares da cascata de modelos sobre um conjunto rotulado.
+
+Para cada exemplo, executa a função do classifier forçando o modelo pequeno
+(guardando a confiança) e o modelo principal. Rótulos ausentes no conjunto
+são substituídos pela resposta do modelo principal (concordância). Para cada
+função, escolhe o menor limiar de escalonamento cuja acurácia fica a no
+máximo ``--max-accuracy-drop`` da acurácia do modelo principal sozinho, e
+grava os limiares em ``data/cascade_thresholds.json``.
+
+O conjunto rotulado é um JSONL de tickets com ``labels`` opcionais
+(``intent``, ``system``, ``can_automate``, ``priority``).
+
+Exemplos:
+    python -m bench.tune_cascade --labeled rotulados.jsonl
+    python -m bench.tune_cascade --mock --synthetic 300 --output /tmp/limiares.json
+"""
+
+# Imports de bibliotecas padrão para CLI, arquivos e redirecionamento de saída
+import argparse
+import contextlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+FUNCTIONS = ["classify", "system", "automation", "priority"]
+
+def _runners(classifier) -> Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Any]]:
+    """Chamada de cada função em cascata, recebendo (ticket, rótulos conhecidos)."""
+    return {
+        "classify": lambda t, labels: classifier.classify_ticket_intent(t["description"], t["title"])[0],
+        "system": lambda t, labels: classifier.extract_system_from_description(t["description"], t["title"]),
+        "automation": lambda t, labels: classifier.analyze_automation_capability(t, labels.get("intent", "out_of_scope"))[0],
+        "priority": lambda t, labels: classifier.analyze_ticket_priority_and_complexity(t)["priority"],
+    }
+
+def evaluate(samples: List[Dict[str, Any]], max_drop: float) -> Dict[str, Any]:
+    """Varre os limiares candidatos e escolhe o de menor escalonamento dentro da tolerância."""
+    n = len(samples)
+    large_accuracy = sum(s["large"] == s["gold"] for s in samples) / n
+    small_accuracy = sum(s["small"] == s["gold"] for s in samples) / n
+    candidates = sorted({0.0, 1.01, *(s["confidence"] for s in samples if s["confidence"] is not None)})
+
+    best: Optional[Dict[str, Any]] = None
+    for threshold in candidates:
+        escalated = [s["confidence"] is None or s["confidence"] < threshold for s in samples]
+        correct = [(s["large"] if esc else s["small"]) == s["gold"] for s, esc in zip(samples, escalated)]
+        row = {
+            "threshold": round(threshold, 4),
+            "escalation_rate": round(sum(escalated) / n, 4),
+            "accuracy": round(sum(correct) / n, 4),
+        }
+        if row["accuracy"] >= large_accuracy - max_drop and (best is None or row["escalation_rate"] < best["escalation_rate"]):
+            best = row
+    return {**(best or {"threshold": 1.01, "escalation_rate": 1.0, "accuracy": large_accuracy}),
+            "small_accuracy": round(small_accuracy, 4), "large_accuracy": round(large_accuracy, 4), "samples": n}
+
+def collect(tickets: List[Dict[str, Any]], functions: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Executa cada exemplo nos dois modelos e guarda (confiança, respostas, rótulo)."""
+    import cascade
+    import classifier
+
+    runners = _runners(classifier)
+    samples: Dict[str, List[Dict[str, Any]]] = {name: [] for name in functions}
+    for ticket in tickets:
+        labels = dict(ticket.get("labels") or {})
+        if "intent" not in labels:
+            with cascade.force("large"):
+                labels["intent"] = runners["classify"](ticket, labels)
+        for name in functions:
+            with cascade.trace() as decisions, cascade.force("small"):
+                small = runners[name](ticket, labels)
+            with cascade.force("large"):
+                large = runners[name](ticket, labels)
+            confidence = decisions[-1]["confidence"] if decisions else None
+            gold = labels.get({"automation": "can_automate"}.get(name, name), large)
+            samples[name].append({"small": small, "large": large, "gold": gold, "confidence": confidence})
+    return samples
+
+def main() -> None:
+    """Coleta as respostas, ajusta os limiares e grava o relatório."""
+    parser = argparse.ArgumentParser(description="Ajusta os limiares da cascata de modelos")
+    parser.add_argument("--labeled", help="JSONL de tickets com 'labels' opcionais")
+    parser.add_argument("--synthetic", type=int, default=0, help="usa N tickets sintéticos rotulados por tipo")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS))
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                        help="perda máxima de acurácia aceita em relação ao modelo principal")
+    parser.add_argument("--mock", action="store_true", help="usa o LLM mock com um modelo pequeno emulado")
+    parser.add_argument("--small-error-rate", type=float, default=0.1, help="taxa de erro do modelo pequeno no mock")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(Path(__file__).parent.parent / "data" / "cascade_thresholds.json"))
+    args = parser.parse_args()
+
+    from bench.generate_tickets import generate_tickets
+    if args.labeled:
+        with open(args.labeled, "r", encoding="utf-8") as f:
+            tickets = [json.loads(line) for line in f if line.strip()]
+    elif args.synthetic:
+        tickets = generate_tickets(args.synthetic, args.seed, labels=True)
+    else:
+        parser.error("informe --labeled ou --synthetic")
+    functions = [f for f in args.functions.split(",") if f]
+
+    with contextlib.ExitStack() as stack:
+        if args.mock:
+            from bench.mock_llm_server import MockLLMServer
+            server = stack.enter_context(MockLLMServer(seed=args.seed, small_model="mock-small",
+                                                       small_error_rate=args.small_error_rate))
+            os.environ.update(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="mock", LLM_CASCADE_SMALL_MODEL="mock-small")
+        if not os.getenv("LLM_CASCADE_SMALL_MODEL"):
+            parser.error("defina LLM_CASCADE_SMALL_MODEL (ou use --mock)")
+        # Cada modo forçado precisa chamar o modelo: o cache de triagem devolveria a primeira resposta
+        os.environ["LLM_TRIAGE_CACHE"] = "false"
+        # Limiares antigos não influenciam a coleta: os modos são forçados
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            samples = collect(tickets, functions)
+
+    report = {name: evaluate(rows, args.max_accuracy_drop) for name, rows in samples.items()}
+    print(f"{'função':<12}{'limiar':>8}{'escalona':>10}{'acurácia':>10}{'pequeno':>9}{'principal':>11}")
+    for name, row in report.items():
+        print(f"{name:<12}{row['threshold']:>8}{row['escalation_rate']:>10.1%}{row['accuracy']:>10.1%}"
+              f"{row['small_accuracy']:>9.1%}{row['large_accuracy']:>11.1%}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Limiares gravados em {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Cascata de modelos: um modelo pequeno responde primeiro e o maior só entra com baixa confiança.
+
+A confiança é a probabilidade conjunta dos tokens da primeira linha da
+resposta (o rótulo: categoria, sistema, ``PODE_AUTOMATIZAR`` ou
+``PRIORIDADE``), calculada a partir dos logprobs do modelo pequeno. Abaixo do
+limiar da função, ou se o modelo pequeno falhar, a mesma chamada vai para o
+modelo principal. Os limiares por função vêm de ``data/cascade_thresholds.json``
+(gerado por ``bench/tune_cascade.py`` sobre um conjunto rotulado).
+"""
+
+# Imports de bibliotecas padrão para configuração, contexto e sincronização
+import contextvars
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Modelo pequeno (vazio desliga a cascata) e servidor opcional, ex.: modelo local compatível
+SMALL_MODEL = os.getenv("LLM_CASCADE_SMALL_MODEL", "")
+SMALL_BASE_URL = os.getenv("LLM_CASCADE_SMALL_BASE_URL") or None
+
+# Limiares ajustados por função e limiar padrão para as demais
+THRESHOLDS_PATH = Path(os.getenv("LLM_CASCADE_THRESHOLDS", str(Path(__file__).parent / "data" / "cascade_thresholds.json")))
+DEFAULT_THRESHOLD = float(os.getenv("LLM_CASCADE_THRESHOLD", "0.9"))
+
+# Modo forçado ("small" ou "large") usado pelo ajuste de limiares
+_forced: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("cascade_forced", default=None)
+
+# Registro das decisões da chamada em andamento (lista compartilhada com threads de hedging)
+_trace: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("cascade_trace", default=None)
+
+def first_line_confidence(resp: Any) -> Optional[float]:
+    """Probabilidade conjunta dos tokens até a primeira quebra de linha (None sem logprobs)."""
+    logprobs = getattr(resp.choices[0], "logprobs", None)
+    tokens = getattr(logprobs, "content", None) if logprobs is not None else None
+    if not tokens:
+        return None
+    total = 0.0
+    seen_text = False
+    for token in tokens:
+        if "\n" in token.token and seen_text:
+            break
+        if token.token.strip():
+            seen_text = True
+        total += token.logprob
+    return math.exp(total)
+
+def load_thresholds(path: Path = THRESHOLDS_PATH) -> Dict[str, float]:
+    """Lê os limiares por função (vazio quando o arquivo não existe)."""
+    if not Path(path).exists():
+        return {}
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {name: float(entry["threshold"] if isinstance(entry, dict) else entry) for name, entry in data.items()}
+
+class ModelCascade:
+    """Limiares e contadores da cascata, por função do classifier."""
+
+    def __init__(self, small_model: str = SMALL_MODEL, thresholds: Optional[Dict[str, float]] = None,
+                 default_threshold: float = DEFAULT_THRESHOLD):
+        self.small_model = small_model
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_model)
+
+    def threshold(self, name: str) -> float:
+        return self.thresholds.get(name, self.default_threshold)
+
+    def record(self, name: str, escalated: bool, confidence: Optional[float], model: str) -> None:
+        """Contabiliza a decisão e a registra no trace da chamada, se houver."""
+        with self._lock:
+            stats = self._stats.setdefault(name, {"calls": 0, "escalated": 0, "small_errors": 0})
+            stats["calls"] += 1
+            stats["escalated"] += int(escalated)
+            stats["small_errors"] += int(confidence is None and escalated)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append({"function": name, "confidence": confidence, "escalated": escalated, "model": model})
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Chamadas, escaladas e taxa de escalonamento por função."""
+        with self._lock:
+            return {
+                name: {**values, "escalation_rate": round(values["escalated"] / values["calls"], 3) if values["calls"] else 0.0,
+                       "threshold": self.threshold(name)}
+                for name, values in self._stats.items()
+            }
+
+def cascade_from_env() -> ModelCascade:
+    """Cria a cascata a partir de LLM_CASCADE_* e do arquivo de limiares."""
+    try:
+        thresholds = load_thresholds()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"AVISO: Limiares da cascata ilegíveis, usando {DEFAULT_THRESHOLD}: {e}")
+        thresholds = {}
+    return ModelCascade(SMALL_MODEL, thresholds, DEFAULT_THRESHOLD)
+
+def forced_mode() -> Optional[str]:
+    return _forced.get()
+
+@contextmanager
+def force(mode: str) -> Iterator[None]:
+    """Força todas as chamadas em cascata do bloco para o modelo ``small`` ou ``large``."""
+    token = _forced.set(mode)
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+@contextmanager
+def trace() -> Iterator[List[Dict[str, Any]]]:
+    """Coleta as decisões da cascata tomadas dentro do bloco."""
+    decisions: List[Dict[str, Any]] = []
+    token = _trace.set(decisions)
+    try:
+        yield decisions
+    finally:
+        _trace.reset(token)
@@ -1,8 +1,29 @@
 """Camada de utilidades para classificacao e suporte ao pipeline de automacao."""
 
-from typing import Dict, Tuple
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import functools
 import os
-from openai import OpenAI
+import re
+import threading
+import time
+from openai import OpenAI, RateLimitError
+
+import cascade
+import results_store
+from rate_limiter import AdaptiveRateLimiter, RateLimitTimeout, limiter_from_env
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Hedger,
+    breaker_from_env,
+    check_deadline,
+    hedger_from_env,
+    remaining,
+)
+from tools.cache import TTLCache
+from tools.ticket_features import keyword_match, text_features, ticket_features
 
 
 _CATEGORIES = [
@@ -29,14 +50,348 @@ def _ensure_api_key() -> str:
     return val
 
 
+_CLIENT: Optional[OpenAI] = None
+_SMALL_CLIENT: Optional[OpenAI] = None
+_CLIENT_LOCK = threading.Lock()
+
+# Modelo principal; com a cascata ligada, é o modelo maior
+_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+# Cascata opcional para as funções de rótulo (LLM_CASCADE_SMALL_MODEL)
+_CASCADE: cascade.ModelCascade = cascade.cascade_from_env()
+
+# Limitador compartilhado por todas as chamadas ao LLM deste processo
+_LIMITER: AdaptiveRateLimiter = limiter_from_env()
+
+# Circuit breaker compartilhado: com o provedor degradado, as chamadas vão direto ao fallback
+_BREAKER: CircuitBreaker = breaker_from_env()
+
+# Hedging opcional para as chamadas curtas de rótulo único (LLM_HEDGE_ENABLED)
+_HEDGER: Optional[Hedger] = hedger_from_env()
+
+# Tentativas após respostas 429 antes de cair nos fallbacks heurísticos
+_MAX_RATE_LIMIT_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+# Timeout de cada requisição quando o ticket não tem prazo próprio
+_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+
+# Chamadas de rótulo único em streaming, encerradas assim que o rótulo é decodificado
+_STREAM_LABELS = os.getenv("LLM_STREAM_LABELS", "true").lower() in ("1", "true", "yes")
+
+# Viés de logit para os tokens dos rótulos (0 desliga; requer tiktoken e modelo conhecido)
+_LABEL_LOGIT_BIAS = float(os.getenv("LLM_LABEL_LOGIT_BIAS", "0"))
+
+_SYSTEMS = ["Email", "AD", "Windows", "Desconhecido"]
+
+# Cache de triagem pelo hash do texto normalizado (LLM_TRIAGE_CACHE=true): tickets com o
+# mesmo conteúdo reaproveitam as respostas do LLM, também fora do agrupamento em lote
+_TRIAGE_CACHE: Optional[TTLCache] = TTLCache(
+    maxsize=int(os.getenv("LLM_TRIAGE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("LLM_TRIAGE_CACHE_TTL", "600")),
+) if os.getenv("LLM_TRIAGE_CACHE", "false").lower() in ("1", "true", "yes") else None
+
+_stream_stats = {"streams": 0, "early_stops": 0}
+_stream_lock = threading.Lock()
+
+
 def _client() -> OpenAI:
-    """Retorna o cliente do serviço de classificação."""
+    """Retorna o cliente do serviço de classificação, compartilhado entre chamadas."""
+    global _CLIENT
     _ensure_api_key()
-    return OpenAI()
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            # As retentativas de 429 ficam a cargo do limitador, que respeita o Retry-After
+            _CLIENT = OpenAI(max_retries=0)
+        return _CLIENT
+
+
+def _small_client() -> OpenAI:
+    """Cliente do modelo pequeno da cascata (servidor próprio, se configurado)."""
+    global _SMALL_CLIENT
+    if not cascade.SMALL_BASE_URL:
+        return _client()
+    with _CLIENT_LOCK:
+        if _SMALL_CLIENT is None:
+            _SMALL_CLIENT = OpenAI(
+                base_url=cascade.SMALL_BASE_URL,
+                api_key=os.getenv("LLM_CASCADE_SMALL_API_KEY") or os.getenv("OPENAI_API_KEY") or "local",
+                max_retries=0,
+            )
+        return _SMALL_CLIENT
+
+
+def _retry_after(exc: RateLimitError) -> Optional[float]:
+    """Lê o Retry-After (segundos ou ms) da resposta 429, quando presente."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+def _label_complete(text: str, labels: Sequence[str]) -> bool:
+    """A primeira palavra da resposta (a única lida pelos parsers) já está completa."""
+    match = re.match(r"\s*(\S+)(\s)?", text)
+    if match is None:
+        return False
+    if match.group(2):
+        return True
+    # Sem separador ainda: só encerra se nenhum rótulo mais longo começar com o que chegou
+    word = match.group(1).lower()
+    lowered = [label.lower() for label in labels]
+    return word in lowered and not any(label != word and label.startswith(word) for label in lowered)
+
+
+@functools.lru_cache(maxsize=32)
+def _label_logit_bias(labels: Tuple[str, ...], model: str) -> Optional[Dict[str, float]]:
+    """Viés positivo para os tokens dos rótulos, quando o tokenizador do modelo é conhecido."""
+    if _LABEL_LOGIT_BIAS <= 0:
+        return None
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except ImportError:
+        print("AVISO: LLM_LABEL_LOGIT_BIAS requer o pacote opcional 'tiktoken' (pip install tiktoken)")
+        return None
+    except KeyError:
+        # Modelo sem tokenizador conhecido (ex.: modelo local da cascata): segue sem viés
+        return None
+    token_ids = set()
+    for label in labels:
+        for variant in (label, " " + label):
+            token_ids.update(encoding.encode(variant))
+    # A API aceita no máximo 300 entradas em logit_bias
+    if len(token_ids) > 300:
+        return None
+    return {str(token_id): _LABEL_LOGIT_BIAS for token_id in sorted(token_ids)}
+
+
+def _stream_label(stream, labels: Sequence[str]):
+    """Consome o stream até o rótulo completo e o fecha; devolve um objeto no formato da resposta."""
+    text, tokens, chunks = "", [], 0
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            chunks += 1
+            text += choice.delta.content or ""
+            logprobs = getattr(choice, "logprobs", None)
+            if logprobs is not None and logprobs.content:
+                tokens.extend(logprobs.content)
+            if _label_complete(text, labels):
+                with _stream_lock:
+                    _stream_stats["early_stops"] += 1
+                break
+    finally:
+        # Fechar a conexão interrompe a geração do restante da resposta
+        stream.close()
+    with _stream_lock:
+        _stream_stats["streams"] += 1
+    choice = SimpleNamespace(
+        message=SimpleNamespace(role="assistant", content=text),
+        logprobs=SimpleNamespace(content=tokens) if tokens else None,
+    )
+    return SimpleNamespace(choices=[choice], usage=None, completion_chunks=chunks)
+
+
+def _send(
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    deadline: Optional[float],
+    model: Optional[str] = None,
+    client: Optional[OpenAI] = None,
+    logprobs: bool = False,
+    labels: Optional[Sequence[str]] = None,
+):
+    """Uma tentativa de chamada, passando pelo limitador e repetindo respostas 429.
+
+    Com ``labels`` (e LLM_STREAM_LABELS ligado), a resposta vem em streaming e
+    a leitura para assim que a primeira palavra completa chega.
+    """
+    # Estimativa conservadora: ~4 caracteres por token mais o teto da resposta
+    estimated = len(prompt) / 4 + max_tokens
+    for attempt in range(_MAX_RATE_LIMIT_RETRIES + 1):
+        with _LIMITER.acquire(estimated, deadline):
+            left = remaining(deadline)
+            timeout = _REQUEST_TIMEOUT if left is None else min(_REQUEST_TIMEOUT, left)
+            if timeout <= 0:
+                raise DeadlineExceeded("Prazo do ticket esgotado antes da chamada ao LLM")
+            started = time.monotonic()
+            try:
+                extra = {"logprobs": True} if logprobs else {}
+                stream = bool(labels) and _STREAM_LABELS
+                if labels:
+                    bias = _label_logit_bias(tuple(labels), model or _MODEL)
+                    if bias:
+                        extra["logit_bias"] = bias
+                resp = (client or _client()).chat.completions.create(
+                    model=model or _MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=timeout,
+                    stream=stream,
+                    **extra,
+                )
+                if stream:
+                    resp = _stream_label(resp, labels)
+            except RateLimitError as exc:
+                _LIMITER.on_rate_limited(_retry_after(exc))
+                if attempt == _MAX_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+        _LIMITER.on_success(time.monotonic() - started)
+        usage = getattr(resp, "usage", None)
+        tokens = None
+        if usage is not None and usage.total_tokens:
+            tokens = usage.total_tokens
+        elif getattr(resp, "completion_chunks", None) is not None:
+            # Stream encerrado antes do fim não traz usage: cada chunk é ~1 token
+            tokens = len(prompt) / 4 + resp.completion_chunks
+        if tokens is not None:
+            _LIMITER.record_usage(estimated, tokens)
+        results_store.record_llm_call(tokens or 0)
+        return resp
+
+
+def _cascade_send(
+    name: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    deadline: Optional[float],
+    labels: Optional[Sequence[str]] = None,
+):
+    """Tenta o modelo pequeno e escala para o principal abaixo do limiar de confiança."""
+    mode = cascade.forced_mode()
+    if mode != "large":
+        try:
+            small = _send(prompt, temperature, max_tokens, deadline,
+                          model=_CASCADE.small_model, client=_small_client(), logprobs=True, labels=labels)
+            confidence = cascade.first_line_confidence(small)
+        except (DeadlineExceeded, RateLimitTimeout):
+            raise
+        except Exception as exc:
+            # Modelo pequeno indisponível não derruba a chamada: vai direto ao principal
+            print(f"AVISO: Modelo pequeno da cascata falhou ({name}): {exc}")
+            small, confidence = None, None
+        if small is not None and (mode == "small" or (confidence is not None and confidence >= _CASCADE.threshold(name))):
+            _CASCADE.record(name, escalated=False, confidence=confidence, model=_CASCADE.small_model)
+            return small
+        _CASCADE.record(name, escalated=True, confidence=confidence, model=_MODEL)
+    return _send(prompt, temperature, max_tokens, deadline, labels=labels)
+
+
+def _chat_completion(
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    deadline: Optional[float] = None,
+    hedge: bool = False,
+    cascade_name: Optional[str] = None,
+    labels: Optional[Sequence[str]] = None,
+):
+    """Envia o prompt ao LLM respeitando prazo, circuit breaker e limitador global.
+
+    Respostas 429 reduzem a concorrência e são repetidas após o Retry-After;
+    demais erros sobem para o chamador, que aplica seu fallback. Com o circuito
+    aberto ou o prazo esgotado, a chamada falha imediatamente. ``hedge`` ativa
+    o envio de uma cópia quando a resposta demora além do percentil recente.
+    ``cascade_name`` identifica a função na cascata de modelos, quando ligada.
+    ``labels`` lista os rótulos válidos de uma resposta de rótulo único, lida
+    em streaming até o rótulo completo.
+    """
+    check_deadline(deadline, "chamada ao LLM")
+    if not _BREAKER.allow():
+        raise CircuitOpenError("Circuito do LLM aberto; usando fallback")
+
+    if cascade_name and _CASCADE.enabled:
+        attempt = lambda: _cascade_send(cascade_name, prompt, temperature, max_tokens, deadline, labels)
+    else:
+        attempt = lambda: _send(prompt, temperature, max_tokens, deadline, labels=labels)
+
+    try:
+        if hedge and _HEDGER is not None:
+            resp = _HEDGER.run(attempt)
+        else:
+            resp = attempt()
+    except (DeadlineExceeded, RateLimitTimeout, RateLimitError):
+        # Falta de prazo ou de cota não indica falha do provedor
+        _BREAKER.release()
+        raise
+    except Exception:
+        _BREAKER.record_failure()
+        raise
+    _BREAKER.record_success()
+    return resp
+
+
+def llm_limiter_stats() -> Dict[str, float]:
+    """Expõe os contadores do limitador de chamadas ao LLM."""
+    return _LIMITER.stats()
 
 
-def classify_ticket_intent(description: str, title: str) -> Tuple[str, str]:
-    """Classifica a intencao de um ticket usando um serviço externo de classificação."""
+def llm_breaker_stats() -> Dict[str, object]:
+    """Expõe o estado e os contadores do circuit breaker do LLM."""
+    return _BREAKER.stats()
+
+
+def llm_hedge_stats() -> Optional[Dict[str, float]]:
+    """Expõe os contadores de hedging (None quando desligado)."""
+    return _HEDGER.stats() if _HEDGER is not None else None
+
+
+def llm_stream_stats() -> Dict[str, int]:
+    """Chamadas de rótulo em streaming e quantas foram encerradas antes do fim."""
+    with _stream_lock:
+        return dict(_stream_stats)
+
+
+def cascade_stats() -> Optional[Dict[str, Dict[str, float]]]:
+    """Expõe chamadas e taxa de escalonamento da cascata por função (None quando desligada)."""
+    return _CASCADE.stats() if _CASCADE.enabled else None
+
+
+def triage_cache_stats() -> Optional[Dict[str, Any]]:
+    """Expõe os contadores do cache de triagem (None quando desligado)."""
+    return _TRIAGE_CACHE.stats() if _TRIAGE_CACHE is not None else None
+
+
+def _triage_cached(key: Tuple, compute: Callable[[], Tuple[Any, bool]]) -> Any:
+    """Resposta em cache para ``key``; ``compute`` devolve (valor, veio do LLM).
+
+    Só respostas do LLM entram no cache: um fallback heurístico numa falha
+    momentânea não deve valer para os próximos tickets iguais.
+    """
+    if _TRIAGE_CACHE is None:
+        return compute()[0]
+    value = _TRIAGE_CACHE.get(key)
+    if value is None:
+        value, from_llm = compute()
+        if from_llm:
+            _TRIAGE_CACHE.set(key, value)
+    return value
+
+
+def classify_ticket_intent(
+    description: str, title: str, deadline: Optional[float] = None, features: Optional[Dict[str, Any]] = None
+) -> Tuple[str, str]:
+    """Classifica a intencao de um ticket usando um serviço externo de classificação.
+
+    ``features`` são os atributos do ticket (``tools.ticket_features``); sem
+    eles, são calculados a partir do título e da descrição.
+    """
+    features = features or text_features(title, description)
+    return _triage_cached(("classify", features["hash"]), lambda: _classify_intent(description, title, deadline))
+
+
+def _classify_intent(description: str, title: str, deadline: Optional[float]) -> Tuple[Tuple[str, str], bool]:
     prompt = (
         "Você é um classificador de tickets de suporte de TI.\n\n"
         f"TÍTULO: {title}\n"
@@ -47,26 +402,25 @@ def classify_ticket_intent(description: str, title: str) -> Tuple[str, str]:
     )
 
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-            max_tokens=10,
-        )
+        resp = _chat_completion(prompt, temperature=0, max_tokens=10, deadline=deadline, hedge=True,
+                                cascade_name="classify", labels=_CATEGORIES)
         content = (resp.choices[0].message.content or "").strip().lower()
         label = content.split()[0] if content else "out_of_scope"
         if label not in _CATEGORIES:
             label = "out_of_scope"
-        return label, content
+        return (label, content), True
     except Exception as exc:
         print(f"Erro ao classificar: {exc}")
-        return "out_of_scope", str(exc)
+        return ("out_of_scope", str(exc)), False
 
 
-def analyze_automation_capability(ticket: Dict, intent: str) -> Tuple[bool, str]:
+def analyze_automation_capability(ticket: Dict, intent: str, deadline: Optional[float] = None) -> Tuple[bool, str]:
     """Determina se o playbook de automacao deve tratar o ticket usando análise inteligente."""
+    key = ("automation", ticket_features(ticket)["hash"], intent)
+    return _triage_cached(key, lambda: _analyze_automation(ticket, intent, deadline))
+
+
+def _analyze_automation(ticket: Dict, intent: str, deadline: Optional[float]) -> Tuple[Tuple[bool, str], bool]:
     prompt = (
         "Você é um especialista em automação de tickets de TI.\n\n"
         f"TICKET ID: {ticket.get('id')}\n"
@@ -83,12 +437,7 @@ def analyze_automation_capability(ticket: Dict, intent: str) -> Tuple[bool, str]
     )
 
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=100,
-        )
+        resp = _chat_completion(prompt, temperature=0, max_tokens=100, deadline=deadline, cascade_name="automation")
         content = (resp.choices[0].message.content or "").strip()
         
         # Parse resposta
@@ -102,64 +451,57 @@ def analyze_automation_capability(ticket: Dict, intent: str) -> Tuple[bool, str]
             elif "RAZÃO:" in line or "RAZAO:" in line:
                 reason = line.split(":", 1)[1].strip()
         
-        return can_automate, reason
+        return (can_automate, reason), True
     except Exception as exc:
         print(f"Erro na análise de automação: {exc}")
         # Fallback para lógica simples
         automatable = intent in ["login_email", "login_azure", "login_windows", "account_locked", "password_reset"]
         fallback_reason = "Reset/desbloqueio automatizável" if automatable else "Requer análise manual"
-        return automatable, fallback_reason
+        return (automatable, fallback_reason), False
 
 
-def extract_system_from_description(description: str, title: str) -> str:
+def extract_system_from_description(
+    description: str, title: str, deadline: Optional[float] = None, features: Optional[Dict[str, Any]] = None
+) -> str:
     """Infere qual sistema esta afetado usando análise inteligente."""
+    features = features or text_features(title, description)
+    return _triage_cached(("system", features["hash"]), lambda: _extract_system(description, title, deadline, features))
+
+
+def _extract_system(description: str, title: str, deadline: Optional[float], features: Dict[str, Any]) -> Tuple[str, bool]:
     prompt = (
         "Você é um analista de sistemas de TI.\n\n"
         f"TÍTULO: {title}\n"
         f"DESCRIÇÃO: {description}\n\n"
         "Identifique qual sistema está afetado.\n\n"
         "Responda APENAS com UMA das opções:\n"
-        "- Email\n"
-        "- AD\n"
-        "- Windows\n"
-        "- Desconhecido\n\n"
-        "Sistema:"
+        + "\n".join(f"- {s}" for s in _SYSTEMS)
+        + "\n\nSistema:"
     )
 
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=10,
-        )
+        resp = _chat_completion(prompt, temperature=0, max_tokens=10, deadline=deadline, hedge=True,
+                                cascade_name="system", labels=_SYSTEMS)
         content = (resp.choices[0].message.content or "").strip()
         system = content.split()[0] if content else "Desconhecido"
         
-        valid_systems = ["Email", "AD", "Windows", "Desconhecido"]
-        if system not in valid_systems:
+        if system not in _SYSTEMS:
             # Tentativa de match parcial
             system_lower = system.lower()
             if "email" in system_lower or "outlook" in system_lower:
-                return "Email"
+                return "Email", True
             elif "ad" in system_lower or "azure" in system_lower or "active" in system_lower:
-                return "AD"
+                return "AD", True
             elif "windows" in system_lower:
-                return "Windows"
-            return "Desconhecido"
+                return "Windows", True
+            return "Desconhecido", True
         
-        return system
+        return system, True
     except Exception as exc:
         print(f"Erro ao extrair sistema: {exc}")
-        # Fallback para heurística simples
-        text = f"{title} {description}".lower()
-        if any(k in text for k in ["email", "outlook"]):
-            return "Email"
-        if any(k in text for k in ["azure", "active directory", " ad "]):
-            return "AD"
-        if any(k in text for k in ["windows", "pc", "notebook"]):
-            return "Windows"
-        return "Desconhecido"
+        # Fallback para heurística simples: palavras-chave "system:*" já casadas nos atributos
+        matched = keyword_match(features, "system")
+        return (matched[0] if matched else "Desconhecido"), False
 
 
 def generate_resolution_summary(actions: list) -> str:
@@ -167,10 +509,36 @@ def generate_resolution_summary(actions: list) -> str:
     return "\n".join(f"- {a}" for a in actions)
 
 
+def generate_digest_summary(recipient_type: str, items: List[Dict], deadline: Optional[float] = None) -> str:
+    """Resume em um parágrafo os tickets de um e-mail agrupado (vazio em caso de erro).
+
+    Uma única chamada ao LLM por resumo, no lugar de um e-mail gerado por ticket.
+    """
+    audience = "o gestor dos colaboradores" if recipient_type == "manager" else "a equipe de suporte"
+    lines = "\n".join(
+        f"- Ticket #{item['ticket_id']} ({item.get('user_name') or 'colaborador'}): {item['status']} - "
+        f"{(item.get('details') or '').strip().splitlines()[0] if (item.get('details') or '').strip() else 'sem detalhes'}"
+        for item in items
+    )
+    prompt = (
+        "Você é um assistente de suporte de TI que resume notificações de tickets.\n\n"
+        f"Escreva um parágrafo curto para {audience} resumindo os {len(items)} tickets abaixo. "
+        "Destaque padrões (mesmo incidente, mesmo sistema) e o que exige atenção. Não liste os tickets um a um.\n\n"
+        f"TICKETS:\n{lines}\n\nResumo:"
+    )
+    try:
+        resp = _chat_completion(prompt, temperature=0.3, max_tokens=200, deadline=deadline)
+        return (resp.choices[0].message.content or "").strip()
+    except Exception as exc:
+        print(f"Erro ao gerar resumo do e-mail agrupado: {exc}")
+        return ""
+
+
 def generate_personalized_email(
     recipient_type: str,
     ticket: Dict,
-    context: Dict
+    context: Dict,
+    deadline: Optional[float] = None
 ) -> Tuple[str, str]:
     """Gera assunto e corpo de email personalizados usando LLM.
     
@@ -178,6 +546,7 @@ def generate_personalized_email(
         recipient_type: "user", "manager" ou "team"
         ticket: Dados do ticket
         context: Contexto adicional (actions_summary, temp_password, reason, etc.)
+        deadline: Prazo do ticket (``time.time()``); esgotado, usa o template simples
     
     Returns:
         Tuple[subject, body]
@@ -262,12 +631,7 @@ def generate_personalized_email(
         return "Notificação de Ticket", "Email não gerado - tipo de destinatário inválido"
     
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500,
-        )
+        resp = _chat_completion(prompt, temperature=0.7, max_tokens=500, deadline=deadline)
         content = (resp.choices[0].message.content or "").strip()
         
         # Parse resposta
@@ -296,12 +660,17 @@ def generate_personalized_email(
         return subject, body
 
 
-def analyze_ticket_priority_and_complexity(ticket: Dict) -> Dict:
+def analyze_ticket_priority_and_complexity(ticket: Dict, deadline: Optional[float] = None) -> Dict:
     """Avalia prioridade e complexidade do ticket usando LLM.
     
     Returns:
         Dict com priority ("low", "medium", "high", "critical") e complexity ("simple", "moderate", "complex")
     """
+    key = ("priority", ticket_features(ticket)["hash"])
+    return dict(_triage_cached(key, lambda: _analyze_priority(ticket, deadline)))
+
+
+def _analyze_priority(ticket: Dict, deadline: Optional[float]) -> Tuple[Dict, bool]:
     prompt = (
         "Você é um analista de suporte de TI especializado em triagem de tickets.\n\n"
         f"TICKET #{ticket.get('id')}\n"
@@ -317,12 +686,7 @@ def analyze_ticket_priority_and_complexity(ticket: Dict) -> Dict:
     )
 
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=100,
-        )
+        resp = _chat_completion(prompt, temperature=0, max_tokens=100, deadline=deadline, cascade_name="priority")
         content = (resp.choices[0].message.content or "").strip()
         
         # Parse resposta
@@ -346,19 +710,28 @@ def analyze_ticket_priority_and_complexity(ticket: Dict) -> Dict:
             "priority": priority,
             "complexity": complexity,
             "justification": justification
-        }
+        }, True
     except Exception as exc:
         print(f"Erro ao avaliar prioridade/complexidade: {exc}")
         return {
             "priority": "medium",
             "complexity": "moderate",
             "justification": "Erro na avaliação automática"
-        }
+        }, False
 
 
-def diagnose_issue(ticket: Dict, system: str, user_info: Dict = None) -> Dict:
+def diagnose_issue(
+    ticket: Dict,
+    system: str,
+    user_info: Dict = None,
+    deadline: Optional[float] = None,
+    examples: Optional[List[Dict]] = None,
+) -> Dict:
     """Analisa sintomas e sugere diagnósticos e ações usando LLM.
     
+    ``examples`` são tickets resolvidos parecidos (do índice de diagnósticos),
+    incluídos no prompt como referência.
+    
     Returns:
         Dict com diagnosis (texto), suggested_actions (lista) e confidence ("low", "medium", "high")
     """
@@ -374,6 +747,15 @@ def diagnose_issue(ticket: Dict, system: str, user_info: Dict = None) -> Dict:
         prompt += f"USUÁRIO: {user_info.get('username', 'N/A')}\n"
         prompt += f"STATUS DA CONTA: {user_info.get('status', 'N/A')}\n"
     
+    if examples:
+        prompt += "\nCASOS SEMELHANTES JÁ RESOLVIDOS:\n"
+        for example in examples:
+            prompt += (
+                f"- Ticket: {example.get('title')} ({example.get('system')})\n"
+                f"  Diagnóstico: {example.get('diagnosis')}\n"
+                f"  Ações: {'; '.join(example.get('suggested_actions', []))}\n"
+            )
+    
     prompt += (
         "\nCom base nos sintomas descritos:\n"
         "1. Faça um diagnóstico do problema\n"
@@ -388,12 +770,7 @@ def diagnose_issue(ticket: Dict, system: str, user_info: Dict = None) -> Dict:
     )
 
     try:
-        resp = _client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=300,
-        )
+        resp = _chat_completion(prompt, temperature=0.3, max_tokens=300, deadline=deadline)
         content = (resp.choices[0].message.content or "").strip()
         
         # Parse resposta
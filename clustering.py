@@ -0,0 +1,156 @@
+"""Agrupamento de tickets quase idênticos para triar um incidente uma única vez.
+
+Durante uma indisponibilidade chegam dezenas de tickets com o mesmo texto
+(com pequenas variações). Cada ticket vira uma assinatura MinHash sobre
+shingles de caracteres do texto normalizado guardado nos atributos do ticket; o LSH por bandas encontra
+candidatos e a similaridade de Jaccard estimada confirma o par. O primeiro
+ticket de cada grupo (na ordem da fila) é o representante: sua triagem
+(intenção, sistema, prioridade e elegibilidade) é reaproveitada pelos demais,
+enquanto as ações por usuário continuam individuais.
+"""
+
+# Imports de bibliotecas padrão para hashing e configuração
+import hashlib
+import os
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from tools.ticket_features import normalize_text, ticket_features
+
+# Liga o agrupamento no processamento em lote (TICKET_CLUSTERING=true)
+CLUSTERING_ENABLED = os.getenv("TICKET_CLUSTERING", "false").lower() == "true"
+
+# Similaridade de Jaccard mínima para dois tickets caírem no mesmo grupo
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", "0.7"))
+
+# Campos da triagem copiados do representante para os demais membros
+TRIAGE_FIELDS = [
+    "intent",
+    "intent_details",
+    "system",
+    "priority",
+    "complexity",
+    "priority_justification",
+    "can_automate",
+    "automation_reason",
+]
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_SHINGLE = 4
+_PRIME = (1 << 61) - 1
+
+# Permutações fixas: assinaturas comparáveis entre execuções e processos
+_rng = random.Random(20251106)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+
+def _shingles(text: str) -> Iterable[int]:
+    """Hashes de 64 bits dos shingles de caracteres do texto normalizado."""
+    if len(text) <= _SHINGLE:
+        grams = {text}
+    else:
+        grams = {text[i:i + _SHINGLE] for i in range(len(text) - _SHINGLE + 1)}
+    return [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams]
+
+def minhash(text: str) -> List[int]:
+    """Assinatura MinHash de ``_NUM_PERM`` posições do texto."""
+    return _signature(normalize_text(text))
+
+def _signature(normalized: str) -> List[int]:
+    hashes = _shingles(normalized)
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimativa da similaridade de Jaccard entre duas assinaturas."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+def cluster_tickets(tickets: List[Dict[str, Any]], threshold: float = CLUSTER_THRESHOLD) -> Dict[Any, Any]:
+    """Mapeia o id de cada ticket para o id do representante do seu grupo.
+
+    O representante é o primeiro ticket do grupo na ordem recebida, de modo
+    que, processando a fila nessa ordem, ele sempre é triado antes dos membros.
+    """
+    # Textos idênticos (comuns em incidentes) têm o mesmo hash e reaproveitam a assinatura
+    cache: Dict[str, List[int]] = {}
+    signatures = []
+    for ticket in tickets:
+        features = ticket_features(ticket)
+        if features["hash"] not in cache:
+            cache[features["hash"]] = _signature(features["text"])
+        signatures.append(cache[features["hash"]])
+    parent = list(range(len(tickets)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # LSH: tickets que coincidem em alguma banda viram candidatos
+    buckets: Dict[tuple, List[int]] = {}
+    for idx, sig in enumerate(signatures):
+        for band in range(_BANDS):
+            key = (band, *sig[band * _ROWS:(band + 1) * _ROWS])
+            buckets.setdefault(key, []).append(idx)
+
+    for members in buckets.values():
+        # Compara cada candidato com um exemplar de cada grupo já visto na banda
+        exemplars = [members[0]]
+        for other in members[1:]:
+            for exemplar in exemplars:
+                root_a, root_b = find(exemplar), find(other)
+                if root_a == root_b:
+                    break
+                if similarity(signatures[exemplar], signatures[other]) >= threshold:
+                    # A menor posição vira raiz para manter o representante mais antigo
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+                    break
+            else:
+                exemplars.append(other)
+
+    return {ticket["id"]: tickets[find(idx)]["id"] for idx, ticket in enumerate(tickets)}
+
+def triage_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrai do resultado do representante os campos reaproveitáveis."""
+    return {field: result[field] for field in TRIAGE_FIELDS if field in result}
+
+def cluster_summary(representatives: Dict[Any, Any]) -> Dict[str, int]:
+    """Quantidade de grupos e de tickets que reaproveitam a triagem."""
+    groups = set(representatives.values())
+    return {"tickets": len(representatives), "clusters": len(groups), "reused": len(representatives) - len(groups)}
+
+class SharedTriage:
+    """Triagens dos representantes compartilhadas entre workers.
+
+    Um membro processado enquanto o representante ainda está em andamento
+    espera a triagem dele (até ``timeout``) em vez de repeti-la. O
+    representante publica ao fim da triagem, sem esperar playbook, e-mails
+    e diagnóstico; publica de novo ao terminar, o que só vale se a triagem
+    não chegou a sair (ex.: erro antes da elegibilidade). Exige que o
+    representante seja retirado da fila antes dos membros.
+    """
+
+    def __init__(self, representatives: Dict[Any, Any]):
+        self._representatives = representatives
+        self._events = {rep: threading.Event() for rep in set(representatives.values())}
+        self._triages: Dict[Any, Dict[str, Any]] = {}
+
+    def for_ticket(self, ticket_id: Any, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Triagem herdada pelo ticket (None para representantes e avulsos)."""
+        representative = self._representatives.get(ticket_id, ticket_id)
+        if representative == ticket_id:
+            return None
+        self._events[representative].wait(timeout)
+        return self._triages.get(representative)
+
+    def publish(self, ticket_id: Any, result: Dict[str, Any]) -> None:
+        """Registra a triagem de um representante e libera os membros que aguardam (só a primeira vale)."""
+        event = self._events.get(ticket_id)
+        if event is None or event.is_set():
+            return
+        if result.get("intent"):
+            self._triages[ticket_id] = triage_fields(result)
+        # Mesmo sem triagem (erro), os membros seguem com o fluxo completo
+        event.set()
@@ -0,0 +1,197 @@
+"""Índice vetorial local de tickets resolvidos para diagnóstico por recuperação.
+
+Cada ticket resolvido vira um embedding por hashing de termos (unigramas e
+bigramas do texto normalizado), gravado em um arquivo float32 só de acréscimo
+(``vectors.f32``) ao lado dos metadados em ``entries.jsonl``; cada entrada
+guarda a linha (``row``) do seu vetor, e os acréscimos de vários processos
+(``main.py --queue``) são serializados por um lock de arquivo. A busca é força
+bruta com produto interno sobre a matriz em memória: acima de
+``DIAGNOSIS_REUSE_THRESHOLD`` o diagnóstico guardado é reaproveitado; abaixo,
+os vizinhos mais próximos viram exemplos few-shot para o LLM.
+"""
+
+# Imports de bibliotecas padrão para hashing, arquivos e sincronização
+import hashlib
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos; o ``row`` ainda evita trocar os pares
+    fcntl = None
+
+from tools.ticket_features import normalize_text, ticket_features
+
+# Liga a consulta e a gravação do índice (DIAGNOSIS_INDEX_ENABLED=false desliga)
+INDEX_ENABLED = os.getenv("DIAGNOSIS_INDEX_ENABLED", "true").lower() == "true"
+
+# Diretório com vectors.f32 e entries.jsonl
+INDEX_PATH = Path(os.getenv("DIAGNOSIS_INDEX_PATH", str(Path(__file__).parent / "data" / "diagnosis_index")))
+
+# Similaridade de cosseno a partir da qual o diagnóstico guardado é reaproveitado
+REUSE_THRESHOLD = float(os.getenv("DIAGNOSIS_REUSE_THRESHOLD", "0.92"))
+
+# Similaridade mínima para um vizinho servir de exemplo few-shot
+EXAMPLE_THRESHOLD = float(os.getenv("DIAGNOSIS_EXAMPLE_THRESHOLD", "0.5"))
+
+DIM = 256
+
+def ticket_text(ticket: Dict[str, Any], system: str) -> str:
+    """Texto indexado: título e descrição (já normalizados nos atributos) e sistema afetado."""
+    return f"{ticket_features(ticket)['text']} sistema {system}"
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """Embedding por hashing de unigramas e bigramas, normalizado (L2)."""
+    words = normalize_text(text).split()
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts: Dict[str, int] = {}
+    for term in terms:
+        counts[term] = counts.get(term, 0) + 1
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for term, count in counts.items():
+        digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "big")
+        # O bit menos significativo define o sinal e reduz o viés das colisões
+        sign = 1.0 if digest & 1 else -1.0
+        vector[(digest >> 1) % dim] += sign * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+class DiagnosisIndex:
+    """Matriz de embeddings em memória espelhada em arquivos só de acréscimo."""
+
+    def __init__(self, path: Path = INDEX_PATH, dim: int = DIM):
+        self.path = Path(path)
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._stats = {"searches": 0, "reused": 0, "added": 0}
+        self._load()
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _entries_file(self) -> Path:
+        return self.path / "entries.jsonl"
+
+    @property
+    def _lock_file(self) -> Path:
+        return self.path / "index.lock"
+
+    def _load(self) -> None:
+        if not self._entries_file.exists() or not self._vectors_file.exists():
+            return
+        with open(self._entries_file, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        # Só linhas completas: uma gravação interrompida pode deixar bytes soltos no fim
+        rows = self._vectors_file.stat().st_size // (self.dim * 4)
+        if not rows:
+            return
+        matrix = np.memmap(self._vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        # Cada entrada aponta para o próprio vetor; entradas antigas, sem ``row``, seguem a posição.
+        # Vetor sem entrada (gravação interrompida) fica de fora.
+        pairs = [(entry.get("row", position), entry) for position, entry in enumerate(entries)]
+        pairs = [(row, entry) for row, entry in pairs if 0 <= row < rows]
+        self._entries = [entry for _, entry in pairs]
+        self._matrix = np.array(matrix[[row for row, _ in pairs]], dtype=np.float32).reshape(len(pairs), self.dim)
+        self._size = len(pairs)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def search(self, text: str, k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """Os ``k`` vizinhos mais próximos como (similaridade, entrada), do maior para o menor."""
+        query = embed(text, self.dim)
+        with self._lock:
+            self._stats["searches"] += 1
+            if not self._size:
+                return []
+            scores = self._matrix[:self._size] @ query
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), self._entries[i]) for i in top]
+
+    def add(self, text: str, entry: Dict[str, Any]) -> None:
+        """Acrescenta um ticket resolvido ao índice e aos arquivos."""
+        vector = embed(text, self.dim)
+        with self._lock:
+            entry = self._append(vector, entry)
+            if self._size == len(self._matrix):
+                # Capacidade dobra para manter o acréscimo amortizado O(1)
+                grown = np.zeros((max(64, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size] = vector
+            self._entries.append(entry)
+            self._size += 1
+            self._stats["added"] += 1
+
+    def _append(self, vector: np.ndarray, entry: Dict[str, Any]) -> Dict[str, Any]:
+        # Chamado com o lock da instância; o lock de arquivo cobre os outros processos
+        self.path.mkdir(parents=True, exist_ok=True)
+        row_bytes = self.dim * 4
+        with open(self._lock_file, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(self._vectors_file, "ab") as f:
+                end = f.seek(0, os.SEEK_END)
+                # Descarta o vetor parcial de uma gravação interrompida para manter o alinhamento
+                if end % row_bytes:
+                    end -= end % row_bytes
+                    f.truncate(end)
+                f.write(vector.tobytes())
+            entry = {**entry, "row": end // row_bytes}
+            with open(self._entries_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def record_reuse(self) -> None:
+        with self._lock:
+            self._stats["reused"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": self._size}
+
+_index: Optional[DiagnosisIndex] = None
+_index_lock = threading.Lock()
+
+def get_index() -> Optional[DiagnosisIndex]:
+    """Índice compartilhado do processo (None quando desligado)."""
+    global _index
+    if not INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = DiagnosisIndex(INDEX_PATH)
+        return _index
+
+def record_resolution(ticket: Dict[str, Any], state: Dict[str, Any]) -> None:
+    """Indexa o diagnóstico de um ticket resolvido (ignora os já reaproveitados)."""
+    index = get_index()
+    if index is None or not state.get("diagnosis") or state.get("diagnosis_source") == "index":
+        return
+    if state.get("diagnosis_confidence") == "low":
+        return
+    system = state.get("system", "Desconhecido")
+    index.add(ticket_text(ticket, system), {
+        "ticket_id": ticket.get("id"),
+        "title": ticket.get("title"),
+        "description": ticket.get("description"),
+        "system": system,
+        "intent": state.get("intent"),
+        "diagnosis": state["diagnosis"],
+        "suggested_actions": state.get("suggested_actions", []),
+        "confidence": state.get("diagnosis_confidence", "medium"),
+    })
@@ -1,8 +1,19 @@
 """Nos do fluxo que orquestram o pipeline automatizado de tickets."""
 
-from typing import TypedDict, Literal, List, Dict, Any
+import contextvars
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import TypedDict, Literal, List, Dict, Any, Optional, Set, Callable
 from langgraph.graph import StateGraph, END
 from tools import ticket_manager, identity_service, email_service
+from tools.ticket_features import ticket_features
+import diagnosis_index
+import playbooks
+import results_store
+from resilience import DeadlineExceeded, check_deadline, new_deadline, remaining
 from classifier import (
     classify_ticket_intent,
     analyze_automation_capability,
@@ -12,6 +23,35 @@ from classifier import (
     diagnose_issue
 )
 
+# "lazy" (padrão): o diagnóstico sai do caminho crítico; "eager": roda antes do playbook
+DIAGNOSIS_MODE = os.getenv("DIAGNOSIS_MODE", "lazy").strip().lower()
+
+# Intenções cujo playbook dispensa diagnóstico quando a classificação é inequívoca
+DIAGNOSIS_SKIP_INTENTS = {
+    intent.strip() for intent in os.getenv("DIAGNOSIS_SKIP_INTENTS", "password_reset,account_locked").split(",") if intent.strip()
+}
+
+# Workers que executam os diagnósticos adiados para depois da notificação
+DIAGNOSIS_DEFERRED_WORKERS = int(os.getenv("DIAGNOSIS_DEFERRED_WORKERS", "2"))
+
+_deferred_lock = threading.Lock()
+_deferred_pool: Optional[ThreadPoolExecutor] = None
+_deferred_pending: Set[Future] = set()
+_diagnosis_stats = {"inline": 0, "deferred": 0, "skipped": 0, "on_demand": 0}
+
+# Ouvinte da triagem concluída na execução atual (o agrupamento libera os membros do grupo)
+_triage_listener: contextvars.ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "triage_listener", default=None)
+
+@contextmanager
+def triage_listener(callback: Callable[[Dict[str, Any]], None]):
+    """Chama ``callback(estado)`` assim que a triagem termina, antes das ações do ticket."""
+    token = _triage_listener.set(callback)
+    try:
+        yield
+    finally:
+        _triage_listener.reset(token)
+
 class TicketState(TypedDict, total=False):
     """Estado compartilhado trocado entre os nos do LangGraph."""
 
@@ -22,6 +62,7 @@ class TicketState(TypedDict, total=False):
     can_automate: bool
     automation_reason: str
     user_info: Dict[str, Any]
+    lock_status: Dict[str, Any]
     actions_performed: List[str]
     playbook_result: Dict[str, Any]
     resolution_summary: str
@@ -33,6 +74,9 @@ class TicketState(TypedDict, total=False):
     diagnosis: str
     suggested_actions: List[str]
     diagnosis_confidence: str
+    diagnosis_source: str
+    deadline: float
+    prefetch_key: str
 
 def node_classify_intent(state: TicketState) -> TicketState:
     """Aciona o classificador para inferir a intencao do ticket e persistir no estado."""
@@ -41,13 +85,29 @@ def node_classify_intent(state: TicketState) -> TicketState:
     print(f"STEP 1: Classificando intenção do Ticket #{ticket['id']}")
     print(f"{'='*80}")
     
-    intent, details = classify_ticket_intent(ticket["description"], ticket["title"])
+    # Primeiro nó do fluxo: fixa o prazo do ticket quando o chamador não definiu um
+    deadline = state.get("deadline") or new_deadline()
+    
+    # Perfil e bloqueio do solicitante são buscados em paralelo com a triagem no LLM;
+    # a chave é desta execução, para que reprocessar o mesmo id não herde a consulta de outra
+    prefetch_key = state.get("prefetch_key") or f"{ticket['id']}:{uuid.uuid4().hex}"
+    identity_service.prefetch_requester(prefetch_key, ticket["requester"])
+    
+    if state.get("intent"):
+        # Triagem herdada do representante do grupo de tickets quase idênticos
+        intent, details = state["intent"], state.get("intent_details", "")
+        print("Reutilizando a triagem do grupo (sem chamada ao LLM)")
+    else:
+        intent, details = classify_ticket_intent(ticket["description"], ticket["title"], deadline=deadline,
+                                                 features=ticket_features(ticket))
     
     print(f"Intenção identificada: {intent}")
     print(f"Detalhes: {details}")
     
     return {
         **state,
+        "deadline": deadline,
+        "prefetch_key": prefetch_key,
         "intent": intent,
         "intent_details": details
     }
@@ -59,7 +119,9 @@ def node_extract_system(state: TicketState) -> TicketState:
     print(f"STEP 2: Identificando sistema afetado")
     print(f"{'='*80}")
     
-    system = extract_system_from_description(ticket["description"], ticket["title"])
+    system = state.get("system") or extract_system_from_description(
+        ticket["description"], ticket["title"], deadline=state.get("deadline"), features=ticket_features(ticket)
+    )
     
     print(f"Sistema identificado: {system}")
     
@@ -75,7 +137,14 @@ def node_analyze_priority(state: TicketState) -> TicketState:
     print(f"STEP 2.5: Analisando prioridade e complexidade")
     print(f"{'='*80}")
     
-    analysis = analyze_ticket_priority_and_complexity(ticket)
+    if state.get("priority"):
+        analysis = {
+            "priority": state["priority"],
+            "complexity": state.get("complexity", "medium"),
+            "justification": state.get("priority_justification", ""),
+        }
+    else:
+        analysis = analyze_ticket_priority_and_complexity(ticket, deadline=state.get("deadline"))
     
     print(f"Prioridade: {analysis['priority']}")
     print(f"Complexidade: {analysis['complexity']}")
@@ -88,17 +157,55 @@ def node_analyze_priority(state: TicketState) -> TicketState:
         "priority_justification": analysis["justification"]
     }
 
+def run_diagnosis(
+    ticket: Dict[str, Any],
+    system: str,
+    user_info: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Diagnostica o ticket, reaproveitando o índice quando há um caso quase igual.
+
+    Devolve ``diagnosis``, ``suggested_actions``, ``confidence`` e ``source``
+    (``index`` ou ``llm``). Usado pelo nó do grafo, pelo diagnóstico adiado e
+    pela interface, sob demanda.
+    """
+    # Tickets quase iguais a um já resolvido reaproveitam o diagnóstico guardado
+    index = diagnosis_index.get_index()
+    matches = index.search(diagnosis_index.ticket_text(ticket, system)) if index is not None else []
+    if matches and matches[0][0] >= diagnosis_index.REUSE_THRESHOLD:
+        score, entry = matches[0]
+        index.record_reuse()
+        print(f"Diagnóstico reaproveitado do ticket #{entry.get('ticket_id')} (similaridade {score:.2f})")
+        return {
+            "diagnosis": entry["diagnosis"],
+            "suggested_actions": entry.get("suggested_actions", []),
+            "confidence": entry.get("confidence", "medium"),
+            "source": "index",
+        }
+    examples = [entry for score, entry in matches if score >= diagnosis_index.EXAMPLE_THRESHOLD]
+    return {**diagnose_issue(ticket, system, user_info, deadline=deadline, examples=examples), "source": "llm"}
+
+def diagnosis_needed(state: TicketState) -> bool:
+    """Falso quando o playbook resolve sem diagnóstico: intenção simples e classificação inequívoca."""
+    intent = state.get("intent", "")
+    # O classificador respondeu exatamente a categoria, sem hesitação nem fallback
+    unambiguous = (state.get("intent_details") or "").strip().lower() == intent
+    return not (intent in DIAGNOSIS_SKIP_INTENTS and unambiguous and state.get("can_automate"))
+
+def _count_diagnosis(kind: str) -> None:
+    with _deferred_lock:
+        _diagnosis_stats[kind] += 1
+
 def node_diagnose(state: TicketState) -> TicketState:
     """Realiza diagnóstico inteligente do problema."""
-    ticket = state["ticket"]
-    system = state.get("system", "Desconhecido")
-    user_info = state.get("user_info")
-    
     print(f"\n{'='*80}")
     print(f"STEP 4.5: Realizando diagnóstico inteligente")
     print(f"{'='*80}")
     
-    diagnosis_result = diagnose_issue(ticket, system, user_info)
+    diagnosis_result = run_diagnosis(
+        state["ticket"], state.get("system", "Desconhecido"), state.get("user_info"), deadline=state.get("deadline")
+    )
+    _count_diagnosis("inline")
     
     print(f"Diagnóstico: {diagnosis_result['diagnosis']}")
     print(f"Confiança: {diagnosis_result['confidence']}")
@@ -110,9 +217,77 @@ def node_diagnose(state: TicketState) -> TicketState:
         **state,
         "diagnosis": diagnosis_result["diagnosis"],
         "suggested_actions": diagnosis_result["suggested_actions"],
-        "diagnosis_confidence": diagnosis_result["confidence"]
+        "diagnosis_confidence": diagnosis_result["confidence"],
+        "diagnosis_source": diagnosis_result["source"]
     }
 
+def _deferred_diagnosis(state: TicketState, resolved: bool) -> None:
+    ticket = state["ticket"]
+    # Fora do caminho crítico: o prazo do ticket já não se aplica
+    result = run_diagnosis(ticket, state.get("system", "Desconhecido"), state.get("user_info"), deadline=new_deadline())
+    if resolved:
+        diagnosis_index.record_resolution(ticket, {
+            **state,
+            "diagnosis": result["diagnosis"],
+            "suggested_actions": result["suggested_actions"],
+            "diagnosis_confidence": result["confidence"],
+            "diagnosis_source": result["source"],
+        })
+    else:
+        actions = "\n".join(f"- {action}" for action in result["suggested_actions"])
+        ticket_manager.add_comment(
+            ticket["id"],
+            f"DIAGNÓSTICO (confiança {result['confidence']}):\n{result['diagnosis']}\n\nAÇÕES SUGERIDAS:\n{actions}",
+        )
+
+def defer_diagnosis(state: TicketState, resolved: bool) -> None:
+    """Agenda o diagnóstico para depois da notificação, quando ele ainda é útil.
+
+    Tickets resolvidos alimentam o índice de diagnósticos; falhas do playbook
+    recebem o diagnóstico como comentário para a equipe que assumir o ticket.
+    """
+    global _deferred_pool
+    if not diagnosis_needed(state):
+        _count_diagnosis("skipped")
+        return
+
+    def run() -> None:
+        try:
+            _deferred_diagnosis(state, resolved)
+        except Exception as e:
+            print(f"AVISO: Falha no diagnóstico adiado do ticket #{state['ticket']['id']}: {e}")
+
+    with _deferred_lock:
+        if _deferred_pool is None:
+            _deferred_pool = ThreadPoolExecutor(max_workers=DIAGNOSIS_DEFERRED_WORKERS, thread_name_prefix="diagnosis")
+        future = _deferred_pool.submit(run)
+        _deferred_pending.add(future)
+        _diagnosis_stats["deferred"] += 1
+    future.add_done_callback(lambda f: _discard_deferred(f))
+
+def _discard_deferred(future: Future) -> None:
+    with _deferred_lock:
+        _deferred_pending.discard(future)
+
+def wait_deferred_diagnoses(timeout: Optional[float] = None) -> int:
+    """Aguarda os diagnósticos adiados em andamento; devolve quantos não terminaram."""
+    with _deferred_lock:
+        pending = list(_deferred_pending)
+    if not pending:
+        return 0
+    _, not_done = wait(pending, timeout=timeout)
+    return len(not_done)
+
+def diagnose_on_demand(ticket: Dict[str, Any], system: str) -> Dict[str, Any]:
+    """Diagnóstico pedido por um atendente ao abrir um ticket escalado."""
+    _count_diagnosis("on_demand")
+    return run_diagnosis(ticket, system or "Desconhecido", deadline=new_deadline())
+
+def diagnosis_stats() -> Dict[str, int]:
+    """Diagnósticos no fluxo, adiados, dispensados e sob demanda."""
+    with _deferred_lock:
+        return {**_diagnosis_stats, "pending": len(_deferred_pending)}
+
 def node_check_eligibility(state: TicketState) -> TicketState:
     """Decide se o ticket atual pode ser resolvido automaticamente."""
     intent = state["intent"]
@@ -120,16 +295,24 @@ def node_check_eligibility(state: TicketState) -> TicketState:
     print(f"STEP 3: Analisando capacidade de automação")
     print(f"{'='*80}")
     
-    can_automate, reason = analyze_automation_capability(state["ticket"], intent)
+    if "can_automate" in state:
+        can_automate, reason = state["can_automate"], state.get("automation_reason", "")
+    else:
+        can_automate, reason = analyze_automation_capability(state["ticket"], intent, deadline=state.get("deadline"))
     
     print(f"Pode automatizar? {can_automate}")
     print(f"Razão: {reason}")
     
-    return {
+    result = {
         **state,
         "can_automate": can_automate,
         "automation_reason": reason
     }
+    # Intenção, sistema, prioridade e elegibilidade estão definidos: a triagem terminou
+    listener = _triage_listener.get()
+    if listener is not None:
+        listener(result)
+    return result
 
 def node_get_user_info(state: TicketState) -> TicketState:
     """Busca informacoes basicas do solicitante no servico de identidade."""
@@ -138,15 +321,29 @@ def node_get_user_info(state: TicketState) -> TicketState:
     print(f"STEP 4: Buscando informações do usuário")
     print(f"{'='*80}")
     
-    user_info = identity_service.get_user(ticket["requester"])
+    lock_status = None
+    try:
+        check_deadline(state.get("deadline"), "consulta ao diretório")
+        prefetched = identity_service.take_prefetch(state.get("prefetch_key"), ticket["requester"],
+                                                    timeout=remaining(state.get("deadline")))
+        if prefetched is not None:
+            print("Usando consulta antecipada de identidade")
+            user_info, lock_status = prefetched["user"], prefetched["lock_status"]
+        else:
+            check_deadline(state.get("deadline"), "consulta ao diretório")
+            user_info = identity_service.get_user(ticket["requester"])
+    except DeadlineExceeded as e:
+        print(f"AVISO: {e}")
+        user_info = {"ok": False, "error": str(e)}
     
     return {
         **state,
-        "user_info": user_info
+        "user_info": user_info,
+        "lock_status": lock_status
     }
 
 def node_execute_playbook(state: TicketState) -> TicketState:
-    """Executa o playbook automatizado para problemas de credenciais."""
+    """Executa o playbook declarado para a intenção e o sistema do ticket."""
     ticket = state["ticket"]
     user_info = state.get("user_info", {})
     system = state.get("system", "AD")
@@ -156,36 +353,20 @@ def node_execute_playbook(state: TicketState) -> TicketState:
     print(f"STEP 5: Executando playbook de resolução")
     print(f"{'='*80}")
     
-    actions_performed = []
-    playbook_result = {"ok": True, "actions": []}
-    
     try:
         user_id = user_info.get("user_id", ticket["requester"].split("@")[0])
+        playbook = playbooks.get_registry().select(intent, system)
+        if playbook is None:
+            raise playbooks.PlaybookError(f"Nenhum playbook habilitado para '{intent}' no sistema {system}")
         
-        if "locked" in intent or "login" in intent:
-            lock_status = identity_service.check_user_locked(user_id)
-            actions_performed.append(f"Verificação de bloqueio: {'Bloqueado' if lock_status.get('is_locked') else 'Desbloqueado'}")
-            
-            if lock_status.get("is_locked"):
-                unlock_result = identity_service.unlock_user(user_id, system)
-                if unlock_result.get("ok"):
-                    actions_performed.append(f"Usuário desbloqueado no {system}")
-                    playbook_result["actions"].append(unlock_result)
-        
-        if "password" in intent or "reset" in intent or "login" in intent:
-            reset_result = identity_service.reset_password(user_id, system)
-            if reset_result.get("ok"):
-                actions_performed.append(f"Senha resetada no {system}")
-                playbook_result["temp_password"] = reset_result.get("temp_password")
-                playbook_result["actions"].append(reset_result)
-        
-        verify_result = identity_service.verify_user_unlocked(user_id, system)
-        if verify_result.get("ok"):
-            actions_performed.append(f"Verificação final: Usuário desbloqueado")
-            playbook_result["actions"].append(verify_result)
-        
-        playbook_result["ok"] = True
-        playbook_result["user_id"] = user_id
+        print(f"Playbook: {playbook.name}")
+        context = {"user_id": user_id, "system": system, "lock_status": state.get("lock_status")}
+        outcome = playbooks.run_playbook(playbook, context, deadline=state.get("deadline"))
+        actions_performed = outcome.pop("actions_performed")
+        playbook_result = {**outcome, "user_id": user_id}
+        if not outcome["ok"]:
+            print(f"ERRO durante execução do playbook: {outcome['error']}")
+            actions_performed.append(f"ERRO: {outcome['error']}")
         
     except Exception as e:
         print(f"ERRO durante execução do playbook: {e}")
@@ -194,7 +375,7 @@ def node_execute_playbook(state: TicketState) -> TicketState:
             "error": str(e),
             "actions": []
         }
-        actions_performed.append(f"ERRO: {str(e)}")
+        actions_performed = [f"ERRO: {str(e)}"]
     
     return {
         **state,
@@ -240,7 +421,8 @@ Status: Resolvido
             email_service.send_notification_to_user(
                 ticket["requester"],
                 ticket["id"],
-                resolution_details
+                resolution_details,
+                deadline=state.get("deadline")
             )
         except Exception as e:
             print(f"AVISO: Falha ao enviar email para usuário: {e}")
@@ -253,12 +435,21 @@ Status: Resolvido
                     ticket["manager"],
                     requester_name,
                     ticket["id"],
-                    resolution_details
+                    resolution_details,
+                    deadline=state.get("deadline")
                 )
             except Exception as e:
                 print(f"AVISO: Falha ao enviar email para gestor: {e}")
                 ticket_manager.add_comment(ticket["id"], f"AVISO: Não foi possível enviar email para gestor {ticket.get('manager')}")
         
+        if state.get("diagnosis"):
+            try:
+                diagnosis_index.record_resolution(ticket, state)
+            except OSError as e:
+                print(f"AVISO: Falha ao gravar diagnóstico no índice: {e}")
+        else:
+            defer_diagnosis(state, resolved=True)
+        
         ticket_manager.add_action_log(
             ticket["id"],
             "Resolução Automática",
@@ -316,11 +507,15 @@ O ticket será escalado para análise manual.
             email_service.send_escalation_notification(
                 ticket["id"],
                 f"Falha na automação: {error_msg}",
-                "Suporte N2"
+                "Suporte N2",
+                deadline=state.get("deadline")
             )
         except Exception as e:
             print(f"ERRO: Falha ao enviar notificação de escalação: {e}")
         
+        if not state.get("diagnosis"):
+            defer_diagnosis(state, resolved=False)
+        
         return {
             **state,
             "final_status": "Escalado - Erro",
@@ -337,6 +532,9 @@ def node_escalate(state: TicketState) -> TicketState:
     print(f"STEP 6: Escalando ticket (não automatizável)")
     print(f"{'='*80}")
     
+    # Consulta antecipada de identidade não é usada na escalação
+    identity_service.discard_prefetch(state.get("prefetch_key"))
+    
     escalation_details = f"""Ticket não automatizável - Requer atenção manual
 
 ANÁLISE:
@@ -399,7 +597,8 @@ A equipe de suporte está ciente e tomará as ações necessárias."""
         email_service.send_escalation_notification(
             ticket["id"],
             escalation_details,
-            "Suporte N2"
+            "Suporte N2",
+            deadline=state.get("deadline")
         )
     except Exception as e:
         print(f"ERRO: Falha ao enviar notificação de escalação: {e}")
@@ -426,19 +625,34 @@ def route_after_eligibility(state: TicketState) -> Literal["get_user_info", "esc
     else:
         return "escalate"
 
-def build_graph() -> StateGraph:
-    """Compila o fluxo do LangGraph que sustenta o runbook de tickets."""
+def route_after_user_info(state: TicketState) -> Literal["diagnose", "execute_playbook"]:
+    """Contorna o diagnóstico quando o playbook age sem ele ou quando fica para depois (modo lazy)."""
+    if DIAGNOSIS_MODE == "eager" and diagnosis_needed(state):
+        return "diagnose"
+    return "execute_playbook"
+
+def build_graph(wrap: Optional[Callable[[str, Callable], Callable]] = None) -> StateGraph:
+    """Compila o fluxo do LangGraph que sustenta o runbook de tickets.
+
+    ``wrap(nome, função)``, quando informado, envolve cada nó (ex.: o
+    cronômetro de ``profiling.Profiler.wrap_node``).
+    """
     builder = StateGraph(TicketState)
-    
-    builder.add_node("classify_intent", node_classify_intent)
-    builder.add_node("extract_system", node_extract_system)
-    builder.add_node("analyze_priority", node_analyze_priority)
-    builder.add_node("check_eligibility", node_check_eligibility)
-    builder.add_node("get_user_info", node_get_user_info)
-    builder.add_node("diagnose", node_diagnose)
-    builder.add_node("execute_playbook", node_execute_playbook)
-    builder.add_node("notify_and_update", node_notify_and_update)
-    builder.add_node("escalate", node_escalate)
+    nodes = {
+        "classify_intent": node_classify_intent,
+        "extract_system": node_extract_system,
+        "analyze_priority": node_analyze_priority,
+        "check_eligibility": node_check_eligibility,
+        "get_user_info": node_get_user_info,
+        "diagnose": node_diagnose,
+        "execute_playbook": node_execute_playbook,
+        "notify_and_update": node_notify_and_update,
+        "escalate": node_escalate,
+    }
+    for name, node in nodes.items():
+        # Tempo por nó vai para a linha do resultado (results_store.run_graph)
+        node = results_store.timed_node(name, node)
+        builder.add_node(name, wrap(name, node) if wrap else node)
     
     builder.set_entry_point("classify_intent")
     
@@ -455,7 +669,14 @@ def build_graph() -> StateGraph:
         }
     )
     
-    builder.add_edge("get_user_info", "diagnose")
+    builder.add_conditional_edges(
+        "get_user_info",
+        route_after_user_info,
+        {
+            "diagnose": "diagnose",
+            "execute_playbook": "execute_playbook"
+        }
+    )
     builder.add_edge("diagnose", "execute_playbook")
     builder.add_edge("execute_playbook", "notify_and_update")
     builder.add_edge("notify_and_update", END)
@@ -1,17 +1,152 @@
 """Entrada via linha de comando do processador automatizado de tickets."""
 
-from tools import ticket_manager
-from graph import build_graph
+from typing import Any, Dict, Optional
+from tools import email_service, ticket_manager, ticket_sources, identity_service
+import argparse
+import contextlib
+import itertools
+import multiprocessing
+import clustering
+import profiling
+import results_store
+import scheduler
+import worker_daemon
+import work_queue
+from resilience import TICKET_DEADLINE_SECONDS
+from graph import build_graph, diagnosis_stats, triage_listener, wait_deferred_diagnoses
+from classifier import cascade_stats, llm_breaker_stats, llm_hedge_stats, llm_limiter_stats, triage_cache_stats
 import os
 
-def main():
+def process_ticket(
+    app,
+    ticket: Dict[str, Any],
+    idx: int,
+    total: int,
+    triage: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Executa o fluxo para um ticket e imprime o resultado do processamento.
+
+    ``triage`` pré-preenche intenção, sistema, prioridade e elegibilidade
+    (vindos do representante do grupo), pulando as chamadas de triagem ao LLM.
+    """
+    print("\n" + "#"*80)
+    # No modo daemon não há total conhecido (total = 0)
+    print(f"PROCESSANDO TICKET {idx}/{total}" if total else f"PROCESSANDO TICKET {idx}")
+    print(f"ID: {ticket['id']} | Título: {ticket['title']}")
+    print(f"Solicitante: {ticket['requester_name']} ({ticket['requester']})")
+    print("#"*80 + "\n")
+    
+    try:
+        state = {"ticket": ticket, **(triage or {})}
+        result = results_store.run_graph(app, state)
+        
+        print(f"\n{'='*80}")
+        print(f"RESULTADO DO PROCESSAMENTO - Ticket #{ticket['id']}")
+        print(f"{'='*80}")
+        print(f"Status Final: {result.get('final_status', 'Desconhecido')}")
+        print(f"Intenção Identificada: {result.get('intent', 'N/A')}")
+        print(f"Sistema: {result.get('system', 'N/A')}")
+        
+        if result.get('resolution_summary'):
+            print(f"\nResumo da Resolução:")
+            print(result['resolution_summary'])
+        
+        if result.get('error_message'):
+            print(f"\nErro: {result['error_message']}")
+        
+        print(f"{'='*80}\n")
+        return result
+        
+    except Exception as e:
+        print(f"\nERRO ao processar ticket #{ticket['id']}: {e}")
+        print(f"{'='*80}\n")
+        return {"ticket": ticket, "final_status": "Erro", "error_message": str(e)}
+
+def summarize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos do estado final guardados na fila de trabalho e expostos pela API."""
+    ticket = result.get("ticket", {})
+    return {
+        "ticket_id": ticket.get("id"),
+        "status": result.get("final_status", "Desconhecido"),
+        "intent": result.get("intent"),
+        "system": result.get("system"),
+        "priority": result.get("priority"),
+        "can_automate": result.get("can_automate"),
+        "resolution": result.get("resolution_summary", ""),
+        "error": result.get("error_message", ""),
+    }
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Opções de linha de comando do processamento em lote."""
+    parser = argparse.ArgumentParser(description="Processa os tickets abertos com o fluxo automatizado")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TICKET_WORKERS", "1")),
+                        help="workers que atendem a fila completa (padrão: 1)")
+    parser.add_argument("--urgent-workers", type=int, default=None,
+                        help="workers reservados para tickets critical/high (padrão: 1 com mais de um worker)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="mantém o processo ativo e processa tickets novos ou alterados conforme chegam")
+    parser.add_argument("--queue", metavar="ARQUIVO",
+                        help="fila SQLite compartilhada: enfileira os tickets abertos e os processa com leases")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("TICKET_PROCESSES", "1")),
+                        help="processos workers da fila (com --queue)")
+    parser.add_argument("--join", action="store_true",
+                        help="com --queue, apenas processa (sem enfileirar), ex.: workers em outro host")
+    parser.add_argument("--profile", nargs="?", const="", metavar="PREFIXO",
+                        help="perfila o lote (CPU, alocações e pilhas por nó); grava PREFIXO.collapsed e "
+                             "PREFIXO.txt (padrão: bench/results/profile-<data>)")
+    parser.add_argument("--mock-llm", nargs="?", const="default=fixed:20", metavar="LATÊNCIA",
+                        help="usa o LLM mock de bench/ neste processo, ex.: 'default=fixed:20,classify=lognormal:300:0.5'")
+    parser.add_argument("--sync", action="store_true",
+                        help="importa antes os tickets novos ou alterados das fontes de data/sources.json; "
+                             "com --daemon, repete a cada SYNC_INTERVAL_SECONDS")
+    args = parser.parse_args(argv)
+    if args.profile is not None and (args.daemon or args.queue):
+        parser.error("--profile vale apenas para o processamento em lote")
+    return args
+
+def main(argv=None):
     """Executa todo o fluxo de automacao para cada ticket em aberto."""
+    args = parse_args(argv)
+    urgent_workers = args.urgent_workers if args.urgent_workers is not None else (1 if args.workers > 1 else 0)
     print("\n" + "="*80)
     print("SISTEMA AUTOMÁTICO DE GERENCIAMENTO DE TICKETS")
     print("="*80 + "\n")
     
     # Nao eh necessario validar credenciais: a demonstracao nao depende de servicos externos.
     
+    with contextlib.ExitStack() as stack:
+        if args.mock_llm:
+            start_mock_llm(stack, args.mock_llm)
+        
+        if args.sync and not args.daemon:
+            sync_sources()
+        
+        if args.daemon:
+            run_daemon(args, urgent_workers)
+        elif args.queue:
+            run_queue(args)
+        else:
+            run_batch(args, urgent_workers)
+
+def start_mock_llm(stack: contextlib.ExitStack, latency: str) -> None:
+    """Sobe o LLM mock de ``bench/`` até o fim de ``stack`` e aponta o cliente para ele."""
+    from bench.mock_llm_server import MockLLMServer, parse_latency_map
+    server = stack.enter_context(MockLLMServer(latency=parse_latency_map(latency)))
+    # Processos da fila (spawn) herdam o ambiente e usam o mesmo mock
+    os.environ.update(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="mock")
+    print(f"LLM mock em {server.base_url} (latência {latency})\n")
+
+def sync_sources() -> None:
+    """Uma rodada de sincronização com as fontes configuradas."""
+    report = ticket_sources.sync_from_config()
+    if report is None:
+        print(f"Nenhuma fonte configurada em {ticket_sources.SOURCES_PATH}.\n")
+        return
+    print(f"Sincronização: {report['fetched']} ticket(s) recebido(s) de {len(report['sources'])} fonte(s), "
+          f"{report['written']} novo(s) ou alterado(s) em {report['seconds']:.1f}s.\n")
+
+def run_batch(args: argparse.Namespace, urgent_workers: int) -> None:
+    """Processa os tickets abertos uma vez, opcionalmente sob o perfilador."""
     tickets = ticket_manager.get_open_tickets()
     
     if not tickets:
@@ -20,42 +155,153 @@ def main():
     
     print(f"Encontrados {len(tickets)} tickets abertos para processamento.\n")
     
-    app = build_graph()
+    profiler = None
+    if args.profile is not None:
+        profiler = profiling.Profiler()
+        profiler.instrument(ticket_manager, identity_service, email_service)
+        profiler.start()
+    try:
+        app = build_graph(wrap=profiler.wrap_node if profiler else None)
     
-    for idx, ticket in enumerate(tickets, 1):
-        print("\n" + "#"*80)
-        print(f"PROCESSANDO TICKET {idx}/{len(tickets)}")
-        print(f"ID: {ticket['id']} | Título: {ticket['title']}")
-        print(f"Solicitante: {ticket['requester_name']} ({ticket['requester']})")
-        print("#"*80 + "\n")
-        
-        try:
-            state = {"ticket": ticket}
-            result = app.invoke(state)
-            
-            print(f"\n{'='*80}")
-            print(f"RESULTADO DO PROCESSAMENTO - Ticket #{ticket['id']}")
-            print(f"{'='*80}")
-            print(f"Status Final: {result.get('final_status', 'Desconhecido')}")
-            print(f"Intenção Identificada: {result.get('intent', 'N/A')}")
-            print(f"Sistema: {result.get('system', 'N/A')}")
-            
-            if result.get('resolution_summary'):
-                print(f"\nResumo da Resolução:")
-                print(result['resolution_summary'])
-            
-            if result.get('error_message'):
-                print(f"\nErro: {result['error_message']}")
-            
-            print(f"{'='*80}\n")
-            
-        except Exception as e:
-            print(f"\nERRO ao processar ticket #{ticket['id']}: {e}")
-            print(f"{'='*80}\n")
+        # Ordem de atendimento pela prioridade estimada localmente; urgentes primeiro
+        tickets = scheduler.priority_order(tickets)
+    
+        # Tickets quase idênticos (mesmo incidente) compartilham uma única triagem;
+        # o agrupamento segue a ordem de atendimento para o representante sair primeiro
+        representatives = clustering.cluster_tickets(tickets) if clustering.CLUSTERING_ENABLED else {}
+        if representatives:
+            summary = clustering.cluster_summary(representatives)
+            print(f"Agrupamento: {summary['clusters']} grupos, {summary['reused']} tickets reaproveitam a triagem.\n")
+        triages = clustering.SharedTriage(representatives)
+        counter = itertools.count(1)
+    
+        def handle(ticket: Dict[str, Any], priority: str) -> Dict[str, Any]:
+            triage = triages.for_ticket(ticket["id"], timeout=TICKET_DEADLINE_SECONDS)
+            # Membros do grupo são liberados ao fim da triagem do representante, não do ticket inteiro
+            with triage_listener(lambda state: triages.publish(ticket["id"], state)):
+                result = process_ticket(app, ticket, next(counter), len(tickets), triage)
+            triages.publish(ticket["id"], result)
+            return result
+    
+        # Consulta o diretório em lote: solicitantes repetidos geram uma única busca
+        with identity_service.batch_lookup([t["requester"] for t in tickets]):
+            scheduler.run_scheduled(tickets, handle, workers=args.workers, urgent_workers=urgent_workers)
+    
+        # Diagnósticos adiados rodam depois das notificações; terminam antes da saída
+        wait_deferred_diagnoses()
+        # Resumos de e-mail ainda na janela saem agora, sem esperar o timer
+        email_service.flush_digests()
+        results_store.flush()
+    finally:
+        # Mesmo se o lote falhar, a amostragem para e o perfil parcial é gravado
+        if profiler is not None:
+            profiler.stop()
+            collapsed, report = profiler.write(args.profile or profiling.default_prefix())
+            print("\n" + profiler.summary())
+            print(f"Pilhas colapsadas (flamegraph): {collapsed}")
+            print(f"Resumo do perfil: {report}\n")
+    print_run_stats()
     
     print("\n" + "="*80)
     print("PROCESSAMENTO CONCLUÍDO")
     print("="*80 + "\n")
 
+def run_daemon(args: argparse.Namespace, urgent_workers: int) -> None:
+    """Modo daemon: grafo e clientes ficam aquecidos entre os tickets."""
+    app = build_graph()
+    counter = itertools.count(1)
+    
+    def handle(ticket: Dict[str, Any], priority: str) -> Dict[str, Any]:
+        return process_ticket(app, ticket, next(counter), 0)
+    
+    daemon = worker_daemon.TicketDaemon(handle, workers=args.workers, urgent_workers=urgent_workers)
+    # As fontes gravam em DATA_PATH; o daemon percebe a mudança do arquivo como de costume
+    sources = ticket_sources.load_sources() if args.sync else []
+    if args.sync and not sources:
+        print(f"Nenhuma fonte configurada em {ticket_sources.SOURCES_PATH}; sincronização desativada.")
+    sync = ticket_sources.SyncLoop(sources).start() if sources else None
+    try:
+        stats = daemon.run()
+    finally:
+        if sync is not None:
+            sync.stop()
+    wait_deferred_diagnoses()
+    email_service.flush_digests()
+    results_store.flush()
+    print(f"Daemon encerrado: {stats['processed']} processados, {stats['failed']} com erro, {stats['discarded']} descartados.")
+    print_run_stats()
+
+def queue_worker(path: str) -> int:
+    """Processo worker da fila: compila o grafo uma vez e processa até a fila esvaziar."""
+    app = build_graph()
+    counter = itertools.count(1)
+    
+    def handle(ticket: Dict[str, Any]) -> Dict[str, Any]:
+        result = process_ticket(app, ticket, next(counter), 0)
+        if result.get("final_status") == "Erro":
+            # Falha inesperada do fluxo: o ticket volta para a fila até MAX_ATTEMPTS
+            raise RuntimeError(result.get("error_message", "Erro desconhecido"))
+        return summarize_result(result)
+    
+    completed = work_queue.run_worker(path, handle)
+    wait_deferred_diagnoses()
+    email_service.flush_digests()
+    results_store.flush()
+    return completed
+
+def run_queue(args: argparse.Namespace) -> None:
+    """Modo fila de trabalho: enfileira os tickets abertos e sobe ``--processes`` workers."""
+    queue = work_queue.WorkQueue(args.queue)
+    if not args.join:
+        added = queue.enqueue(ticket_manager.get_open_tickets())
+        print(f"Fila {args.queue}: {added} ticket(s) novo(s) ou alterado(s) enfileirado(s).")
+    queue.close()
+    
+    # spawn: cada processo inicia limpo, sem herdar threads e conexões do pai
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=max(1, args.processes)) as pool:
+        completed = pool.map(queue_worker, [args.queue] * max(1, args.processes))
+    
+    stats = work_queue.WorkQueue(args.queue).stats()
+    print(f"Fila concluída: {sum(completed)} ticket(s) processado(s) nesta execução; situação da fila: {stats}")
+
+def print_run_stats() -> None:
+    """Resumo de cache e consulta antecipada de identidade, limitador, circuit breaker, hedging, cascata, cache de triagem, resultados gravados e diagnósticos."""
+    stats = identity_service.cache_stats()
+    print(f"Cache de identidade: {stats['hits']} acertos, {stats['misses']} falhas, "
+          f"taxa de acerto {stats['hit_rate']:.0%}")
+    prefetch = identity_service.prefetch_stats()
+    if prefetch["started"]:
+        print(f"Consulta antecipada de identidade: {prefetch['used']} usadas, {prefetch['discarded']} descartadas "
+              f"na escalação, {prefetch['failed']} indisponíveis")
+    llm_stats = llm_limiter_stats()
+    print(f"Limitador do LLM: {llm_stats['requests']} chamadas, {llm_stats['rate_limited']} respostas 429, "
+          f"concorrência atual {llm_stats['concurrency_limit']}")
+    breaker = llm_breaker_stats()
+    print(f"Circuit breaker do LLM: estado {breaker['state']}, aberto {breaker['opened']} vez(es), "
+          f"{breaker['rejected']} chamadas desviadas para fallback")
+    hedge = llm_hedge_stats()
+    if hedge is not None:
+        print(f"Hedging do LLM: {hedge['hedged']} cópias em {hedge['calls']} chamadas, "
+              f"{hedge['hedge_wins']} vencidas pela cópia")
+    for name, values in (cascade_stats() or {}).items():
+        print(f"Cascata ({name}): {values['escalated']}/{values['calls']} escaladas ao modelo principal "
+              f"({values['escalation_rate']:.0%}, limiar {values['threshold']})")
+    triage = triage_cache_stats()
+    if triage is not None:
+        print(f"Cache de triagem: {triage['hits']} respostas reaproveitadas, {triage['misses']} chamadas, "
+              f"taxa de acerto {triage['hit_rate']:.0%}")
+    digests = email_service.digest_stats()
+    if digests["queued"]:
+        print(f"E-mails agrupados: {digests['queued']} notificações em {digests['digests']} resumos "
+              f"e {digests['single']} e-mails individuais")
+    stored = results_store.store_stats()
+    if stored["rows"]:
+        print(f"Resultados gravados: {stored['rows']} linha(s) em {stored['parts']} parte(s) em "
+              f"{results_store.RESULTS_PATH}" + (f", {stored['errors']} falha(s) de gravação" if stored["errors"] else ""))
+    diagnoses = diagnosis_stats()
+    print(f"Diagnósticos: {diagnoses['inline']} no fluxo, {diagnoses['deferred']} após a notificação, "
+          f"{diagnoses['skipped']} dispensados")
+
 if __name__ == "__main__":
     main()
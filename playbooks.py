@@ -0,0 +1,311 @@
+"""Playbooks declarativos de resolução, escolhidos por intenção e sistema.
+
+Cada playbook de ``data/playbooks.json`` lista passos com uma ação do
+registro ``ACTIONS`` e dependências (``after``). Passos sem dependência
+pendente rodam em paralelo, cada um com timeout e retentativas próprios.
+Um passo pode depender do resultado de outro via ``when``
+(``"lock_check.is_locked"``: só roda se o campo for verdadeiro) e, se
+``required`` for falso, sua falha não derruba o playbook.
+
+Exemplo de playbook:
+    {"name": "account_unlock", "intents": ["account_locked"], "systems": ["*"],
+     "steps": [{"id": "lock_check", "action": "check_lock"},
+               {"id": "unlock", "action": "unlock", "after": ["lock_check"], "when": "lock_check.is_locked"},
+               {"id": "verify", "action": "verify", "after": ["unlock"], "required": false}]}
+"""
+
+# Imports de bibliotecas padrão para configuração, paralelismo e relógio
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from resilience import remaining
+from tools import identity_service
+
+# Arquivo com os playbooks por intenção e sistema
+PLAYBOOKS_PATH = Path(os.getenv("PLAYBOOKS_PATH", str(Path(__file__).parent / "data" / "playbooks.json")))
+
+# Threads compartilhadas pelos passos de todos os playbooks em execução
+PLAYBOOK_WORKERS = int(os.getenv("PLAYBOOK_WORKERS", "8"))
+
+# Timeout (s) e retentativas de um passo quando o playbook não define
+DEFAULT_STEP_TIMEOUT = float(os.getenv("PLAYBOOK_STEP_TIMEOUT", "10"))
+DEFAULT_STEP_RETRIES = int(os.getenv("PLAYBOOK_STEP_RETRIES", "0"))
+
+# Ações que alteram o diretório: depois de começar, o resultado é sempre aguardado
+SIDE_EFFECT_ACTIONS = {"unlock", "reset_password", "grant_access"}
+
+# Intervalo (s) para notar que um passo na fila começou e iniciar seu timeout
+_QUEUE_POLL = 0.05
+
+class PlaybookError(ValueError):
+    """Configuração de playbook inválida."""
+
+def _check_lock(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # Status antecipado na consulta especulativa de identidade, quando disponível
+    return ctx.get("lock_status") or identity_service.check_user_locked(ctx["user_id"])
+
+def _verify(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # Conta ainda bloqueada é falha do passo, não só uma mensagem diferente
+    result = identity_service.verify_user_unlocked(ctx["user_id"], ctx["system"])
+    return {**result, "ok": bool(result.get("ok", True) and result.get("is_unlocked", True))}
+
+# Ações: (função(contexto) -> resultado, mensagem(contexto, resultado) -> texto, entra em playbook_result["actions"])
+ACTIONS: Dict[str, Tuple[Callable[[Dict[str, Any]], Dict[str, Any]], Callable[[Dict[str, Any], Dict[str, Any]], str], bool]] = {
+    "check_lock": (
+        _check_lock,
+        lambda ctx, r: f"Verificação de bloqueio: {'Bloqueado' if r.get('is_locked') else 'Desbloqueado'}",
+        False,
+    ),
+    "unlock": (
+        lambda ctx: identity_service.unlock_user(ctx["user_id"], ctx["system"]),
+        lambda ctx, r: f"Usuário desbloqueado no {ctx['system']}",
+        True,
+    ),
+    "reset_password": (
+        lambda ctx: identity_service.reset_password(ctx["user_id"], ctx["system"]),
+        lambda ctx, r: f"Senha resetada no {ctx['system']}",
+        True,
+    ),
+    "verify": (
+        _verify,
+        lambda ctx, r: f"Verificação final: Usuário {'desbloqueado' if r.get('is_unlocked', True) else 'ainda bloqueado'}",
+        True,
+    ),
+    "grant_access": (
+        lambda ctx: identity_service.grant_system_access(ctx["user_id"], ctx["system"]),
+        lambda ctx, r: f"Acesso ao {ctx['system']} concedido",
+        True,
+    ),
+}
+
+class Step:
+    """Passo de um playbook: ação, dependências, condição, timeout e retentativas."""
+
+    def __init__(self, spec: Dict[str, Any], defaults: Dict[str, Any]):
+        self.id = spec["id"]
+        self.action = spec["action"]
+        self.after: List[str] = list(spec.get("after", []))
+        self.when: Optional[str] = spec.get("when")
+        # A condição lê o resultado de outro passo, que passa a ser dependência
+        if self.when and self.when.split(".", 1)[0] not in self.after:
+            self.after.append(self.when.split(".", 1)[0])
+        self.required = bool(spec.get("required", True))
+        self.timeout = float(spec.get("timeout", defaults.get("timeout", DEFAULT_STEP_TIMEOUT)))
+        self.retries = int(spec.get("retries", defaults.get("retries", DEFAULT_STEP_RETRIES)))
+        # Repetir após timeout pode duplicar o efeito se a tentativa anterior ainda terminar
+        self.retry_on_timeout = bool(spec.get("retry_on_timeout", False))
+        if self.action not in ACTIONS:
+            raise PlaybookError(f"Passo '{self.id}': ação desconhecida '{self.action}'")
+
+class Playbook:
+    """Conjunto de passos aplicado às intenções e sistemas declarados."""
+
+    def __init__(self, spec: Dict[str, Any], defaults: Dict[str, Any]):
+        self.name = spec["name"]
+        self.intents = set(spec.get("intents", []))
+        self.systems = set(spec.get("systems", ["*"]))
+        self.enabled = bool(spec.get("enabled", True))
+        self.steps = [Step(step, defaults) for step in spec["steps"]]
+        self._validate()
+
+    def _validate(self) -> None:
+        ids = [step.id for step in self.steps]
+        if len(set(ids)) != len(ids):
+            raise PlaybookError(f"Playbook '{self.name}': ids de passo repetidos")
+        for step in self.steps:
+            for dep in step.after:
+                if dep not in ids:
+                    raise PlaybookError(f"Playbook '{self.name}': passo '{step.id}' depende de '{dep}', inexistente")
+        # Dependências circulares deixariam passos esperando para sempre
+        resolved: set = set()
+        while len(resolved) < len(self.steps):
+            ready = [s.id for s in self.steps if s.id not in resolved and set(s.after) <= resolved]
+            if not ready:
+                raise PlaybookError(f"Playbook '{self.name}': dependências circulares")
+            resolved.update(ready)
+
+    def matches(self, intent: str, system: str) -> bool:
+        return self.enabled and intent in self.intents and ("*" in self.systems or system in self.systems)
+
+class PlaybookRegistry:
+    """Playbooks carregados do arquivo, na ordem de declaração."""
+
+    def __init__(self, playbooks: List[Playbook]):
+        self.playbooks = playbooks
+
+    def select(self, intent: str, system: str) -> Optional[Playbook]:
+        """Primeiro playbook habilitado que cobre a intenção e o sistema."""
+        return next((p for p in self.playbooks if p.matches(intent, system)), None)
+
+def load_playbooks(path: Path = PLAYBOOKS_PATH) -> PlaybookRegistry:
+    """Lê e valida os playbooks; levanta PlaybookError em configuração inválida."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    defaults = data.get("defaults", {})
+    try:
+        return PlaybookRegistry([Playbook(spec, defaults) for spec in data.get("playbooks", [])])
+    except KeyError as e:
+        raise PlaybookError(f"Campo obrigatório ausente em {path}: {e}")
+
+_registry: Optional[PlaybookRegistry] = None
+_registry_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+def get_registry() -> PlaybookRegistry:
+    """Registro de playbooks do processo, carregado na primeira chamada."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = load_playbooks()
+        return _registry
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _registry_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=PLAYBOOK_WORKERS, thread_name_prefix="playbook")
+        return _pool
+
+def _condition(step: Step, results: Dict[str, Dict[str, Any]]) -> bool:
+    if not step.when:
+        return True
+    dep, _, field = step.when.partition(".")
+    return bool(results.get(dep, {}).get(field or "ok"))
+
+def run_playbook(playbook: Playbook, context: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Executa os passos respeitando dependências; independentes rodam em paralelo.
+
+    ``context`` traz ``user_id``, ``system`` e, opcionalmente, ``lock_status``.
+    O timeout de um passo conta a partir do início da execução, não da
+    entrada na fila. Passos de ``SIDE_EFFECT_ACTIONS`` já iniciados não são
+    abandonados por timeout nem pelo prazo do ticket: o resultado é aguardado
+    e registrado (ex.: a senha temporária de um reset lento).
+
+    Devolve ``ok``, ``actions`` (resultados das ações registradas),
+    ``actions_performed`` (mensagens na ordem de declaração), ``steps`` (estado
+    de cada passo), ``temp_password`` quando houver e ``error`` na falha.
+    """
+    pool = _get_pool()
+    results: Dict[str, Dict[str, Any]] = {}
+    status: Dict[str, str] = {}
+    # future -> (passo, tentativa, relógio com "started" gravado pela thread ao começar)
+    running: Dict[Future, Tuple[Step, int, Dict[str, float]]] = {}
+    # Passos com efeito que estouraram o tempo e cujo resultado está sendo aguardado
+    overdue: set = set()
+    error: Optional[str] = None
+
+    def submit(step: Step, attempt: int) -> None:
+        clock: Dict[str, float] = {}
+        action = ACTIONS[step.action][0]
+
+        def execute() -> Dict[str, Any]:
+            clock["started"] = time.monotonic()
+            return action(context)
+
+        running[pool.submit(execute)] = (step, attempt, clock)
+
+    def finish(step: Step, attempt: int, ok: bool, result: Dict[str, Any], reason: str, retryable: bool) -> None:
+        nonlocal error
+        if not ok and retryable and attempt < step.retries:
+            print(f"AVISO: Passo '{step.id}' falhou ({reason}); tentativa {attempt + 2}/{step.retries + 1}")
+            submit(step, attempt + 1)
+            return
+        results[step.id] = result
+        status[step.id] = "ok" if ok else "failed"
+        if not ok and step.required and error is None:
+            error = f"Passo '{step.id}' falhou: {reason}"
+
+    while True:
+        # Após uma falha obrigatória nada novo começa; os passos em andamento terminam
+        progressed = True
+        while progressed and error is None:
+            progressed = False
+            for step in playbook.steps:
+                if step.id in status or any(s is step for s, _, _ in running.values()):
+                    continue
+                if not all(status.get(dep) in ("ok", "skipped", "failed") for dep in step.after):
+                    continue
+                if any(status.get(dep) == "failed" for dep in step.after) or not _condition(step, results):
+                    status[step.id] = "skipped"
+                    progressed = True
+                    continue
+                left = remaining(deadline)
+                if left is not None and left <= 0:
+                    error = f"Prazo do ticket esgotado antes do passo '{step.id}'"
+                    break
+                submit(step, 0)
+        if not running:
+            break
+
+        now = time.monotonic()
+        left = remaining(deadline)
+        waits = []
+        for future, (step, _, clock) in running.items():
+            if "started" not in clock:
+                waits.append(_QUEUE_POLL)
+            elif future not in overdue:
+                waits.append(clock["started"] + step.timeout - now)
+        if left is not None and (left > 0 or len(overdue) < len(running)):
+            waits.append(left)
+        # Só restam passos com efeito em atraso: espera até que terminem
+        timeout = max(0.0, min(waits)) if waits else None
+        finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in finished:
+            step, attempt, _ = running.pop(future)
+            overdue.discard(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                finish(step, attempt, False, {"ok": False, "error": str(e)}, str(e), retryable=True)
+            else:
+                ok = bool(result.get("ok", True))
+                finish(step, attempt, ok, result, result.get("message") or result.get("error") or "sem detalhes", retryable=True)
+
+        now = time.monotonic()
+        left = remaining(deadline)
+        expired_deadline = left is not None and left <= 0
+        for future, (step, attempt, clock) in list(running.items()):
+            if future in overdue:
+                continue
+            timed_out = "started" in clock and now - clock["started"] >= step.timeout
+            if not (timed_out or expired_deadline):
+                continue
+            reason = "prazo do ticket esgotado" if expired_deadline else f"timeout de {step.timeout:.0f}s"
+            # cancel() só falha se a thread já começou o passo
+            if not future.cancel() and step.action in SIDE_EFFECT_ACTIONS:
+                print(f"AVISO: Passo '{step.id}' excedeu o limite ({reason}); aguardando o resultado da alteração já iniciada")
+                overdue.add(future)
+                continue
+            # Leituras não são interrompidas; o resultado tardio é ignorado
+            running.pop(future)
+            finish(step, attempt, False, {"ok": False, "error": reason}, reason,
+                   retryable=step.retry_on_timeout and not expired_deadline)
+
+    actions, performed, temp_password = [], [], None
+    for step in playbook.steps:
+        if status.get(step.id) != "ok":
+            continue
+        _, message, recorded = ACTIONS[step.action]
+        result = results[step.id]
+        performed.append(message(context, result))
+        if recorded:
+            actions.append(result)
+        temp_password = result.get("temp_password") or temp_password
+
+    outcome: Dict[str, Any] = {
+        "ok": error is None,
+        "playbook": playbook.name,
+        "actions": actions,
+        "actions_performed": performed,
+        "steps": {step.id: status.get(step.id, "not_run") for step in playbook.steps},
+    }
+    if temp_password:
+        outcome["temp_password"] = temp_password
+    if error:
+        outcome["error"] = error
+    return outcome
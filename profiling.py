@@ -0,0 +1,292 @@
+"""Perfil de uma execução em lote: CPU, alocações e pilhas por nó do grafo.
+
+Duas fontes complementares:
+
+* um thread amostrador lê as pilhas de todos os threads a cada
+  ``PROFILE_INTERVAL_MS`` (``sys._current_frames``), cobrindo os workers do
+  scheduler e os pools de fundo (playbooks, consulta antecipada, diagnósticos
+  adiados) sem instrumentar cada chamada. As amostras viram um arquivo de
+  pilhas colapsadas (``flamegraph.pl``, speedscope, inferno) e são atribuídas
+  ao nó do grafo e à função do projeto mais interna de cada pilha;
+* cada nó do grafo (via ``wrap_node``, passado a ``build_graph``) e cada
+  função pública dos módulos de ``tools/`` é envolvida por um cronômetro que
+  soma tempo de parede, CPU do thread e bytes líquidos alocados (tracemalloc).
+
+Os bytes vêm do contador global do tracemalloc: com vários workers incluem
+alocações concorrentes; use ``--workers 1`` para atribuição exata.
+"""
+
+# Imports de bibliotecas padrão para amostragem, relógios e rastreio de memória
+import functools
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from types import CodeType, ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Intervalo entre amostras das pilhas, em milissegundos
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Quadros guardados por alocação no tracemalloc (mais quadros, mais custo)
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+_ROOT = str(Path(__file__).resolve().parent) + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+# Código de apoio que não conta como "do projeto" (o mock do LLM roda no mesmo processo)
+_EXCLUDED = (_ROOT + "bench" + os.sep, _ROOT + ".venv" + os.sep, _ROOT + "venv" + os.sep)
+
+def _is_project(filename: str) -> bool:
+    return filename.startswith(_ROOT) and not filename.startswith(_EXCLUDED) and "site-packages" not in filename
+
+def _module_name(filename: str) -> str:
+    """Nome pontuado do módulo a partir do caminho (relativo ao projeto ou ao site-packages)."""
+    if filename.startswith(_ROOT):
+        relative = filename[len(_ROOT):]
+    elif "site-packages" + os.sep in filename:
+        relative = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(_STDLIB):
+        relative = filename[len(_STDLIB):]
+    else:
+        relative = os.path.basename(filename)
+    return relative[:-3].replace(os.sep, ".") if relative.endswith(".py") else relative
+
+# Módulos de espera de coordenação: threads parados neles fora de um nó estão ociosos
+_IDLE_MODULES = ("threading", "queue", "concurrent.futures._base", "concurrent.futures.thread", "selectors")
+
+def _is_idle(stack: Tuple[CodeType, ...]) -> bool:
+    """Pilha parada em espera (join, fila, evento) sem nenhum nó do grafo em execução."""
+    if not stack or _module_name(stack[-1].co_filename) not in _IDLE_MODULES:
+        return False
+    return not any(code.co_name.startswith("node_") and _is_project(code.co_filename) for code in stack)
+
+def _thread_group(name: str) -> str:
+    # "playbook_3" e "ThreadPoolExecutor-0_1" viram um grupo só por pool
+    return name.rstrip("0123456789").rstrip("_-") or name
+
+class _Timer:
+    """Totais de um nó ou função: chamadas, parede, CPU do thread e bytes líquidos."""
+
+    __slots__ = ("calls", "wall", "cpu", "alloc")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.alloc = 0
+
+class Profiler:
+    """Amostrador de pilhas mais cronômetros por nó e ferramenta durante uma execução."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, trace_frames: int = PROFILE_TRACEMALLOC_FRAMES):
+        self.interval = interval_ms / 1000
+        self.trace_frames = trace_frames
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._samples: Dict[Tuple[str, Tuple[CodeType, ...]], int] = {}
+        self._timers: Dict[Tuple[str, str], _Timer] = {}
+        self._patched: List[Tuple[ModuleType, str, Callable]] = []
+        self._sweeps = 0
+        self._started = 0.0
+        self.elapsed = 0.0
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._alloc_diff: List[tracemalloc.StatisticDiff] = []
+        self.peak_kb = 0.0
+
+    # --- ciclo de vida -------------------------------------------------------
+
+    def start(self) -> "Profiler":
+        tracemalloc.start(self.trace_frames)
+        self._snapshot = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+        if tracemalloc.is_tracing():
+            end = tracemalloc.take_snapshot()
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            self._alloc_diff = end.filter_traces(filters).compare_to(self._snapshot.filter_traces(filters), "lineno")
+            self.peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # --- amostragem ----------------------------------------------------------
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack: List[CodeType] = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                key = (_thread_group(names.get(ident, "thread")), tuple(stack))
+                self._samples[key] = self._samples.get(key, 0) + 1
+            self._sweeps += 1
+
+    # --- cronômetros ---------------------------------------------------------
+
+    def _timed(self, kind: str, name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            wall, cpu = time.perf_counter(), time.thread_time()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                alloc = tracemalloc.get_traced_memory()[0] - before
+                cpu, wall = time.thread_time() - cpu, time.perf_counter() - wall
+                with self._lock:
+                    timer = self._timers.setdefault((kind, name), _Timer())
+                    timer.calls += 1
+                    timer.wall += wall
+                    timer.cpu += cpu
+                    timer.alloc += alloc
+        return run
+
+    def wrap_node(self, name: str, fn: Callable) -> Callable:
+        """Envolve um nó do grafo (uso: ``build_graph(wrap=profiler.wrap_node)``)."""
+        return self._timed("node", name, fn)
+
+    def instrument(self, *modules: ModuleType) -> None:
+        """Cronometra as funções públicas definidas nos módulos até ``stop``.
+
+        Só vale para chamadas via atributo do módulo (``identity_service.unlock_user``),
+        que é como o grafo e os playbooks usam as ferramentas.
+        """
+        for module in modules:
+            short = module.__name__.rsplit(".", 1)[-1]
+            for name, value in list(vars(module).items()):
+                if name.startswith("_") or not callable(value) or isinstance(value, type):
+                    continue
+                if getattr(value, "__module__", None) != module.__name__:
+                    continue
+                self._patched.append((module, name, value))
+                setattr(module, name, self._timed("tool", f"{short}.{name}", value))
+
+    # --- relatórios ----------------------------------------------------------
+
+    @staticmethod
+    def _label(code: CodeType) -> str:
+        return f"{_module_name(code.co_filename)}:{code.co_qualname}"
+
+    def collapsed(self) -> List[str]:
+        """Linhas ``thread;quadro;...;quadro N`` das pilhas com código do projeto, sem esperas ociosas."""
+        merged: Dict[str, int] = {}
+        for (group, stack), count in self._samples.items():
+            if _is_idle(stack) or not any(_is_project(code.co_filename) for code in stack):
+                continue
+            frames = [group] + [self._label(code) for code in stack if code.co_filename != __file__]
+            line = ";".join(frame.replace(";", ":") for frame in frames)
+            merged[line] = merged.get(line, 0) + count
+        return [f"{line} {count}" for line, count in sorted(merged.items())]
+
+    def attribution(self) -> Tuple[Dict[str, int], Dict[str, int], int]:
+        """Amostras por nó (ou grupo de threads fora do grafo) e por função do projeto mais interna."""
+        by_node: Dict[str, int] = {}
+        by_function: Dict[str, int] = {}
+        total = 0
+        for (group, stack), count in self._samples.items():
+            project = [code for code in stack if _is_project(code.co_filename) and code.co_filename != __file__]
+            if not project or _is_idle(stack):
+                continue
+            total += count
+            node = next((code.co_name[len("node_"):] for code in project if code.co_name.startswith("node_")), f"[{group}]")
+            by_node[node] = by_node.get(node, 0) + count
+            function = self._label(project[-1])
+            by_function[function] = by_function.get(function, 0) + count
+        return by_node, by_function, total
+
+    def summary(self, top: int = 20) -> str:
+        """Tabelas de nós, ferramentas, funções amostradas e locais de alocação."""
+        by_node, by_function, total = self.attribution()
+        ms_per_sample = self.elapsed * 1000 / self._sweeps if self._sweeps else 0.0
+        with self._lock:
+            timers = dict(self._timers)
+
+        lines = [
+            f"Perfil: {self.elapsed:.2f}s de parede, {self._sweeps} varreduras de pilha "
+            f"(~{ms_per_sample:.1f} ms cada), pico de memória rastreada {self.peak_kb:.0f} KB",
+            "",
+        ]
+
+        def timer_table(kind: str, title: str) -> None:
+            rows = sorted(((name, t) for (k, name), t in timers.items() if k == kind), key=lambda r: -r[1].wall)
+            if not rows:
+                return
+            width = max(40, max(len(name) for name, _ in rows) + 2)
+            lines.append(title)
+            lines.append(f"{'nome':<{width}}{'chamadas':>9}{'parede ms':>11}{'média ms':>10}{'CPU ms':>9}{'KB líq.':>9}"
+                         + (f"{'amostras':>10}" if kind == "node" else ""))
+            for name, t in rows:
+                row = (f"{name:<{width}}{t.calls:>9}{t.wall * 1000:>11.1f}{t.wall * 1000 / t.calls:>10.2f}"
+                       f"{t.cpu * 1000:>9.1f}{t.alloc / 1024:>9.1f}")
+                if kind == "node":
+                    row += f"{by_node.get(name, 0) / total if total else 0:>10.1%}"
+                lines.append(row)
+            lines.append("")
+
+        timer_table("node", "Nós do grafo (tempo inclusivo por execução do nó)")
+        outside = sorted(((name, n) for name, n in by_node.items() if name.startswith("[")), key=lambda r: -r[1])
+        if outside:
+            lines.append("Threads fora dos nós (amostras)")
+            for name, count in outside:
+                lines.append(f"{name:<40}{count:>9}{count / total:>10.1%}")
+            lines.append("")
+        timer_table("tool", "Ferramentas (tools/, tempo inclusivo)")
+
+        if by_function:
+            lines.append("Funções do projeto mais internas na pilha (amostras; inclui espera em bibliotecas)")
+            lines.append(f"{'função':<60}{'amostras':>9}{'%':>8}{'~ms':>9}")
+            for name, count in sorted(by_function.items(), key=lambda r: -r[1])[:top]:
+                lines.append(f"{name:<60}{count:>9}{count / total:>8.1%}{count * ms_per_sample:>9.0f}")
+            lines.append("")
+
+        growth = [stat for stat in self._alloc_diff if stat.size_diff > 0][:top]
+        if growth:
+            lines.append("Maiores crescimentos de memória (tracemalloc, fim - início)")
+            lines.append(f"{'local':<60}{'KB':>9}{'blocos':>9}")
+            for stat in growth:
+                frame = stat.traceback[0]
+                where = f"{_module_name(frame.filename)}:{frame.lineno}"
+                lines.append(f"{where:<60}{stat.size_diff / 1024:>9.1f}{stat.count_diff:>9}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def write(self, prefix: str) -> Tuple[Path, Path]:
+        """Grava ``<prefixo>.collapsed`` e ``<prefixo>.txt``; devolve os dois caminhos."""
+        base = Path(prefix)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        collapsed = base.with_name(base.name + ".collapsed")
+        report = base.with_name(base.name + ".txt")
+        collapsed.write_text("\n".join(self.collapsed()) + "\n", encoding="utf-8")
+        report.write_text(self.summary() + "\n", encoding="utf-8")
+        return collapsed, report
+
+def default_prefix() -> str:
+    """Prefixo padrão dos arquivos de perfil, em ``bench/results``."""
+    return str(Path(_ROOT) / "bench" / "results" / time.strftime("profile-%Y%m%d-%H%M%S"))
@@ -0,0 +1,174 @@
+"""Limitador global de chamadas ao LLM com buckets RPM/TPM e concorrência adaptativa."""
+
+# Imports de bibliotecas padrão para sincronização, relógio e configuração
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+class RateLimitTimeout(RuntimeError):
+    """Não foi possível obter permissão de chamada dentro do prazo."""
+
+class TokenBucket:
+    """Bucket que reabastece ``per_minute`` unidades por minuto de forma contínua.
+
+    A rajada máxima é uma fração do minuto (``burst``), para que nenhuma janela
+    de 60 s ultrapasse muito a cota mesmo após um período ocioso.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic, burst: float = 0.1):
+        self.capacity = max(1.0, per_minute * burst)
+        self.level = self.capacity
+        self._rate = per_minute / 60.0
+        self._clock = clock
+        self._updated = clock()
+
+    def refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver ``amount`` disponível (0 quando já há)."""
+        self.refill()
+        # Pedidos maiores que a capacidade esperam apenas o bucket encher
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self._rate) if self._rate else float("inf")
+
+    def take(self, amount: float) -> None:
+        self.refill()
+        self.level -= amount
+
+    def give(self, amount: float) -> None:
+        """Devolve unidades reservadas a mais (ex.: estimativa de tokens alta)."""
+        self.level = min(self.capacity, self.level + amount)
+
+class AdaptiveRateLimiter:
+    """Controla RPM, TPM e concorrência das chamadas ao provedor de LLM.
+
+    A concorrência segue AIMD: cresce ~1 a cada janela de sucessos dentro da
+    latência alvo e é multiplicada por ``decrease_factor`` em respostas 429 ou
+    lentas. Um ``Retry-After`` bloqueia novas chamadas até o instante indicado,
+    de modo que a vazão se acomode logo abaixo da cota contratada.
+    """
+
+    def __init__(
+        self,
+        rpm: float = 500,
+        tpm: float = 200_000,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[float] = None,
+        latency_target: float = 5.0,
+        decrease_factor: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        self._requests = TokenBucket(rpm, clock)
+        self._tokens = TokenBucket(tpm, clock)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(initial_concurrency or max(min_concurrency, max_concurrency // 4))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "rate_limited": 0, "slow": 0, "waited_s": 0.0}
+
+    def _wait_needed(self, tokens: float) -> float:
+        """Tempo de espera para a próxima tentativa (0 quando liberado)."""
+        now = self._clock()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= int(self.limit):
+            # Aguarda uma liberação; o timeout evita esperar um notify perdido
+            return 0.05
+        return max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+
+    @contextmanager
+    def acquire(self, tokens: float, deadline: Optional[float] = None) -> Iterator[None]:
+        """Reserva uma requisição e ``tokens`` estimados durante o bloco.
+
+        ``deadline`` (em ``time.time()``) limita a espera; ao estourar, levanta
+        ``RateLimitTimeout`` sem consumir cota.
+        """
+        started = self._clock()
+        with self._cond:
+            while True:
+                wait = self._wait_needed(tokens)
+                if wait <= 0:
+                    break
+                if deadline is not None and time.time() + wait > deadline:
+                    raise RateLimitTimeout("Prazo esgotado aguardando cota do LLM")
+                self._cond.wait(wait)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            self._stats["waited_s"] += self._clock() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def record_usage(self, estimated: float, actual: float) -> None:
+        """Ajusta o bucket de tokens com o consumo real informado pelo provedor."""
+        with self._cond:
+            if actual < estimated:
+                self._tokens.give(estimated - actual)
+            else:
+                self._tokens.take(actual - estimated)
+
+    def on_success(self, latency: float) -> None:
+        """Aumento aditivo (ou redução, se a chamada foi lenta demais)."""
+        with self._cond:
+            if latency > self.latency_target:
+                self._stats["slow"] += 1
+                self._decrease()
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def on_rate_limited(self, retry_after: Optional[float]) -> None:
+        """Redução multiplicativa e pausa global pelo tempo do Retry-After."""
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self._decrease()
+            pause = retry_after if retry_after is not None else 1.0
+            self._blocked_until = max(self._blocked_until, self._clock() + pause)
+            # Esvazia o bucket de requisições para não disparar uma rajada ao fim da pausa
+            self._requests.level = min(self._requests.level, 0.0)
+
+    def _decrease(self) -> None:
+        # Vários erros da mesma rajada contam como um único sinal de congestionamento
+        now = self._clock()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores do limitador para logs e métricas."""
+        with self._cond:
+            return {
+                **self._stats,
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "waited_s": round(self._stats["waited_s"], 3),
+            }
+
+def limiter_from_env() -> AdaptiveRateLimiter:
+    """Cria o limitador a partir das variáveis LLM_* de ambiente."""
+    return AdaptiveRateLimiter(
+        rpm=float(os.getenv("LLM_RPM_LIMIT", "500")),
+        tpm=float(os.getenv("LLM_TPM_LIMIT", "200000")),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+        initial_concurrency=float(os.getenv("LLM_INITIAL_CONCURRENCY", "0")) or None,
+        latency_target=float(os.getenv("LLM_LATENCY_TARGET_MS", "5000")) / 1000.0,
+    )
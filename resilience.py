@@ -0,0 +1,211 @@
+"""Prazos por ticket, circuit breaker e hedging para chamadas a serviços externos."""
+
+# Imports de bibliotecas padrão para relógio, sincronização e configuração
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Tempo total que um ticket pode gastar no fluxo antes de cair nos fallbacks
+TICKET_DEADLINE_SECONDS = float(os.getenv("TICKET_DEADLINE_SECONDS", "120"))
+
+class DeadlineExceeded(RuntimeError):
+    """O prazo do ticket terminou antes da operação começar."""
+
+class CircuitOpenError(RuntimeError):
+    """O circuito está aberto: a chamada nem chega ao provedor."""
+
+def new_deadline(seconds: Optional[float] = None) -> float:
+    """Instante (``time.time()``) em que o prazo de um novo ticket termina."""
+    return time.time() + (TICKET_DEADLINE_SECONDS if seconds is None else seconds)
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Segundos restantes até o prazo (None quando não há prazo)."""
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+def check_deadline(deadline: Optional[float], operation: str) -> None:
+    """Levanta DeadlineExceeded se o prazo já tiver passado."""
+    left = remaining(deadline)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Prazo do ticket esgotado antes de: {operation}")
+
+class CircuitBreaker:
+    """Circuit breaker clássico de três estados (fechado, aberto, semiaberto).
+
+    Após ``failure_threshold`` falhas consecutivas o circuito abre e recusa
+    chamadas por ``reset_timeout`` segundos. Em seguida, uma única chamada de
+    teste é liberada: sucesso fecha o circuito, falha o reabre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Indica se a chamada pode seguir; no semiaberto libera só um teste."""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._stats["rejected"] += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self._stats["rejected"] += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Libera o teste do semiaberto quando a chamada não chegou ao provedor."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {**self._stats, "state": self._state, "consecutive_failures": self._failures}
+
+def breaker_from_env() -> CircuitBreaker:
+    """Cria o breaker a partir de LLM_BREAKER_FAILURES e LLM_BREAKER_RESET_SECONDS."""
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    )
+
+class Hedger:
+    """Dispara uma cópia da chamada quando a original passa do percentil recente.
+
+    A cópia só sai depois de ``min_samples`` latências observadas e enquanto
+    houver orçamento: cada chamada primária acumula ``budget_ratio`` créditos e
+    cada cópia consome um, limitando o tráfego extra a essa fração. Vence a
+    primeira resposta bem-sucedida; a perdedora é cancelada se ainda não
+    começou ou tem o resultado descartado.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget_ratio: float = 0.05,
+        min_samples: int = 20,
+        window: int = 500,
+        max_workers: int = 32,
+        max_credits: float = 10.0,
+    ):
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.max_credits = max_credits
+        self._latencies: deque = deque(maxlen=window)
+        self._credits = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Percentil configurado das latências recentes (None sem amostras suficientes)."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def _take_credit(self) -> bool:
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                return True
+            return False
+
+    def _submit(self, fn: Callable[[], T]):
+        # Cada tentativa roda em uma cópia do contexto para preservar contextvars do chamador
+        return self._pool.submit(contextvars.copy_context().run, fn)
+
+    def run(self, fn: Callable[[], T]) -> T:
+        """Executa ``fn`` com hedging e retorna o primeiro resultado bem-sucedido."""
+        started = time.monotonic()
+        with self._lock:
+            self._stats["calls"] += 1
+            self._credits = min(self.max_credits, self._credits + self.budget_ratio)
+
+        primary = self._submit(fn)
+        delay = self._hedge_delay()
+        pending = {primary}
+        if delay is not None:
+            done, _ = wait(pending, timeout=delay)
+            if not done and self._take_credit():
+                with self._lock:
+                    self._stats["hedged"] += 1
+                pending.add(self._submit(fn))
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - started)
+                        if future is not primary:
+                            self._stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+            stats["credits"] = round(self._credits, 2)
+        delay = self._hedge_delay()
+        stats["hedge_delay_ms"] = round(delay * 1000, 1) if delay is not None else None
+        return stats
+
+def hedger_from_env() -> Optional[Hedger]:
+    """Cria o Hedger quando LLM_HEDGE_ENABLED=true (desligado por padrão)."""
+    if os.getenv("LLM_HEDGE_ENABLED", "false").lower() != "true":
+        return None
+    return Hedger(
+        percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        budget_ratio=float(os.getenv("LLM_HEDGE_BUDGET", "0.05")),
+        min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+    )
@@ -0,0 +1,449 @@
+"""Armazenamento colunar dos resultados de cada execução do grafo.
+
+Cada execução (``run_graph``) vira uma linha com intenção, sistema,
+prioridade, complexidade, status final, tempo por nó, chamadas ao LLM e
+tokens. As linhas ficam em memória e são gravadas em lotes, como arquivos
+imutáveis particionados por dia:
+
+    data/results/date=2026-10-19/part-<ms>-<pid>-<seq>.npz
+
+Cada arquivo guarda uma coluna por array numpy (sem pickle); as colunas de
+texto com poucos valores (intenção, sistema, status...) são gravadas como
+códigos inteiros mais um dicionário. A leitura carrega só as colunas pedidas
+e só as partições do intervalo, e as agregações são ``np.bincount`` sobre os
+códigos, o que mantém os painéis rápidos com milhões de linhas. Processos diferentes (fila, API) gravam
+arquivos próprios; ``compact`` junta as partes de dias encerrados.
+
+Exemplos:
+    python results_store.py --since 2026-10-01
+    python results_store.py --export resultados.csv --since 2026-10-01
+    python results_store.py --compact
+"""
+
+# Imports de bibliotecas padrão para contexto por execução, arquivos e sincronização
+import argparse
+import atexit
+import contextvars
+import csv
+import functools
+import itertools
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Grava uma linha por execução do grafo (false desliga)
+RESULTS_STORE_ENABLED = os.getenv("RESULTS_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Diretório raiz das partições diárias
+RESULTS_PATH = Path(os.getenv("RESULTS_PATH", str(Path(__file__).parent / "data" / "results")))
+
+# Linhas em memória antes de gravar uma parte, e idade máxima (s) da linha mais antiga
+RESULTS_FLUSH_ROWS = int(os.getenv("RESULTS_FLUSH_ROWS", "500"))
+RESULTS_FLUSH_SECONDS = float(os.getenv("RESULTS_FLUSH_SECONDS", "60"))
+
+# Colunas fixas; os tempos por nó viram colunas ``node_<nome>_ms`` (NaN quando o nó não rodou)
+STRING_COLUMNS = ["ticket_id"]
+CATEGORY_COLUMNS = ["intent", "system", "priority", "complexity", "final_status"]
+NUMBER_COLUMNS = {
+    "recorded_at": np.float64,
+    "can_automate": np.int8,
+    "total_ms": np.float32,
+    "llm_calls": np.int32,
+    "tokens": np.int32,
+}
+NODE_PREFIX = "node_"
+
+# Sufixo do dicionário de valores de uma coluna categórica dentro do arquivo
+LABELS_SUFFIX = ".labels"
+
+class RunMetrics:
+    """Tempos por nó e consumo do LLM de uma execução (compartilhado com threads de hedging)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes: Dict[str, float] = {}
+        self.llm_calls = 0
+        self.tokens = 0.0
+
+    def add_node(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.nodes[name] = self.nodes.get(name, 0.0) + seconds
+
+    def add_llm_call(self, tokens: float) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.tokens += tokens
+
+# Métricas da execução em andamento (cópias do contexto levam a mesma instância)
+_metrics: contextvars.ContextVar[Optional[RunMetrics]] = contextvars.ContextVar("run_metrics", default=None)
+
+def record_llm_call(tokens: float) -> None:
+    """Soma uma chamada ao LLM (e seus tokens) à execução em andamento, se houver."""
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.add_llm_call(tokens)
+
+def timed_node(name: str, fn: Callable) -> Callable:
+    """Envolve um nó do grafo para somar seu tempo à execução em andamento."""
+    @functools.wraps(fn)
+    def run(state):
+        metrics = _metrics.get()
+        if metrics is None:
+            return fn(state)
+        started = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            metrics.add_node(name, time.perf_counter() - started)
+    return run
+
+def build_row(result: Dict[str, Any], metrics: RunMetrics, elapsed: float) -> Dict[str, Any]:
+    """Linha colunar a partir do estado final do grafo."""
+    ticket = result.get("ticket") or {}
+    can_automate = result.get("can_automate")
+    row: Dict[str, Any] = {
+        "ticket_id": str(ticket.get("id", "")),
+        "intent": result.get("intent") or "",
+        "system": result.get("system") or "",
+        "priority": result.get("priority") or "",
+        "complexity": result.get("complexity") or "",
+        "final_status": result.get("final_status") or "Desconhecido",
+        "recorded_at": time.time(),
+        "can_automate": -1 if can_automate is None else int(bool(can_automate)),
+        "total_ms": elapsed * 1000,
+        "llm_calls": metrics.llm_calls,
+        "tokens": round(metrics.tokens),
+    }
+    for name, seconds in metrics.nodes.items():
+        row[f"{NODE_PREFIX}{name}_ms"] = seconds * 1000
+    return row
+
+def _column(name: str, values: List[Any]) -> np.ndarray:
+    if name in NUMBER_COLUMNS:
+        return np.asarray(values, dtype=NUMBER_COLUMNS[name])
+    if name.startswith(NODE_PREFIX):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float32)
+    return np.asarray(["" if v is None else str(v) for v in values], dtype=str)
+
+def _empty(name: str, size: int) -> np.ndarray:
+    # Coluna ausente em partes antigas: NaN para tempos, -1/0 para números, "" para textos
+    if name.startswith(NODE_PREFIX):
+        return np.full(size, np.nan, dtype=np.float32)
+    if name in NUMBER_COLUMNS:
+        return np.full(size, -1 if name == "can_automate" else 0, dtype=NUMBER_COLUMNS[name])
+    return np.full(size, "", dtype=str)
+
+_sequence = itertools.count()
+
+def _save(path: Path, columns: Dict[str, np.ndarray]) -> None:
+    # Nome temporário sem .npz: leitores nunca veem uma parte incompleta
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **columns)
+    os.replace(tmp, path)
+
+def write_part(rows: List[Dict[str, Any]], root: Path = RESULTS_PATH) -> List[Path]:
+    """Grava as linhas como uma parte imutável por dia; devolve os arquivos criados."""
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_day.setdefault(date.fromtimestamp(row["recorded_at"]).isoformat(), []).append(row)
+    written = []
+    for day, day_rows in by_day.items():
+        names = STRING_COLUMNS + CATEGORY_COLUMNS + list(NUMBER_COLUMNS)
+        names += sorted({key for row in day_rows for key in row if key.startswith(NODE_PREFIX)})
+        columns = {}
+        for name in names:
+            values = _column(name, [row.get(name) for row in day_rows])
+            if name in CATEGORY_COLUMNS:
+                labels, codes = np.unique(values, return_inverse=True)
+                columns[name], columns[name + LABELS_SUFFIX] = codes.astype(np.int32), labels
+            else:
+                columns[name] = values
+        folder = Path(root) / f"date={day}"
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"part-{int(time.time() * 1000)}-{os.getpid()}-{next(_sequence)}.npz"
+        _save(path, columns)
+        written.append(path)
+    return written
+
+class ResultsWriter:
+    """Buffer de linhas do processo, gravado por tamanho, por idade ou no encerramento."""
+
+    def __init__(self, root: Path = RESULTS_PATH, flush_rows: int = RESULTS_FLUSH_ROWS,
+                 flush_seconds: float = RESULTS_FLUSH_SECONDS):
+        self.root = Path(root)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._oldest = 0.0
+        self._stats = {"rows": 0, "parts": 0, "errors": 0}
+
+    def append(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            self._stats["rows"] += 1
+            due = len(self._rows) >= self.flush_rows or time.monotonic() - self._oldest >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Grava as linhas pendentes; falhas de disco não interrompem o processamento."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                self._stats["parts"] += len(write_part(rows, self.root))
+            except (OSError, ValueError) as e:
+                self._stats["errors"] += 1
+                print(f"AVISO: Falha ao gravar {len(rows)} resultado(s) em {self.root}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "pending": len(self._rows)}
+
+_writer = ResultsWriter()
+atexit.register(_writer.flush)
+
+def run_graph(app, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Executa o grafo medindo nós, chamadas e tokens, e grava a linha do resultado."""
+    metrics = RunMetrics()
+    token = _metrics.set(metrics)
+    started = time.perf_counter()
+    try:
+        result = app.invoke(state)
+    except Exception as e:
+        if RESULTS_STORE_ENABLED:
+            failure = {"ticket": state.get("ticket"), "final_status": "Erro", "error_message": str(e)}
+            _writer.append(build_row({**state, **failure}, metrics, time.perf_counter() - started))
+        raise
+    finally:
+        _metrics.reset(token)
+    if RESULTS_STORE_ENABLED:
+        _writer.append(build_row(result, metrics, time.perf_counter() - started))
+    return result
+
+def flush() -> None:
+    """Grava imediatamente os resultados ainda em memória."""
+    _writer.flush()
+
+def store_stats() -> Dict[str, int]:
+    """Linhas registradas, partes gravadas, falhas e linhas pendentes do processo."""
+    return _writer.stats()
+
+# --- leitura -------------------------------------------------------------------
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+def partitions(since: Any = None, until: Any = None, root: Path = RESULTS_PATH) -> List[Path]:
+    """Partes gravadas nos dias de ``since`` a ``until`` (inclusive), em ordem."""
+    since, until = _as_date(since), _as_date(until)
+    parts = []
+    for folder in sorted(Path(root).glob("date=*")):
+        try:
+            day = date.fromisoformat(folder.name[len("date="):])
+        except ValueError:
+            continue
+        if (since and day < since) or (until and day > until):
+            continue
+        parts.extend(sorted(folder.glob("*.npz")))
+    return parts
+
+class ResultColumns(dict):
+    """Colunas lidas por ``load``: as categóricas são códigos, com os valores em ``labels[nome]``."""
+
+    def __init__(self):
+        super().__init__()
+        self.labels: Dict[str, np.ndarray] = {}
+
+    @property
+    def rows(self) -> int:
+        return len(next(iter(self.values()))) if self else 0
+
+    def text(self, name: str) -> np.ndarray:
+        """Valores da coluna como texto (decodifica as categóricas)."""
+        return self.labels[name][self[name]] if name in self.labels else self[name]
+
+def load(since: Any = None, until: Any = None, columns: Optional[List[str]] = None,
+         root: Path = RESULTS_PATH, exclude: Sequence[str] = ()) -> ResultColumns:
+    """Colunas dos resultados no intervalo; ``columns=None`` traz todas as existentes menos ``exclude``."""
+    chunks: List[Tuple[int, Dict[str, np.ndarray]]] = []
+    for part in partitions(since, until, root):
+        with np.load(part, allow_pickle=False) as data:
+            stored = [name for name in data.files if not name.endswith(LABELS_SUFFIX) and name not in exclude]
+            wanted = [name for name in (columns or stored) if name in data.files]
+            wanted += [name + LABELS_SUFFIX for name in wanted if name in CATEGORY_COLUMNS]
+            chunks.append((len(data["recorded_at"]), {name: data[name] for name in wanted}))
+
+    base = STRING_COLUMNS + CATEGORY_COLUMNS + list(NUMBER_COLUMNS)
+    names = columns or sorted({name for _, chunk in chunks for name in chunk if not name.endswith(LABELS_SUFFIX)},
+                              key=lambda n: (base.index(n), "") if n in base else (len(base), n))
+    merged = ResultColumns()
+    for name in names:
+        if name in CATEGORY_COLUMNS:
+            # Dicionários diferentes por parte viram um só; os códigos são remapeados
+            vocabulary: Dict[str, int] = {}
+            pieces = []
+            for size, chunk in chunks:
+                if name in chunk:
+                    remap = np.array([vocabulary.setdefault(str(label), len(vocabulary))
+                                      for label in chunk[name + LABELS_SUFFIX]], dtype=np.int32)
+                    pieces.append(remap[chunk[name]] if len(remap) else chunk[name].astype(np.int32))
+                else:
+                    pieces.append(np.full(size, vocabulary.setdefault("", len(vocabulary)), dtype=np.int32))
+            merged[name] = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int32)
+            merged.labels[name] = np.array(list(vocabulary), dtype=str)
+        else:
+            pieces = [chunk[name] if name in chunk else _empty(name, size) for size, chunk in chunks]
+            merged[name] = np.concatenate(pieces) if pieces else _empty(name, 0)
+    return merged
+
+def _codes(data: Dict[str, np.ndarray], name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(códigos, valores) de uma coluna de texto, codificada ou não."""
+    labels = getattr(data, "labels", {})
+    if name in labels:
+        return data[name], labels[name]
+    values, codes = np.unique(data[name], return_inverse=True)
+    return codes, values
+
+def _status_masks(labels: np.ndarray) -> Dict[str, np.ndarray]:
+    # Máscaras sobre o dicionário de status, não sobre as linhas
+    return {
+        "resolved": labels == "Resolvido",
+        "escalated": np.char.startswith(labels.astype(str), "Escalado"),
+        "errors": labels == "Erro",
+    }
+
+def _by_group(data: Dict[str, np.ndarray], column: str, status: np.ndarray,
+              masks: Dict[str, np.ndarray]) -> Dict[str, Dict[str, int]]:
+    """Totais, resolvidos, escalados e erros por valor de ``column``."""
+    codes, labels = _codes(data, column)
+    width = len(next(iter(masks.values())))
+    # Tabela grupo x status em um único bincount
+    table = np.bincount(codes.astype(np.int64) * width + status, minlength=len(labels) * width)
+    table = table.reshape(len(labels), width)
+    groups = {}
+    for i, label in enumerate(labels):
+        total = int(table[i].sum())
+        if total:
+            groups[str(label)] = {"total": total, **{key: int(table[i][mask].sum()) for key, mask in masks.items()}}
+    return groups
+
+def summarize(data: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Agregados vetorizados: status, cortes por intenção/sistema/prioridade, tempos e tokens."""
+    rows = len(data["final_status"]) if "final_status" in data else 0
+    summary: Dict[str, Any] = {"rows": rows}
+    if not rows:
+        return summary
+    status, labels = _codes(data, "final_status")
+    counts = np.bincount(status, minlength=len(labels))
+    masks = _status_masks(labels)
+    summary["status"] = {key: int(counts[mask].sum()) for key, mask in masks.items()}
+    summary["final_status"] = {str(label): int(count) for label, count in zip(labels, counts) if count}
+    for column in ("intent", "system", "priority"):
+        if column in data:
+            summary[f"by_{column}"] = _by_group(data, column, status, masks)
+    if "total_ms" in data:
+        p50, p95 = np.percentile(data["total_ms"], [50, 95])
+        summary["total_ms"] = {"mean": float(data["total_ms"].mean()), "p50": float(p50), "p95": float(p95)}
+    if "tokens" in data:
+        summary["tokens"] = {"total": int(data["tokens"].sum(dtype=np.int64)), "mean": float(data["tokens"].mean()),
+                             "llm_calls": int(data["llm_calls"].sum(dtype=np.int64)) if "llm_calls" in data else 0}
+    nodes = {}
+    for name, values in data.items():
+        if not name.startswith(NODE_PREFIX):
+            continue
+        ran = values[~np.isnan(values)]
+        if len(ran):
+            p50, p95 = np.percentile(ran, [50, 95])
+            nodes[name[len(NODE_PREFIX):-len("_ms")]] = {"runs": len(ran), "mean_ms": float(ran.mean()),
+                                                         "p50_ms": float(p50), "p95_ms": float(p95)}
+    summary["nodes"] = nodes
+    return summary
+
+def load_summary(since: Any = None, until: Any = None, root: Path = RESULTS_PATH) -> Dict[str, Any]:
+    """``summarize`` do intervalo sem ler os ids dos tickets (a coluna mais cara)."""
+    return summarize(load(since, until, root=root, exclude=["ticket_id"]))
+
+def export(path: str, since: Any = None, until: Any = None, root: Path = RESULTS_PATH) -> int:
+    """Exporta o intervalo para CSV ou, com ``.parquet`` e pyarrow instalado, Parquet; devolve as linhas."""
+    loaded = load(since, until, root=root)
+    data = {name: loaded.text(name) for name in loaded}
+    rows = loaded.rows
+    if str(path).endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportar para Parquet requer o pacote 'pyarrow' (pip install pyarrow).")
+        pq.write_table(pa.table(data), path)
+        return rows
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(data))
+        writer.writerows(zip(*(column.tolist() for column in data.values())))
+    return rows
+
+def compact(before: Any = None, root: Path = RESULTS_PATH) -> int:
+    """Junta as partes de cada dia anterior a ``before`` (padrão: hoje) em uma só; devolve os dias compactados."""
+    before = _as_date(before) or date.today()
+    compacted = 0
+    for folder in sorted(Path(root).glob("date=*")):
+        parts = sorted(folder.glob("*.npz"))
+        if len(parts) < 2 or folder.name[len("date="):] >= before.isoformat():
+            continue
+        day = folder.name[len("date="):]
+        data = load(day, day, root=root)
+        labels = {name + LABELS_SUFFIX: values for name, values in data.labels.items()}
+        _save(folder / f"part-{int(time.time() * 1000)}-{os.getpid()}-compacted.npz", {**data, **labels})
+        for part in parts:
+            part.unlink()
+        compacted += 1
+    return compacted
+
+def main() -> None:
+    """Resumo, exportação e compactação do armazenamento pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Consulta os resultados gravados das execuções do grafo")
+    parser.add_argument("--since", help="primeiro dia (AAAA-MM-DD); padrão: últimos 7 dias")
+    parser.add_argument("--until", help="último dia (AAAA-MM-DD)")
+    parser.add_argument("--export", metavar="ARQUIVO", help="exporta o intervalo para .csv ou .parquet")
+    parser.add_argument("--compact", action="store_true", help="junta as partes dos dias anteriores a hoje")
+    args = parser.parse_args()
+
+    if args.compact:
+        print(f"{compact()} dia(s) compactado(s) em {RESULTS_PATH}")
+        return
+    since = args.since or (date.today() - timedelta(days=6)).isoformat()
+    if args.export:
+        print(f"{export(args.export, since, args.until)} linha(s) exportada(s) para {args.export}")
+        return
+
+    started = time.perf_counter()
+    summary = load_summary(since, args.until)
+    print(f"{summary['rows']} resultado(s) desde {since} (lidos e agregados em {time.perf_counter() - started:.2f}s)")
+    if not summary["rows"]:
+        return
+    status = summary["status"]
+    print(f"Resolvidos {status['resolved']}, escalados {status['escalated']}, erros {status['errors']}; "
+          f"tempo p50 {summary['total_ms']['p50']:.0f} ms, p95 {summary['total_ms']['p95']:.0f} ms; "
+          f"{summary['tokens']['total']} tokens em {summary['tokens']['llm_calls']} chamadas ao LLM")
+    print(f"\n{'intenção':<20}{'total':>8}{'resolv.':>9}{'escal.':>8}{'erros':>7}")
+    for intent, row in sorted(summary["by_intent"].items(), key=lambda r: -r[1]["total"]):
+        print(f"{intent or '-':<20}{row['total']:>8}{row['resolved']:>9}{row['escalated']:>8}{row['errors']:>7}")
+    print(f"\n{'nó':<20}{'execuções':>10}{'média ms':>10}{'p95 ms':>9}")
+    for node, row in summary["nodes"].items():
+        print(f"{node:<20}{row['runs']:>10}{row['mean_ms']:>10.1f}{row['p95_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Escalonador da fila de tickets por prioridade, com envelhecimento e faixa reservada.
+
+Antes do fluxo completo, uma estimativa local de prioridade (palavras-chave,
+sem LLM) ordena a fila. Tickets ``critical`` e ``high`` entram na faixa
+urgente, atendida por workers reservados além dos workers gerais; assim o
+tempo até a resolução de um ticket urgente não depende do tamanho do backlog.
+O envelhecimento impede que tickets de baixa prioridade esperem para sempre.
+"""
+
+# Imports de bibliotecas padrão para fila de prioridade, threads e relógio
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tools.ticket_features import keyword_match, ticket_features
+
+# Ordem de atendimento: menor valor sai primeiro
+PRIORITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+URGENT_PRIORITIES = {"critical", "high"}
+
+# Segundos de espera equivalentes a subir um nível de prioridade
+AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "60"))
+
+def estimate_priority(ticket: Dict[str, Any]) -> str:
+    """Prioridade aproximada pelas palavras-chave ``priority:*`` dos atributos do ticket, sem LLM."""
+    matched = keyword_match(ticket_features(ticket), "priority")
+    return matched[0] if matched else "medium"
+
+def priority_order(tickets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tickets na ordem em que o escalonador os atende (estável por prioridade)."""
+    return sorted(tickets, key=lambda t: PRIORITY_RANK[estimate_priority(t)])
+
+class TicketScheduler:
+    """Fila de prioridade com envelhecimento linear e duas faixas (urgente e normal).
+
+    A prioridade efetiva é ``rank - espera / aging_seconds``; como a espera
+    cresce igual para todos, a ordem relativa equivale à chave estática
+    ``rank + enfileirado_em / aging_seconds``, que cabe em um heap comum.
+    """
+
+    def __init__(self, aging_seconds: float = AGING_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.aging_seconds = aging_seconds
+        self._clock = clock
+        self._urgent: List[Tuple[float, int, Dict[str, Any], str]] = []
+        self._normal: List[Tuple[float, int, Dict[str, Any], str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, ticket: Dict[str, Any], priority: Optional[str] = None) -> str:
+        """Enfileira o ticket; sem ``priority``, usa a estimativa local."""
+        priority = priority or estimate_priority(ticket)
+        key = PRIORITY_RANK.get(priority, PRIORITY_RANK["medium"]) + self._clock() / self.aging_seconds
+        lane = self._urgent if priority in URGENT_PRIORITIES else self._normal
+        with self._cond:
+            heapq.heappush(lane, (key, next(self._seq), ticket, priority))
+            self._cond.notify_all()
+        return priority
+
+    def close(self) -> None:
+        """Sinaliza que não haverá novos tickets; workers saem com a fila vazia."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, urgent_only: bool = False, timeout: Optional[float] = None) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Próximo (ticket, prioridade); None com a fila fechada e vazia ou no timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                lanes = [self._urgent] if urgent_only else [self._urgent, self._normal]
+                ready = [lane for lane in lanes if lane]
+                if ready:
+                    lane = min(ready, key=lambda l: l[0][:2])
+                    _, _, ticket, priority = heapq.heappop(lane)
+                    return ticket, priority
+                if self._closed:
+                    return None
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return None
+                self._cond.wait(wait)
+
+    def discard_pending(self) -> int:
+        """Descarta os tickets ainda não retirados e devolve quantos eram."""
+        with self._cond:
+            count = len(self._urgent) + len(self._normal)
+            self._urgent.clear()
+            self._normal.clear()
+            self._cond.notify_all()
+            return count
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._urgent) + len(self._normal)
+
+def serve(
+    queue: TicketScheduler,
+    handler: Callable[[Dict[str, Any], str], Any],
+    workers: int = 1,
+    urgent_workers: int = 0,
+) -> List[Any]:
+    """Atende ``queue`` até ela ser fechada e esvaziada; devolve os resultados na ordem atendida.
+
+    ``workers`` atendem as duas faixas; ``urgent_workers`` adicionais atendem
+    só a faixa urgente, para que tickets críticos não esperem os de rotina.
+    """
+    results: List[Any] = []
+    results_lock = threading.Lock()
+
+    def worker(urgent_only: bool) -> None:
+        while True:
+            item = queue.get(urgent_only=urgent_only)
+            if item is None:
+                return
+            result = handler(*item)
+            with results_lock:
+                results.append(result)
+
+    if workers <= 1 and urgent_workers <= 0:
+        worker(False)
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers + urgent_workers, thread_name_prefix="ticket") as pool:
+        futures = [pool.submit(worker, True) for _ in range(urgent_workers)]
+        futures += [pool.submit(worker, False) for _ in range(max(1, workers))]
+        for future in futures:
+            future.result()
+    return results
+
+def run_scheduled(
+    tickets: List[Dict[str, Any]],
+    handler: Callable[[Dict[str, Any], str], Any],
+    workers: int = 1,
+    urgent_workers: int = 0,
+) -> List[Any]:
+    """Processa ``tickets`` em ordem de prioridade com ``serve``.
+
+    Entre tickets de mesma prioridade, vale a ordem recebida; assim quem
+    chega em ``priority_order`` é retirado da fila exatamente nessa ordem.
+    """
+    queue = TicketScheduler()
+    for ticket in tickets:
+        queue.put(ticket)
+    queue.close()
+    return serve(queue, handler, workers, urgent_workers)
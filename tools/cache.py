@@ -0,0 +1,92 @@
+"""Cache em memória com política LRU, expiração por TTL e cache negativo."""
+
+# Imports de bibliotecas padrão para ordenação LRU, relógio monotônico e concorrência
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+    """Mapa limitado em tamanho cujas entradas expiram após um TTL.
+
+    Valores considerados "negativos" (por exemplo, usuário inexistente) usam um
+    TTL próprio, normalmente menor, para que uma criação posterior apareça logo.
+    Todas as operações são protegidas por lock e podem ser usadas entre threads.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        is_negative: Optional[Callable[[Any], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._is_negative = is_negative or (lambda value: False)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Chave -> (instante de expiração, valor); a ordem reflete o uso mais recente
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor em cache ou None quando ausente/expirado."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                # Entrada vencida conta como miss e é removida imediatamente
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["negative_hits" if self._is_negative(value) else "hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Armazena o valor usando o TTL adequado e aplica o limite LRU."""
+        ttl = self.negative_ttl if self._is_negative(value) else self.ttl
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove explicitamente uma chave; retorna True quando ela existia."""
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+            if removed:
+                self._stats["invalidations"] += 1
+            return removed
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove as entradas cujo (chave, valor) satisfaz ``predicate``; retorna quantas saíram."""
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Esvazia o cache mantendo as estatísticas acumuladas."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores de acerto/erro prontos para exportar como métricas."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["size"] = len(self._data)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["negative_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
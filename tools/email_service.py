@@ -1,10 +1,20 @@
 """Utilitários simulados de e-mail usados pelo fluxo automatizado de tickets."""
 
-# Imports das bibliotecas padrão usados para registrar timestamps e tipos de retorno
+# Imports das bibliotecas padrão usados para registrar timestamps, agrupamento e tipos de retorno
+import atexit
+import threading
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional
 import os
 
+# Janela (s) em que notificações ao mesmo gestor ou equipe viram um único e-mail; 0 desliga
+DIGEST_WINDOW_SECONDS = float(os.getenv("EMAIL_DIGEST_WINDOW_SECONDS", "0"))
+
+# Resumos pendentes por destinatário: tipo, itens e timer de envio
+_digests: Dict[str, Dict[str, Any]] = {}
+_digest_lock = threading.Lock()
+_digest_stats = {"queued": 0, "digests": 0, "single": 0}
+
 def send_email(to: str, subject: str, body: str, cc: Optional[str] = None) -> Dict:
     """Simula o envio de um e-mail e registra o conteúdo."""
     # Captura um timestamp legível para acompanhar quando o "envio" ocorreu
@@ -38,7 +48,97 @@ def send_email(to: str, subject: str, body: str, cc: Optional[str] = None) -> Di
         "message": "Email enviado com sucesso"
     }
 
-def send_notification_to_user(user_email: str, ticket_id: int, resolution_details: Dict) -> Dict:
+def _queue_digest(recipient: str, recipient_type: str, item: Dict[str, Any]) -> Dict:
+    """Guarda a notificação no resumo do destinatário; o primeiro item dispara o timer da janela."""
+    with _digest_lock:
+        digest = _digests.get(recipient)
+        if digest is None:
+            timer = threading.Timer(DIGEST_WINDOW_SECONDS, _flush_recipient, args=(recipient,))
+            timer.daemon = True
+            digest = _digests[recipient] = {"type": recipient_type, "items": [], "timer": timer}
+            timer.start()
+        digest["items"].append(item)
+        _digest_stats["queued"] += 1
+    return {
+        "ok": True,
+        "queued": True,
+        "to": recipient,
+        "message": f"Notificação agrupada no resumo para {recipient}"
+    }
+
+def _flush_recipient(recipient: str) -> Optional[Dict]:
+    """Envia o resumo pendente de um destinatário (um item só segue o e-mail individual)."""
+    with _digest_lock:
+        digest = _digests.pop(recipient, None)
+    if digest is None:
+        return None
+    digest["timer"].cancel()
+    items: List[Dict[str, Any]] = digest["items"]
+    if len(items) == 1:
+        with _digest_lock:
+            _digest_stats["single"] += 1
+        return items[0]["send"]()
+    with _digest_lock:
+        _digest_stats["digests"] += 1
+    return _send_digest(recipient, digest["type"], items)
+
+def _send_digest(recipient: str, recipient_type: str, items: List[Dict[str, Any]]) -> Dict:
+    """Monta o e-mail agrupado a partir do template, com um único resumo gerado pelo LLM."""
+    resolved = [item for item in items if item["status"] == "Resolvido"]
+    escalated = [item for item in items if item["status"] != "Resolvido"]
+
+    summary = ""
+    if os.getenv("USE_LLM_EMAILS", "true").lower() == "true":
+        from classifier import generate_digest_summary
+        summary = generate_digest_summary(recipient_type, items)
+
+    def section(title: str, entries: List[Dict[str, Any]]) -> str:
+        if not entries:
+            return ""
+        lines = []
+        for item in entries:
+            who = f" - {item['user_name']}" if item.get("user_name") else ""
+            details = "\n".join(f"    {line}" for line in (item.get("details") or "").strip().splitlines())
+            lines.append(f"- Ticket #{item['ticket_id']}{who}\n{details}" if details else f"- Ticket #{item['ticket_id']}{who}")
+        return f"{title} ({len(entries)}):\n" + "\n".join(lines) + "\n\n"
+
+    summary_block = f"{summary}\n\n" if summary else ""
+    subject = f"Resumo de {len(items)} tickets: {len(resolved)} resolvidos, {len(escalated)} escalados"
+    body = f"""
+Olá,
+
+Segue o resumo das notificações dos últimos {DIGEST_WINDOW_SECONDS:.0f} segundos.
+
+{summary_block}{section("RESOLVIDOS AUTOMATICAMENTE", resolved)}{section("ESCALADOS", escalated)}Este é um email informativo consolidado.
+
+Atenciosamente,
+Sistema Automático de Suporte
+"""
+    return send_email(recipient, subject, body)
+
+def flush_digests() -> int:
+    """Envia agora todos os resumos pendentes; devolve quantos destinatários foram atendidos."""
+    with _digest_lock:
+        recipients = list(_digests)
+    for recipient in recipients:
+        try:
+            _flush_recipient(recipient)
+        except Exception as e:
+            print(f"AVISO: Falha ao enviar resumo para {recipient}: {e}")
+    return len(recipients)
+
+def digest_stats() -> Dict[str, int]:
+    """Notificações agrupadas, resumos enviados e e-mails individuais de janelas com um só item."""
+    with _digest_lock:
+        return {**_digest_stats, "pending": sum(len(d["items"]) for d in _digests.values())}
+
+# Resumos ainda na janela não se perdem quando o processo termina
+atexit.register(flush_digests)
+
+def _digest_enabled(digest: Optional[bool]) -> bool:
+    return digest is not False and DIGEST_WINDOW_SECONDS > 0
+
+def send_notification_to_user(user_email: str, ticket_id: int, resolution_details: Dict, deadline: Optional[float] = None) -> Dict:
     """Notifica o solicitante que o ticket foi resolvido automaticamente."""
     # Tenta gerar email personalizado via LLM se disponível
     use_llm = os.getenv("USE_LLM_EMAILS", "true").lower() == "true"
@@ -59,7 +159,7 @@ def send_notification_to_user(user_email: str, ticket_id: int, resolution_detail
                 "temp_password": resolution_details.get('temp_password'),
             }
             
-            subject, body = generate_personalized_email("user", ticket, context)
+            subject, body = generate_personalized_email("user", ticket, context, deadline)
             return send_email(user_email, subject, body)
         except Exception as e:
             print(f"Erro ao gerar email via LLM, usando template padrão: {e}")
@@ -87,8 +187,17 @@ Sistema Automático de Suporte
 """
     return send_email(user_email, subject, body)
 
-def send_notification_to_manager(manager_email: str, user_name: str, ticket_id: int, resolution_details: Dict) -> Dict:
-    """Informa ao gestor que o ticket do solicitante foi resolvido."""
+def send_notification_to_manager(manager_email: str, user_name: str, ticket_id: int, resolution_details: Dict, deadline: Optional[float] = None, digest: Optional[bool] = None) -> Dict:
+    """Informa ao gestor que o ticket do solicitante foi resolvido (agrupado no modo resumo)."""
+    if _digest_enabled(digest):
+        return _queue_digest(manager_email, "manager", {
+            "ticket_id": ticket_id,
+            "user_name": user_name,
+            "status": "Resolvido",
+            "details": resolution_details.get("actions_summary", ""),
+            "send": lambda: send_notification_to_manager(manager_email, user_name, ticket_id, resolution_details, digest=False),
+        })
+    
     use_llm = os.getenv("USE_LLM_EMAILS", "true").lower() == "true"
     
     if use_llm:
@@ -105,7 +214,7 @@ def send_notification_to_manager(manager_email: str, user_name: str, ticket_id:
                 "actions_summary": resolution_details.get('actions_summary', 'Ações executadas'),
             }
             
-            subject, body = generate_personalized_email("manager", ticket, context)
+            subject, body = generate_personalized_email("manager", ticket, context, deadline)
             return send_email(manager_email, subject, body)
         except Exception as e:
             print(f"Erro ao gerar email via LLM para gestor, usando template padrão: {e}")
@@ -159,8 +268,17 @@ Sistema Automático de Suporte
     # Dispara o email ao usuário
     return send_email(user_email, subject, body)
 
-def send_escalation_notification_to_manager(manager_email: str, user_name: str, ticket_id: int, escalation_details: Dict) -> Dict:
-    """Notifica o gestor sobre tickets escalados que precisam de atenção."""
+def send_escalation_notification_to_manager(manager_email: str, user_name: str, ticket_id: int, escalation_details: Dict, digest: Optional[bool] = None) -> Dict:
+    """Notifica o gestor sobre tickets escalados que precisam de atenção (agrupado no modo resumo)."""
+    if _digest_enabled(digest):
+        return _queue_digest(manager_email, "manager", {
+            "ticket_id": ticket_id,
+            "user_name": user_name,
+            "status": "Escalado",
+            "details": escalation_details.get("actions_summary", ""),
+            "send": lambda: send_escalation_notification_to_manager(manager_email, user_name, ticket_id, escalation_details, digest=False),
+        })
+
     # Assunto de escalonamento destinado ao gestor
     subject = f"Notificação: Ticket #{ticket_id} escalado - {user_name}"
 
@@ -189,8 +307,16 @@ Sistema Automático de Suporte
     # Envia a notificação ao gestor
     return send_email(manager_email, subject, body)
 
-def send_escalation_notification(ticket_id: int, reason: str, assigned_team: str = "Suporte N2") -> Dict:
-    """Envia o e-mail interno de escalação para a equipe responsável."""
+def send_escalation_notification(ticket_id: int, reason: str, assigned_team: str = "Suporte N2", deadline: Optional[float] = None, digest: Optional[bool] = None) -> Dict:
+    """Envia o e-mail interno de escalação para a equipe responsável (agrupado no modo resumo)."""
+    if _digest_enabled(digest):
+        return _queue_digest(f"{assigned_team.lower().replace(' ', '_')}@empresa.com", "team", {
+            "ticket_id": ticket_id,
+            "status": "Escalado",
+            "details": reason,
+            "send": lambda: send_escalation_notification(ticket_id, reason, assigned_team, digest=False),
+        })
+    
     use_llm = os.getenv("USE_LLM_EMAILS", "true").lower() == "true"
     
     if use_llm:
@@ -207,7 +333,7 @@ def send_escalation_notification(ticket_id: int, reason: str, assigned_team: str
                 "assigned_team": assigned_team,
             }
             
-            subject, body = generate_personalized_email("team", ticket, context)
+            subject, body = generate_personalized_email("team", ticket, context, deadline)
             return send_email(f"{assigned_team.lower().replace(' ', '_')}@empresa.com", subject, body)
         except Exception as e:
             print(f"Erro ao gerar email de escalação via LLM, usando template padrão: {e}")
@@ -0,0 +1,473 @@
+"""Backends de diretório usados pelo serviço de identidade.
+
+O ``identity_service`` mantém a API pública (``get_user``, ``unlock_user``...)
+e delega o acesso ao diretório a um ``IdentityBackend``. Cada método de
+consulta em lote corresponde a uma única ida ao diretório.
+"""
+
+# Imports de bibliotecas padrão para concorrência, filas e tipagem
+import math
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Motivo padrão retornado quando uma conta está bloqueada
+LOCK_REASON = "Múltiplas tentativas de login incorretas"
+
+class IdentityBackend:
+    """Interface mínima de um diretório de usuários."""
+
+    name = "base"
+
+    def fetch_users(self, usernames: List[str]) -> Dict[str, Dict]:
+        """Retorna o perfil de cada username (``ok`` False quando não existe)."""
+        raise NotImplementedError
+
+    def fetch_lock_status(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Retorna ``is_locked``/``lock_reason`` de cada user_id."""
+        raise NotImplementedError
+
+    def unlock(self, user_id: str, system: str) -> Dict:
+        """Desbloqueia a conta no sistema informado."""
+        raise NotImplementedError
+
+    def reset_password(self, user_id: str, system: str, temp_password: str) -> Dict:
+        """Define a senha temporária e exige a troca no próximo login."""
+        raise NotImplementedError
+
+    def grant_access(self, user_id: str, system: str) -> Dict:
+        """Concede acesso ao sistema secundário informado."""
+        raise NotImplementedError
+
+    def password_rng(self, user_id: str) -> Optional[random.Random]:
+        """Gerador usado na senha temporária; None usa o módulo ``random``."""
+        return None
+
+    def close(self) -> None:
+        """Libera conexões e recursos mantidos pelo backend."""
+
+def _profile_from_username(username: str) -> Dict:
+    """Deriva um perfil sintético a partir do e-mail do usuário."""
+    return {
+        "ok": True,
+        "user_id": username.split("@")[0],
+        "email": username,
+        "display_name": username.split("@")[0].replace(".", " ").title(),
+        "status": "active"
+    }
+
+def _lock_result(user_id: str, is_locked: bool) -> Dict:
+    """Formata o status de bloqueio no formato esperado pelo fluxo."""
+    return {
+        "ok": True,
+        "user_id": user_id,
+        "is_locked": is_locked,
+        "lock_reason": LOCK_REASON if is_locked else None
+    }
+
+class InMemoryBackend(IdentityBackend):
+    """Diretório simulado em memória, equivalente aos stubs originais.
+
+    Sem ``directory`` explícito, qualquer e-mail válido é aceito e tem seu perfil
+    derivado do username. O estado de bloqueio é sorteado na primeira consulta
+    e mantido até um desbloqueio.
+    """
+
+    name = "memory"
+
+    def __init__(self, directory: Optional[Dict[str, Dict]] = None):
+        self._directory = directory
+        self._locked: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def _is_locked(self, user_id: str) -> bool:
+        """Sorteia o bloqueio na primeira consulta e o memoriza."""
+        with self._lock:
+            if user_id not in self._locked:
+                self._locked[user_id] = random.choice([True, False])
+            return self._locked[user_id]
+
+    def fetch_users(self, usernames: List[str]) -> Dict[str, Dict]:
+        results: Dict[str, Dict] = {}
+        for username in usernames:
+            if self._directory is not None:
+                profile = self._directory.get(username)
+            else:
+                # Identificadores sem domínio não existem no diretório simulado
+                profile = _profile_from_username(username) if "@" in username else None
+            results[username] = dict(profile) if profile else {
+                "ok": False, "email": username, "error": f"Usuário '{username}' não encontrado"
+            }
+        return results
+
+    def fetch_lock_status(self, user_ids: List[str]) -> Dict[str, Dict]:
+        return {user_id: _lock_result(user_id, self._is_locked(user_id)) for user_id in user_ids}
+
+    def unlock(self, user_id: str, system: str) -> Dict:
+        with self._lock:
+            self._locked[user_id] = False
+        return {"ok": True}
+
+    def reset_password(self, user_id: str, system: str, temp_password: str) -> Dict:
+        return {"ok": True}
+
+    def grant_access(self, user_id: str, system: str) -> Dict:
+        return {"ok": True}
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Converte uma especificação de latência (em ms) em um amostrador (em s).
+
+    Formatos aceitos: ``fixed:20``, ``uniform:10:50``, ``normal:30:5`` (média,
+    desvio) e ``lognormal:30:0.5`` (mediana, sigma). Valores negativos viram 0.
+    """
+    kind, *raw = spec.strip().split(":")
+    params = [float(p) for p in raw]
+    if kind == "fixed":
+        return lambda rng: params[0] / 1000.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1]) / 1000.0
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1])) / 1000.0
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1]) / 1000.0
+    raise ValueError(f"Distribuição de latência desconhecida: {spec!r}")
+
+class SimulatedBackend(InMemoryBackend):
+    """Diretório em memória determinístico para benchmarks reproduzíveis.
+
+    Todo sorteio (bloqueio, latência, senha temporária) usa um RNG derivado de
+    ``seed`` e da chave envolvida, de modo que o resultado não depende da ordem
+    em que threads concorrentes chegam ao backend. ``latency`` mapeia cada
+    operação (``get_user``, ``lock_check``, ``unlock``, ``reset``, ``grant``)
+    para uma especificação aceita por ``parse_latency``.
+    """
+
+    name = "simulated"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        lock_probability: float = 0.5,
+        latency: Optional[Dict[str, str]] = None,
+        directory: Optional[Dict[str, Dict]] = None,
+    ):
+        super().__init__(directory)
+        self.seed = seed
+        self.lock_probability = lock_probability
+        self._latency = {op: parse_latency(spec) for op, spec in (latency or {}).items()}
+        self._counters: Dict[str, int] = {}
+
+    def _rng(self, *key: str) -> random.Random:
+        """RNG determinístico para a n-ésima ocorrência de ``key``."""
+        name = ":".join(key)
+        with self._lock:
+            n = self._counters.get(name, 0)
+            self._counters[name] = n + 1
+        return random.Random(f"{self.seed}:{name}:{n}")
+
+    def _sleep(self, op: str, key: str) -> None:
+        """Aplica a latência injetada da operação, quando configurada."""
+        sampler = self._latency.get(op)
+        if sampler is not None:
+            time.sleep(sampler(self._rng("latency", op, key)))
+
+    def _is_locked(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id not in self._locked:
+                draw = random.Random(f"{self.seed}:lock:{user_id}").random()
+                self._locked[user_id] = draw < self.lock_probability
+            return self._locked[user_id]
+
+    def fetch_users(self, usernames: List[str]) -> Dict[str, Dict]:
+        self._sleep("get_user", ",".join(usernames))
+        return super().fetch_users(usernames)
+
+    def fetch_lock_status(self, user_ids: List[str]) -> Dict[str, Dict]:
+        self._sleep("lock_check", ",".join(user_ids))
+        return super().fetch_lock_status(user_ids)
+
+    def unlock(self, user_id: str, system: str) -> Dict:
+        self._sleep("unlock", user_id)
+        return super().unlock(user_id, system)
+
+    def reset_password(self, user_id: str, system: str, temp_password: str) -> Dict:
+        self._sleep("reset", user_id)
+        return super().reset_password(user_id, system, temp_password)
+
+    def grant_access(self, user_id: str, system: str) -> Dict:
+        self._sleep("grant", user_id)
+        return super().grant_access(user_id, system)
+
+    def password_rng(self, user_id: str) -> Optional[random.Random]:
+        return self._rng("password", user_id)
+
+def _is_locked_out(lockout_time) -> bool:
+    """Interpreta o ``lockoutTime`` do AD: diferente de zero indica conta bloqueada.
+
+    Com o schema do AD o ldap3 entrega ``datetime``, e o zero vira a época do
+    AD (1601-01-01); sem schema chega como texto ou bytes.
+    """
+    if isinstance(lockout_time, datetime):
+        return lockout_time.year > 1601
+    if isinstance(lockout_time, bytes):
+        lockout_time = lockout_time.decode("ascii", "replace")
+    return str(lockout_time or "0").strip() not in ("0", "")
+
+def _parse_latency_env(value: str) -> Dict[str, str]:
+    """Lê ``op=spec,op=spec`` (ex.: ``get_user=lognormal:20:0.4,unlock=fixed:80``)."""
+    pairs = [item.split("=", 1) for item in value.split(",") if "=" in item]
+    return {op.strip(): spec.strip() for op, spec in pairs}
+
+class LDAPBackend(IdentityBackend):
+    """Backend LDAP/AD com pool de conexões reutilizáveis (requer ``ldap3``).
+
+    Cada operação toma emprestada uma conexão já autenticada do pool e a
+    devolve ao final, limitando as conexões simultâneas ao ``pool_size``.
+
+    Com ``active_directory`` (padrão), a troca de senha usa a extensão da
+    Microsoft (``unicodePwd``, exige LDAPS); em outros diretórios grava
+    ``userPassword``, que o AD ignora.
+    """
+
+    name = "ldap"
+
+    def __init__(
+        self,
+        server,
+        bind_dn: str,
+        password: str,
+        base_dn: str,
+        pool_size: int = 8,
+        client_strategy: Optional[str] = None,
+        timeout: float = 10.0,
+        active_directory: bool = True,
+    ):
+        try:
+            import ldap3
+        except ImportError as exc:
+            raise RuntimeError("Backend LDAP requer o pacote opcional 'ldap3' (pip install ldap3).") from exc
+
+        self._ldap3 = ldap3
+        self.base_dn = base_dn
+        self.pool_size = pool_size
+        self.active_directory = active_directory
+        self._server = server if not isinstance(server, str) else ldap3.Server(server, connect_timeout=timeout)
+        self._bind_dn = bind_dn
+        self._password = password
+        self._strategy = client_strategy or ldap3.SYNC
+        self._timeout = timeout
+        self._pool: "queue.Queue" = queue.Queue(maxsize=pool_size)
+        self._created = 0
+        self._created_lock = threading.Lock()
+        # Atraso artificial por requisição, usado apenas pelo stand-in local
+        self._simulated_rtt = 0.0
+
+    def _open_connection(self):
+        """Abre e autentica uma nova conexão com o diretório."""
+        conn = self._ldap3.Connection(
+            self._server,
+            user=self._bind_dn,
+            password=self._password,
+            client_strategy=self._strategy,
+            receive_timeout=self._timeout,
+            raise_exceptions=False,
+        )
+        if not conn.bind():
+            raise RuntimeError(f"Falha ao autenticar no diretório: {conn.result}")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator:
+        """Empresta uma conexão do pool, abrindo novas até o limite."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._created_lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._open_connection()
+                except Exception:
+                    with self._created_lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._pool.get(timeout=self._timeout)
+        try:
+            if self._simulated_rtt:
+                time.sleep(self._simulated_rtt)
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _escape(self, value: str) -> str:
+        return self._ldap3.utils.conv.escape_filter_chars(value)
+
+    def _search(self, search_filter: str, attributes: List[str]) -> List[Dict]:
+        """Executa uma busca e retorna as entradas como dicionários simples."""
+        with self._connection() as conn:
+            conn.search(self.base_dn, search_filter, attributes=attributes)
+            return [
+                {"dn": entry["dn"], **{k: (v[0] if isinstance(v, list) and v else v) for k, v in entry["attributes"].items()}}
+                for entry in conn.response or []
+                if entry.get("type") == "searchResEntry"
+            ]
+
+    def _dn_for(self, user_id: str) -> Optional[str]:
+        entries = self._search(f"(sAMAccountName={self._escape(user_id)})", ["sAMAccountName"])
+        return entries[0]["dn"] if entries else None
+
+    def fetch_users(self, usernames: List[str]) -> Dict[str, Dict]:
+        if not usernames:
+            return {}
+        # Um único filtro OR cobre o bloco inteiro de usernames
+        search_filter = "(|" + "".join(f"(mail={self._escape(u)})" for u in usernames) + ")"
+        entries = self._search(search_filter, ["sAMAccountName", "mail", "displayName", "userAccountControl"])
+        by_mail = {str(e.get("mail", "")).lower(): e for e in entries}
+
+        results: Dict[str, Dict] = {}
+        for username in usernames:
+            entry = by_mail.get(username.lower())
+            if entry is None:
+                results[username] = {"ok": False, "email": username, "error": f"Usuário '{username}' não encontrado"}
+                continue
+            # Bit 2 do userAccountControl indica conta desabilitada no AD
+            disabled = int(entry.get("userAccountControl") or 512) & 2
+            results[username] = {
+                "ok": True,
+                "user_id": entry.get("sAMAccountName"),
+                "email": entry.get("mail"),
+                "display_name": entry.get("displayName") or entry.get("sAMAccountName"),
+                "status": "disabled" if disabled else "active"
+            }
+        return results
+
+    def fetch_lock_status(self, user_ids: List[str]) -> Dict[str, Dict]:
+        if not user_ids:
+            return {}
+        search_filter = "(|" + "".join(f"(sAMAccountName={self._escape(u)})" for u in user_ids) + ")"
+        entries = self._search(search_filter, ["sAMAccountName", "lockoutTime"])
+        lockout = {e.get("sAMAccountName"): e.get("lockoutTime") for e in entries}
+        return {u: _lock_result(u, _is_locked_out(lockout.get(u))) for u in user_ids}
+
+    def _modify(self, user_id: str, changes: Dict) -> Dict:
+        dn = self._dn_for(user_id)
+        if dn is None:
+            return {"ok": False, "error": f"Usuário '{user_id}' não encontrado"}
+        with self._connection() as conn:
+            conn.modify(dn, changes)
+            if conn.result.get("result") != 0:
+                return {"ok": False, "error": conn.result.get("description", "erro LDAP")}
+        return {"ok": True}
+
+    def unlock(self, user_id: str, system: str) -> Dict:
+        return self._modify(user_id, {"lockoutTime": [(self._ldap3.MODIFY_REPLACE, ["0"])]})
+
+    def reset_password(self, user_id: str, system: str, temp_password: str) -> Dict:
+        if not self.active_directory:
+            return self._modify(user_id, {"userPassword": [(self._ldap3.MODIFY_REPLACE, [temp_password])]})
+
+        dn = self._dn_for(user_id)
+        if dn is None:
+            return {"ok": False, "error": f"Usuário '{user_id}' não encontrado"}
+        with self._connection() as conn:
+            # O AD só aceita senha via unicodePwd; a extensão cuida da codificação
+            if not conn.extend.microsoft.modify_password(dn, temp_password):
+                return {"ok": False, "error": conn.result.get("description", "erro LDAP")}
+            # pwdLastSet=0 força a troca da senha temporária no primeiro login
+            conn.modify(dn, {"pwdLastSet": [(self._ldap3.MODIFY_REPLACE, ["0"])]})
+            if conn.result.get("result") != 0:
+                return {"ok": False, "error": conn.result.get("description", "erro LDAP")}
+        return {"ok": True}
+
+    def grant_access(self, user_id: str, system: str) -> Dict:
+        dn = self._dn_for(user_id)
+        if dn is None:
+            return {"ok": False, "error": f"Usuário '{user_id}' não encontrado"}
+        group_dn = f"cn={self._ldap3.utils.dn.escape_rdn(system)},ou=groups,{self.base_dn}"
+        with self._connection() as conn:
+            conn.modify(group_dn, {"member": [(self._ldap3.MODIFY_ADD, [dn])]})
+            if conn.result.get("result") != 0:
+                return {"ok": False, "error": conn.result.get("description", "erro LDAP")}
+        return {"ok": True}
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().unbind()
+            except queue.Empty:
+                break
+
+def create_ldap_standin(
+    users: List[Dict],
+    pool_size: int = 8,
+    base_dn: str = "dc=empresa,dc=com",
+    round_trip_ms: float = 0.0,
+    ad_schema: bool = True,
+) -> LDAPBackend:
+    """Cria um LDAPBackend apontando para um diretório falso local (ldap3 MOCK_SYNC).
+
+    ``users`` aceita dicionários com ``email`` e, opcionalmente, ``user_id``,
+    ``display_name`` e ``locked``. Útil para testes e benchmarks sem AD real;
+    ``round_trip_ms`` simula a latência de rede de cada requisição. Com
+    ``ad_schema`` (padrão) o diretório usa o schema offline do AD, e os valores
+    chegam formatados como num AD real (``lockoutTime`` como ``datetime``);
+    ``ad_schema=False`` devolve tudo como texto.
+    """
+    try:
+        import ldap3
+    except ImportError as exc:
+        raise RuntimeError("O stand-in LDAP requer o pacote opcional 'ldap3' (pip install ldap3).") from exc
+
+    admin_dn = f"cn=admin,{base_dn}"
+    server = ldap3.Server("identity-standin", get_info=ldap3.OFFLINE_AD_2012_R2 if ad_schema else ldap3.NONE)
+    seed = ldap3.Connection(server, user=admin_dn, password="standin", client_strategy=ldap3.MOCK_SYNC)
+    seed.strategy.add_entry(admin_dn, {"userPassword": "standin", "sn": "admin"})
+    for user in users:
+        user_id = user.get("user_id") or user["email"].split("@")[0]
+        seed.strategy.add_entry(f"cn={user_id},ou=users,{base_dn}", {
+            "objectClass": ["top", "person", "user"],
+            "sAMAccountName": user_id,
+            "mail": user["email"],
+            "displayName": user.get("display_name") or user_id.replace(".", " ").title(),
+            "userAccountControl": "512",
+            "lockoutTime": "132000000000000000" if user.get("locked") else "0",
+            "pwdLastSet": "1",
+        })
+    for system in ("Email", "AD", "Windows"):
+        seed.strategy.add_entry(f"cn={system},ou=groups,{base_dn}", {"objectClass": "group", "member": admin_dn})
+
+    backend = LDAPBackend(server, admin_dn, "standin", base_dn, pool_size=pool_size, client_strategy=ldap3.MOCK_SYNC)
+    backend._simulated_rtt = round_trip_ms / 1000.0
+    return backend
+
+def backend_from_env() -> IdentityBackend:
+    """Instancia o backend indicado por IDENTITY_BACKEND (``memory``, ``simulated`` ou ``ldap``)."""
+    kind = os.getenv("IDENTITY_BACKEND", "memory").lower()
+    if kind == "simulated":
+        return SimulatedBackend(
+            seed=int(os.getenv("IDENTITY_SIM_SEED", "0")),
+            lock_probability=float(os.getenv("IDENTITY_SIM_LOCK_PROBABILITY", "0.5")),
+            latency=_parse_latency_env(os.getenv("IDENTITY_SIM_LATENCY", "")),
+        )
+    if kind == "ldap":
+        return LDAPBackend(
+            server=os.getenv("LDAP_URI", "ldap://localhost:389"),
+            bind_dn=os.getenv("LDAP_BIND_DN", ""),
+            password=os.getenv("LDAP_PASSWORD", ""),
+            base_dn=os.getenv("LDAP_BASE_DN", "dc=empresa,dc=com"),
+            pool_size=int(os.getenv("LDAP_POOL_SIZE", "8")),
+            active_directory=os.getenv("LDAP_ACTIVE_DIRECTORY", "true").lower() == "true",
+        )
+    return InMemoryBackend()
@@ -1,85 +1,370 @@
-"""Utilitários de gerenciamento de identidade em memória usados no fluxo de tickets."""
+"""Utilitários de gerenciamento de identidade usados no fluxo de tickets.
+
+As funções deste módulo registram logs, aplicam lote/cache e delegam o acesso
+ao diretório ao backend configurado (ver ``tools.identity_backends``).
+"""
 
 # Imports de bibliotecas padrão para simulação e registro de eventos
+import os
 import random
 import string
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from tools.cache import TTLCache
+from tools.identity_backends import IdentityBackend, backend_from_env
+
+# Quantidade máxima de usuários consultados por ida ao diretório nas chamadas em lote
+BATCH_CHUNK_SIZE = int(os.getenv("IDENTITY_BATCH_SIZE", "100"))
+
+# Consultas especulativas (perfil e bloqueio) disparadas na entrada do ticket no fluxo
+PREFETCH_ENABLED = os.getenv("IDENTITY_PREFETCH", "true").lower() in ("1", "true", "yes")
+PREFETCH_WORKERS = int(os.getenv("IDENTITY_PREFETCH_WORKERS", "4"))
+
+# Cache de perfis: dados como nome e status mudam raramente; usuários
+# inexistentes ficam em cache negativo por um período menor
+_profile_cache = TTLCache(
+    maxsize=int(os.getenv("IDENTITY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("IDENTITY_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "30")),
+    is_negative=lambda profile: not profile.get("ok"),
+)
+
+# Backend de diretório em uso; criado sob demanda a partir das variáveis de ambiente
+_backend: Optional[IdentityBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> IdentityBackend:
+    """Retorna o backend de diretório ativo, criando-o na primeira chamada."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_env()
+        return _backend
+
+def set_backend(backend: IdentityBackend) -> None:
+    """Troca o backend de diretório e descarta os perfis em cache."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    _profile_cache.clear()
+    if previous is not None and previous is not backend:
+        previous.close()
 
-def generate_temp_password(length: int = 12) -> str:
+def generate_temp_password(length: int = 12, rng: Optional[random.Random] = None) -> str:
     """Cria uma senha pseudoaleatória que simula a saída de um serviço."""
     # Constrói o conjunto de caracteres permitido para a senha temporária
     chars = string.ascii_letters + string.digits + "!@#$%"
-    # Gera uma sequência pseudoaleatória do tamanho solicitado
-    return ''.join(random.choice(chars) for _ in range(length))
+    # Gera uma sequência pseudoaleatória do tamanho solicitado (semeada na simulação)
+    chooser = rng or random
+    return ''.join(chooser.choice(chars) for _ in range(length))
+
+def _chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    """Divide a lista em blocos de no máximo ``size`` itens."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _unique(items: Iterable[str]) -> List[str]:
+    """Remove duplicados preservando a ordem de chegada."""
+    return list(dict.fromkeys(item for item in items if item))
+
+def _lookup_user(username: str) -> Dict:
+    """Consulta um único perfil no backend, sem registrar logs."""
+    return get_backend().fetch_users([username])[username]
+
+def _lookup_lock_status(user_id: str) -> Dict:
+    """Consulta o estado de bloqueio no backend, sem registrar logs."""
+    return get_backend().fetch_lock_status([user_id])[user_id]
+
+def _cache_profile(username: str, profile: Dict) -> None:
+    """Guarda o perfil no cache."""
+    _profile_cache.set(username, profile)
+
+def invalidate_user(user_id: str) -> None:
+    """Descarta o perfil em cache de um usuário após uma ação que o altera.
+
+    Procura nas entradas vivas do cache (limitado por ``IDENTITY_CACHE_SIZE``)
+    em vez de manter um índice à parte, que não acompanharia as remoções por
+    LRU e TTL.
+    """
+    _profile_cache.invalidate_where(lambda username, profile: profile.get("user_id") == user_id)
+
+def cache_stats() -> Dict[str, Any]:
+    """Expõe os contadores do cache de perfis para métricas."""
+    return _profile_cache.stats()
 
 def get_user(username: str) -> Dict:
     """Retorna informações básicas de perfil para o usuário solicitado."""
+    # Reaproveita o resultado do lote em andamento, quando houver
+    batch = _active_batch
+    if batch is not None:
+        cached = batch.user(username)
+        if cached is not None:
+            return cached
+
+    # Evita a ida ao diretório para solicitantes recorrentes
+    cached = _profile_cache.get(username)
+    if cached is not None:
+        return cached
+
     # Gera timestamp e registra a busca por um usuário específico
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Buscando usuário '{username}'...")
 
     # Monta um dicionário com dados sintéticos do usuário
-    user_data = {
-        "ok": True,
-        "user_id": username.split("@")[0],
-        "email": username,
-        "display_name": username.split("@")[0].replace(".", " ").title(),
-        "status": "active"
-    }
+    user_data = _lookup_user(username)
+    _cache_profile(username, user_data)
 
     # Exibe um resumo do resultado da busca e retorna os dados
-    print(f"[{timestamp}] [IDENTITY SERVICE] Usuário encontrado: {user_data['display_name']}")
+    if user_data["ok"]:
+        print(f"[{timestamp}] [IDENTITY SERVICE] Usuário encontrado: {user_data['display_name']}")
+    else:
+        print(f"[{timestamp}] [IDENTITY SERVICE] {user_data['error']}")
     return user_data
 
+def get_users(usernames: List[str], chunk_size: Optional[int] = None) -> Dict[str, Dict]:
+    """Busca vários perfis de uma vez, com uma ida ao diretório por bloco."""
+    size = chunk_size or BATCH_CHUNK_SIZE
+    unique = _unique(usernames)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Perfis em cache não entram na consulta ao diretório
+    results: Dict[str, Dict] = {}
+    missing: List[str] = []
+    for username in unique:
+        cached = _profile_cache.get(username)
+        if cached is not None:
+            results[username] = cached
+        else:
+            missing.append(username)
+
+    # Cada bloco corresponde a uma única consulta ao diretório
+    for chunk in _chunks(missing, size):
+        print(f"[{timestamp}] [IDENTITY SERVICE] Buscando {len(chunk)} usuários em lote...")
+        for username, profile in get_backend().fetch_users(chunk).items():
+            results[username] = profile
+            _cache_profile(username, profile)
+
+    print(f"[{timestamp}] [IDENTITY SERVICE] {len(results)} usuários carregados ({len(usernames)} solicitados)")
+    return results
+
 def check_user_locked(user_id: str) -> Dict:
-    """Decide estocasticamente se o usuário está bloqueado no momento."""
+    """Consulta no diretório se o usuário está bloqueado no momento."""
+    # Reaproveita o status obtido em lote, quando houver
+    batch = _active_batch
+    if batch is not None:
+        cached = batch.lock_status(user_id)
+        if cached is not None:
+            return cached
+
     # Loga a verificação de bloqueio do usuário
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Verificando status de bloqueio de '{user_id}'...")
 
-    # Simula aleatoriamente um estado de bloqueio
-    is_locked = random.choice([True, False])
-
     # Compõe o resultado com possível motivo quando bloqueado
-    result = {
-        "ok": True,
-        "user_id": user_id,
-        "is_locked": is_locked,
-        "lock_reason": "Múltiplas tentativas de login incorretas" if is_locked else None
-    }
+    result = _lookup_lock_status(user_id)
 
     # Mostra o status final e retorna
-    print(f"[{timestamp}] [IDENTITY SERVICE] Status: {'BLOQUEADO' if is_locked else 'DESBLOQUEADO'}")
+    print(f"[{timestamp}] [IDENTITY SERVICE] Status: {'BLOQUEADO' if result['is_locked'] else 'DESBLOQUEADO'}")
     return result
 
+def check_users_locked(user_ids: List[str], chunk_size: Optional[int] = None) -> Dict[str, Dict]:
+    """Verifica o bloqueio de vários usuários, com uma ida ao diretório por bloco."""
+    size = chunk_size or BATCH_CHUNK_SIZE
+    unique = _unique(user_ids)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    results: Dict[str, Dict] = {}
+    for chunk in _chunks(unique, size):
+        print(f"[{timestamp}] [IDENTITY SERVICE] Verificando bloqueio de {len(chunk)} usuários em lote...")
+        results.update(get_backend().fetch_lock_status(chunk))
+
+    locked = sum(1 for r in results.values() if r["is_locked"])
+    print(f"[{timestamp}] [IDENTITY SERVICE] {locked}/{len(results)} usuários bloqueados")
+    return results
+
+class BatchCoalescer:
+    """Agrupa as consultas de identidade de um lote de tickets.
+
+    Os perfis são carregados de uma vez via ``get_users`` ao abrir o lote e o
+    status de bloqueio é buscado via ``check_users_locked`` na primeira
+    verificação, cobrindo todos os usuários conhecidos do lote.
+    """
+
+    def __init__(self, usernames: List[str], chunk_size: Optional[int] = None):
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._users = get_users(usernames, chunk_size)
+        self._lock_status: Optional[Dict[str, Dict]] = None
+
+    def user(self, username: str) -> Optional[Dict]:
+        """Retorna o perfil carregado no lote ou None quando ausente."""
+        return self._users.get(username)
+
+    def lock_status(self, user_id: str) -> Optional[Dict]:
+        """Retorna o status de bloqueio do lote, carregando-o na primeira chamada."""
+        with self._lock:
+            if self._lock_status is None:
+                user_ids = [u["user_id"] for u in self._users.values() if u.get("ok")]
+                self._lock_status = check_users_locked(user_ids, self._chunk_size)
+            return self._lock_status.get(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """Descarta perfil e status de bloqueio após uma ação que os altera."""
+        with self._lock:
+            if self._lock_status is not None:
+                self._lock_status.pop(user_id, None)
+            self._users = {k: v for k, v in self._users.items() if v.get("user_id") != user_id}
+
+# Lote ativo consultado por get_user/check_user_locked antes de ir ao diretório
+_active_batch: Optional[BatchCoalescer] = None
+
+@contextmanager
+def batch_lookup(usernames: List[str], chunk_size: Optional[int] = None) -> Iterator[BatchCoalescer]:
+    """Ativa um BatchCoalescer enquanto o lote de tickets é processado."""
+    global _active_batch
+    previous = _active_batch
+    _active_batch = BatchCoalescer(usernames, chunk_size)
+    try:
+        yield _active_batch
+    finally:
+        _active_batch = previous
+
+def _invalidate_batch(user_id: str) -> None:
+    """Remove os dados do usuário guardados no lote ativo."""
+    batch = _active_batch
+    if batch is not None:
+        batch.invalidate(user_id)
+
+def lookup_requester(username: str) -> Dict[str, Dict]:
+    """Perfil e status de bloqueio do solicitante; apenas leituras no diretório."""
+    profile = get_user(username)
+    # Mesmo identificador que o playbook usa quando o perfil não traz user_id
+    user_id = profile.get("user_id", username.split("@")[0])
+    return {"user": profile, "lock_status": check_user_locked(user_id)}
+
+# Consultas especulativas por execução de ticket: (início, username, future)
+_prefetch_pool: Optional[ThreadPoolExecutor] = None
+_prefetches: Dict[Any, tuple] = {}
+_prefetch_lock = threading.Lock()
+_prefetch_stats = {"started": 0, "used": 0, "discarded": 0, "failed": 0}
+
+# Prefetches não consumidos (ticket que falhou no meio) expiram após este tempo
+_PREFETCH_MAX_AGE = 600.0
+
+def prefetch_requester(key: Any, username: str) -> None:
+    """Dispara ``lookup_requester`` em segundo plano para a execução ``key``.
+
+    Só leituras rodam especulativamente: desbloqueio e reset continuam no
+    playbook. O resultado é consumido por ``take_prefetch`` ou descartado por
+    ``discard_prefetch`` quando o ticket é escalado.
+    """
+    global _prefetch_pool
+    if not PREFETCH_ENABLED:
+        return
+    now = time.monotonic()
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="identity-prefetch")
+        for stale in [k for k, (started, _, _) in _prefetches.items() if now - started > _PREFETCH_MAX_AGE]:
+            _prefetches.pop(stale)[2].cancel()
+        if key in _prefetches:
+            return
+        _prefetches[key] = (now, username, _prefetch_pool.submit(lookup_requester, username))
+        _prefetch_stats["started"] += 1
+
+def take_prefetch(key: Any, username: str, timeout: Optional[float] = None) -> Optional[Dict[str, Dict]]:
+    """Resultado do prefetch de ``username`` (espera até ``timeout``); None se ausente, de outro solicitante ou falhou."""
+    with _prefetch_lock:
+        entry = _prefetches.pop(key, None)
+        if entry is not None and entry[1] != username:
+            # Consulta feita para outro solicitante: descarta em vez de usar o perfil errado
+            entry[2].cancel()
+            _prefetch_stats["discarded"] += 1
+            entry = None
+    if entry is None:
+        return None
+    future: Future = entry[2]
+    try:
+        result = future.result(timeout=timeout)
+    except Exception as e:
+        future.cancel()
+        print(f"AVISO: Consulta antecipada de identidade indisponível ({e}); consultando novamente")
+        with _prefetch_lock:
+            _prefetch_stats["failed"] += 1
+        return None
+    with _prefetch_lock:
+        _prefetch_stats["used"] += 1
+    return result
+
+def discard_prefetch(key: Any) -> None:
+    """Descarta o prefetch de um ticket que não vai usar o resultado."""
+    with _prefetch_lock:
+        entry = _prefetches.pop(key, None)
+        if entry is not None:
+            entry[2].cancel()
+            _prefetch_stats["discarded"] += 1
+
+def prefetch_stats() -> Dict[str, int]:
+    """Contadores das consultas especulativas."""
+    with _prefetch_lock:
+        return {**_prefetch_stats, "pending": len(_prefetches)}
+
 def unlock_user(user_id: str, system: str = "AD") -> Dict:
-    """Simula o desbloqueio do usuário no sistema informado."""
+    """Desbloqueia o usuário no sistema informado."""
     # Registra a intenção de desbloquear o usuário no sistema indicado
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Desbloqueando usuário '{user_id}' no sistema {system}...")
 
-    # Resultado simulado da operação de desbloqueio
+    # Executa a operação no backend de diretório
+    outcome = get_backend().unlock(user_id, system)
     result = {
-        "ok": True,
+        "ok": outcome["ok"],
         "user_id": user_id,
         "system": system,
         "action": "unlock",
-        "message": f"Usuário {user_id} desbloqueado com sucesso no {system}"
+        "message": f"Usuário {user_id} desbloqueado com sucesso no {system}" if outcome["ok"] else outcome.get("error")
     }
 
-    # Confirma o sucesso e retorna o payload
-    print(f"[{timestamp}] [IDENTITY SERVICE] ✓ Usuário desbloqueado com sucesso")
+    # O perfil mudou no diretório: descarta a cópia em cache
+    _invalidate_batch(user_id)
+    invalidate_user(user_id)
+
+    # Confirma o resultado e retorna o payload
+    if result["ok"]:
+        print(f"[{timestamp}] [IDENTITY SERVICE] ✓ Usuário desbloqueado com sucesso")
+    else:
+        print(f"[{timestamp}] [IDENTITY SERVICE] ✗ Falha ao desbloquear: {result['message']}")
     return result
 
 def reset_password(user_id: str, system: str = "AD") -> Dict:
-    """Simula um reset de senha e retorna a credencial temporária."""
+    """Reseta a senha no diretório e retorna a credencial temporária."""
     # Loga a solicitação de reset de senha
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Resetando senha de '{user_id}' no sistema {system}...")
 
-    # Gera uma credencial temporária para o usuário
-    temp_password = generate_temp_password()
+    # Gera uma credencial temporária e a aplica no backend
+    backend = get_backend()
+    temp_password = generate_temp_password(rng=backend.password_rng(user_id))
+    outcome = backend.reset_password(user_id, system, temp_password)
+
+    # O perfil mudou no diretório: descarta a cópia em cache
+    _invalidate_batch(user_id)
+    invalidate_user(user_id)
+
+    if not outcome["ok"]:
+        print(f"[{timestamp}] [IDENTITY SERVICE] ✗ Falha ao resetar senha: {outcome.get('error')}")
+        return {
+            "ok": False,
+            "user_id": user_id,
+            "system": system,
+            "action": "password_reset",
+            "message": outcome.get("error")
+        }
 
     # Monta o resultado incluindo a nova senha gerada
     result = {
@@ -101,34 +386,40 @@ def verify_user_unlocked(user_id: str, system: str = "AD") -> Dict:
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Verificando desbloqueio de '{user_id}' no {system}...")
 
-    # Resultado simulado afirmando que o usuário está desbloqueado
+    # Consulta o estado atual diretamente no diretório (sem lote nem cache)
+    is_unlocked = not _lookup_lock_status(user_id)["is_locked"]
     result = {
         "ok": True,
         "user_id": user_id,
         "system": system,
-        "is_unlocked": True,
-        "message": f"Usuário {user_id} está desbloqueado no {system}"
+        "is_unlocked": is_unlocked,
+        "message": f"Usuário {user_id} está {'desbloqueado' if is_unlocked else 'bloqueado'} no {system}"
     }
 
     # Exibe confirmação e retorna o resultado
-    print(f"[{timestamp}] [IDENTITY SERVICE] ✓ Verificação concluída: usuário está desbloqueado")
+    status = "desbloqueado" if is_unlocked else "AINDA BLOQUEADO"
+    print(f"[{timestamp}] [IDENTITY SERVICE] {'✓' if is_unlocked else '✗'} Verificação concluída: usuário está {status}")
     return result
 
 def grant_system_access(user_id: str, system: str) -> Dict:
-    """Simula a concessão de acesso a um sistema secundário para o usuário."""
+    """Concede acesso a um sistema secundário para o usuário."""
     # Registra a concessão de acesso a um sistema secundário
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] [IDENTITY SERVICE] Concedendo acesso ao sistema '{system}' para '{user_id}'...")
 
-    # Resultado simulado da operação de concessão
+    # Executa a concessão no backend de diretório
+    outcome = get_backend().grant_access(user_id, system)
     result = {
-        "ok": True,
+        "ok": outcome["ok"],
         "user_id": user_id,
         "system": system,
         "action": "grant_access",
-        "message": f"Acesso ao {system} concedido para {user_id}"
+        "message": f"Acesso ao {system} concedido para {user_id}" if outcome["ok"] else outcome.get("error")
     }
 
-    # Confirma o sucesso e retorna o payload
-    print(f"[{timestamp}] [IDENTITY SERVICE] ✓ Acesso concedido com sucesso")
+    # Confirma o resultado e retorna o payload
+    if result["ok"]:
+        print(f"[{timestamp}] [IDENTITY SERVICE] ✓ Acesso concedido com sucesso")
+    else:
+        print(f"[{timestamp}] [IDENTITY SERVICE] ✗ Falha ao conceder acesso: {result['message']}")
     return result
@@ -0,0 +1,102 @@
+"""Atributos de texto calculados uma vez por ticket, na entrada.
+
+``compute_features`` normaliza título e descrição (sem acentos, minúsculas,
+sem pontuação) e guarda em ``ticket["features"]``:
+
+    text      texto normalizado
+    language  idioma provável (``pt``, ``en``, ``es`` ou ``und``)
+    tokens    quantidade de palavras do texto normalizado
+    keywords  grupos de ``KEYWORDS`` presentes (ex.: ``priority:high``, ``system:Email``)
+    hash      hash do texto normalizado; tickets com o mesmo conteúdo têm o mesmo hash
+    source    hash do título e da descrição originais; se o ticket for editado,
+              deixa de bater e os atributos são recalculados
+
+O armazenamento (``ticket_manager``) e a API anexam os atributos ao receber
+o ticket; escalonador, heurísticas do classificador, agrupamento e cache de
+triagem leem daqui em vez de refazer a normalização a cada etapa.
+"""
+
+# Imports de bibliotecas padrão para normalização e hashing
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List
+
+# Muda quando o cálculo muda: atributos de outra versão são recalculados
+FEATURES_VERSION = 2
+
+# Grupos de palavras-chave sobre o texto normalizado, na ordem de prioridade de cada prefixo
+KEYWORDS: Dict[str, List[str]] = {
+    "priority:critical": ["fora do ar", "todos os usuarios", "toda a equipe", "producao parada", "incidente", "ninguem consegue"],
+    "priority:high": ["urgente", "urgentemente", "bloquead", "reuniao importante", "impactando"],
+    "priority:low": ["cadeira", "duvida", "quando puder", "sem pressa", "sugestao"],
+    "system:Email": ["email", "outlook"],
+    "system:AD": ["azure", "active directory", " ad "],
+    "system:Windows": ["windows", "pc", "notebook"],
+}
+
+# Palavras frequentes que distinguem os idiomas atendidos
+_STOPWORDS = {
+    "pt": {"nao", "meu", "minha", "consigo", "estou", "voce", "com", "uma", "do", "da", "esta", "preciso", "ao", "pela"},
+    "en": {"the", "my", "i", "is", "to", "and", "can", "cannot", "with", "for", "of", "it", "please", "not"},
+    "es": {"el", "la", "los", "las", "mi", "puedo", "estoy", "y", "del", "una", "por", "favor", "necesito", "contrasena"},
+}
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos, pontuação ou espaços repetidos."""
+    folded = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(c for c in folded if not unicodedata.combining(c)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", folded)).strip()
+
+def detect_language(words: List[str]) -> str:
+    """Idioma com mais palavras frequentes no texto; ``und`` sem nenhuma."""
+    scores = {language: sum(1 for word in words if word in stopwords) for language, stopwords in _STOPWORDS.items()}
+    language = max(scores, key=scores.get)
+    return language if scores[language] else "und"
+
+def source_hash(title: str, description: str) -> str:
+    """Hash do título e da descrição como vieram, sem normalizar (barato de conferir)."""
+    return hashlib.sha1(f"{title or ''}\x00{description or ''}".encode("utf-8")).hexdigest()[:16]
+
+def text_features(title: str, description: str) -> Dict[str, Any]:
+    """Atributos de um par título/descrição."""
+    text = normalize_text(f"{title or ''} {description or ''}")
+    words = text.split()
+    # Espaços nas bordas deixam casar palavras inteiras (" ad ") no início e no fim
+    padded = f" {text} "
+    return {
+        "version": FEATURES_VERSION,
+        "text": text,
+        "language": detect_language(words),
+        "tokens": len(words),
+        "keywords": [name for name, terms in KEYWORDS.items() if any(term in padded for term in terms)],
+        "hash": hashlib.sha1(text.encode("utf-8")).hexdigest()[:16],
+        "source": source_hash(title, description),
+    }
+
+def compute_features(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Atributos do título e da descrição do ticket."""
+    return text_features(ticket.get("title", ""), ticket.get("description", ""))
+
+def ticket_features(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Atributos guardados no ticket; calcula e anexa quando faltam, são de outra versão
+    ou o título/descrição mudaram desde o cálculo."""
+    features = ticket.get("features")
+    if (not isinstance(features, dict) or features.get("version") != FEATURES_VERSION
+            or features.get("source") != source_hash(ticket.get("title", ""), ticket.get("description", ""))):
+        features = ticket["features"] = compute_features(ticket)
+    return features
+
+def attach_features(tickets: Iterable[Dict[str, Any]], refresh: bool = False) -> List[Dict[str, Any]]:
+    """Anexa os atributos a cada ticket (``refresh`` recalcula mesmo os já presentes)."""
+    tickets = list(tickets)
+    for ticket in tickets:
+        if refresh:
+            ticket["features"] = compute_features(ticket)
+        else:
+            ticket_features(ticket)
+    return tickets
+
+def keyword_match(features: Dict[str, Any], prefix: str) -> List[str]:
+    """Nomes dos grupos de ``prefix`` presentes, sem o prefixo, na ordem de ``KEYWORDS``."""
+    return [name.split(":", 1)[1] for name in features["keywords"] if name.startswith(prefix + ":")]
@@ -2,20 +2,28 @@
 
 # Imports de bibliotecas padrão para I/O, caminhos, datas e tipagem
 import json
+import os
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
+
+from tools.ticket_features import attach_features
 
 # Caminho para o arquivo de dados de tickets utilizado como "banco" local
 DATA_PATH = Path(__file__).parent.parent / "data" / "tickets.json"
 
+# Serializa as gravações do arquivo feitas por este processo
+_WRITE_LOCK = threading.Lock()
+
 def get_open_tickets() -> List[Dict]:
     """Return every ticket marked as open inside the local data store."""
     # Lê todos os tickets do arquivo JSON
     with open(DATA_PATH, "r", encoding="utf-8") as f:
         tickets = json.load(f)
     # Filtra apenas aqueles cujo status está marcado como "open"
-    return [t for t in tickets if t.get("status") == "open"]
+    # Tickets gravados sem atributos (ex.: editados à mão) recebem os atributos aqui
+    return attach_features(t for t in tickets if t.get("status") == "open")
 
 def get_ticket_by_id(ticket_id: int) -> Optional[Dict]:
     """Load a single ticket by id, returning None when it is absent."""
@@ -29,6 +37,40 @@ def get_ticket_by_id(ticket_id: int) -> Optional[Dict]:
     # Retorna None quando nenhum ticket corresponde ao ID
     return None
 
+def upsert_tickets(tickets: Iterable[Dict]) -> int:
+    """Insert new tickets and replace changed ones by id; returns how many were written.
+
+    The file is rewritten once per call (temporary file + rename), so readers
+    such as the daemon never see a half-written store. Text features are
+    computed here, once, and stored with each ticket.
+    """
+    incoming = {ticket["id"]: ticket for ticket in attach_features(tickets, refresh=True)}
+    if not incoming:
+        return 0
+    with _WRITE_LOCK:
+        try:
+            with open(DATA_PATH, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = []
+        # Atualiza no lugar para manter a ordem dos tickets já conhecidos
+        changed = 0
+        for index, ticket in enumerate(stored):
+            update = incoming.pop(ticket["id"], None)
+            if update is not None and update != ticket:
+                stored[index] = update
+                changed += 1
+        stored.extend(incoming.values())
+        changed += len(incoming)
+        if changed:
+            Path(DATA_PATH).parent.mkdir(parents=True, exist_ok=True)
+            tmp = Path(DATA_PATH).with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stored, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            os.replace(tmp, DATA_PATH)
+        return changed
+
 def add_comment(ticket_id: int, comment: str) -> Dict:
     """Log that a comment was attached to a ticket and echo the action."""
     # Gera um timestamp e formata uma entrada de log com o comentário
@@ -0,0 +1,509 @@
+"""Fontes externas de tickets e sincronização incremental com o armazenamento local.
+
+Cada ``TicketSource`` busca em lote apenas o que mudou desde o último cursor
+salvo e devolve os tickets no formato de ``data/tickets.json``:
+
+    HelpdeskRESTSource  API REST de helpdesk, paginação por (updated_at, id) e
+                        conexões keep-alive compartilhadas por host
+    IMAPSource          caixa de e-mail; cada mensagem nova vira um ticket
+
+``sync_sources`` consulta as fontes em paralelo, grava tudo no
+``ticket_manager`` em uma única escrita e só então avança os cursores em
+``CONNECTOR_STATE_PATH``: uma falha no meio repete o lote, sem perder tickets.
+Os ids ficam no formato ``<fonte>:<id remoto>`` para não colidir entre filas
+e clientes.
+
+Exemplo de ``data/sources.json``:
+    {"sources": [
+      {"name": "ti", "type": "helpdesk", "tenant": "matriz", "base_url": "https://helpdesk.empresa.com",
+       "queue": "ti", "token_env": "HELPDESK_TOKEN"},
+      {"name": "suporte", "type": "imap", "tenant": "matriz", "host": "imap.empresa.com",
+       "user": "suporte@empresa.com", "password_env": "IMAP_PASSWORD"}
+    ]}
+"""
+
+# Imports de bibliotecas padrão para HTTP, IMAP, e-mail, concorrência e estado em disco
+import gzip
+import hashlib
+import http.client
+import imaplib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from email.message import Message
+from email.utils import parseaddr, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from tools import ticket_manager
+
+# Arquivo com as fontes configuradas
+SOURCES_PATH = Path(os.getenv("TICKET_SOURCES_PATH", str(Path(__file__).parent.parent / "data" / "sources.json")))
+
+# Cursores de sincronização de cada fonte
+CONNECTOR_STATE_PATH = Path(os.getenv("CONNECTOR_STATE_PATH", str(Path(__file__).parent.parent / "data" / "connector_state.json")))
+
+# Fontes consultadas ao mesmo tempo
+CONNECTOR_WORKERS = int(os.getenv("CONNECTOR_WORKERS", "4"))
+
+# Tickets por página (REST) ou mensagens por FETCH (IMAP)
+CONNECTOR_PAGE_SIZE = int(os.getenv("CONNECTOR_PAGE_SIZE", "500"))
+
+# Conexões keep-alive mantidas por host de helpdesk
+CONNECTOR_POOL_SIZE = int(os.getenv("CONNECTOR_POOL_SIZE", "4"))
+
+# Timeout (s) de conexão e leitura das fontes
+CONNECTOR_TIMEOUT = float(os.getenv("CONNECTOR_TIMEOUT", "30"))
+
+# Tentativas de uma página antes de desistir da fonte nesta rodada
+CONNECTOR_RETRIES = int(os.getenv("CONNECTOR_RETRIES", "3"))
+
+# Intervalo (s) entre sincronizações no modo daemon
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", "60"))
+
+class SourceError(RuntimeError):
+    """Falha ao buscar tickets de uma fonte (o cursor dela não avança)."""
+
+class TicketSource:
+    """Interface de uma fonte externa de tickets."""
+
+    type = "base"
+
+    def __init__(self, name: str, tenant: Optional[str] = None, page_size: int = CONNECTOR_PAGE_SIZE):
+        self.name = name
+        self.tenant = tenant
+        self.page_size = page_size
+
+    def fetch(self, cursor: Optional[Dict[str, Any]]) -> Tuple[List[Dict], Dict[str, Any]]:
+        """Busca o que mudou desde ``cursor`` (None = tudo); devolve (tickets, novo cursor)."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Libera conexões mantidas pela fonte."""
+
+    def _ticket(self, remote_id: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Ticket no formato local, com id prefixado pela fonte."""
+        ticket = {
+            "id": f"{self.name}:{remote_id}",
+            "requester": fields.get("requester", ""),
+            "requester_name": fields.get("requester_name") or fields.get("requester", ""),
+            "manager": fields.get("manager"),
+            "title": fields.get("title", ""),
+            "description": fields.get("description", ""),
+            "status": fields.get("status", "open"),
+            "created_at": fields.get("created_at"),
+            "source": self.name,
+            "external_id": str(remote_id),
+        }
+        if self.tenant:
+            ticket["tenant"] = self.tenant
+        return ticket
+
+class HTTPConnectionPool:
+    """Conexões HTTP/1.1 keep-alive reaproveitadas entre páginas, filas e rodadas."""
+
+    def __init__(self, base_url: str, size: int = CONNECTOR_POOL_SIZE, timeout: float = CONNECTOR_TIMEOUT):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme or "http"
+        self.host = url.hostname or "localhost"
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.Queue" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "bytes": 0}
+
+    def _open(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    @contextmanager
+    def _connection(self) -> Iterator[http.client.HTTPConnection]:
+        """Empresta uma conexão ociosa, abrindo novas até ``size``."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            conn = self._open() if create else self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        except BaseException:
+            # Conexão em estado desconhecido: fecha e deixa outra ser aberta no lugar
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            raise
+        else:
+            self._idle.put(conn)
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """GET em ``path``; devolve (status, cabeçalhos em minúsculas, corpo já descompactado)."""
+        target = self.prefix + path + ("?" + urlencode(params) if params else "")
+        headers = {"Accept": "application/json", "Accept-Encoding": "gzip", **(headers or {})}
+        for attempt in range(2):
+            with self._connection() as conn:
+                if conn.sock is None:
+                    # http.client (re)abre o socket no próximo request
+                    with self._lock:
+                        self.stats["connections"] += 1
+                try:
+                    conn.request("GET", target, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # O servidor fechou a conexão ociosa; a segunda tentativa usa uma nova
+                    conn.close()
+                    if attempt:
+                        raise
+                    continue
+                if response.will_close:
+                    conn.close()
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["bytes"] += len(body)
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if response_headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+            return response.status, response_headers, body
+        raise SourceError("conexão encerrada pelo servidor")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools: Dict[Tuple[str, str, Optional[int]], HTTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def http_pool(base_url: str) -> HTTPConnectionPool:
+    """Pool do host de ``base_url``, compartilhado por todas as fontes daquele host."""
+    url = urlsplit(base_url)
+    key = (url.scheme, url.hostname or "", url.port)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = HTTPConnectionPool(f"{url.scheme}://{url.netloc}")
+        return _pools[key]
+
+class HelpdeskRESTSource(TicketSource):
+    """Fila de um helpdesk REST (``GET /api/v1/tickets``).
+
+    A API devolve ``{"tickets": [...], "has_more": bool}`` ordenado por
+    ``(updated_at, id)``; cada página pede apenas o que vem depois do último
+    par visto (``updated_since`` + ``after_id``), então nenhuma página é
+    refeita e a rodada seguinte só traz tickets criados ou alterados.
+    """
+
+    type = "helpdesk"
+
+    def __init__(self, name: str, base_url: str, queue: Optional[str] = None, token: Optional[str] = None,
+                 tenant: Optional[str] = None, page_size: int = CONNECTOR_PAGE_SIZE):
+        super().__init__(name, tenant, page_size)
+        self.queue = queue
+        self.token = token
+        self.prefix = urlsplit(base_url).path.rstrip("/")
+        self.pool = http_pool(base_url)
+
+    def _page(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        for attempt in range(CONNECTOR_RETRIES):
+            try:
+                status, response_headers, body = self.pool.get(f"{self.prefix}/api/v1/tickets", params, headers)
+            except (OSError, http.client.HTTPException) as e:
+                error = f"falha de conexão: {e}"
+            else:
+                if status == 200:
+                    return json.loads(body)
+                error = f"HTTP {status}"
+                if status not in (429, 500, 502, 503, 504):
+                    break
+                if status == 429:
+                    time.sleep(float(response_headers.get("retry-after", "1")))
+                    continue
+            time.sleep(0.5 * 2 ** attempt)
+        raise SourceError(f"Fonte '{self.name}': {error}")
+
+    def fetch(self, cursor: Optional[Dict[str, Any]]) -> Tuple[List[Dict], Dict[str, Any]]:
+        cursor = dict(cursor or {})
+        tickets: List[Dict] = []
+        while True:
+            params = {"limit": self.page_size}
+            if self.queue:
+                params["queue"] = self.queue
+            if cursor.get("updated_at"):
+                params["updated_since"] = cursor["updated_at"]
+                params["after_id"] = cursor["id"]
+            page = self._page(params)
+            items = page.get("tickets", [])
+            for item in items:
+                tickets.append(self._ticket(item["id"], item))
+            if items:
+                cursor = {"updated_at": items[-1]["updated_at"], "id": items[-1]["id"]}
+            if not items or not page.get("has_more"):
+                return tickets, cursor
+
+_UID_PATTERN = re.compile(rb"UID (\d+)")
+
+def _header(message: Message, name: str) -> str:
+    """Cabeçalho decodificado (RFC 2047), vazio quando ausente."""
+    value = message.get(name)
+    return str(make_header(decode_header(value))) if value else ""
+
+def _body_text(message: Message) -> str:
+    """Primeira parte text/plain; sem ela, a primeira text/html sem as tags."""
+    parts = {}
+    for part in message.walk():
+        kind = part.get_content_type()
+        if kind in ("text/plain", "text/html") and kind not in parts and not part.get_filename():
+            payload = part.get_payload(decode=True) or b""
+            parts[kind] = payload.decode(part.get_content_charset() or "utf-8", "replace")
+    if "text/plain" in parts:
+        return parts["text/plain"]
+    return re.sub(r"<[^>]+>", " ", parts.get("text/html", ""))
+
+class IMAPSource(TicketSource):
+    """Caixa IMAP: cada mensagem nova vira um ticket aberto.
+
+    O cursor guarda ``UIDVALIDITY`` e o maior UID já importado; a rodada
+    seguinte pede só ``UID > último`` e baixa as mensagens em lotes de
+    ``page_size`` por FETCH, sem marcá-las como lidas. Se o servidor trocar o
+    ``UIDVALIDITY``, a caixa é relida inteira (os ids derivam do
+    ``Message-ID``, então não há duplicatas). A conexão fica aberta entre
+    rodadas.
+    """
+
+    type = "imap"
+
+    def __init__(self, name: str, host: str, user: str, password: str, port: Optional[int] = None,
+                 ssl: bool = True, mailbox: str = "INBOX", tenant: Optional[str] = None,
+                 page_size: int = CONNECTOR_PAGE_SIZE):
+        super().__init__(name, tenant, page_size)
+        self.host = host
+        self.port = port or (993 if ssl else 143)
+        self.ssl = ssl
+        self.user = user
+        self.password = password
+        self.mailbox = mailbox
+        self._conn: Optional[imaplib.IMAP4] = None
+
+    def _connect(self) -> imaplib.IMAP4:
+        """Conexão autenticada, reaproveitada enquanto responder ao NOOP."""
+        if self._conn is not None:
+            try:
+                self._conn.noop()
+                return self._conn
+            except (imaplib.IMAP4.error, OSError):
+                self._conn = None
+        cls = imaplib.IMAP4_SSL if self.ssl else imaplib.IMAP4
+        conn = cls(self.host, self.port, timeout=CONNECTOR_TIMEOUT)
+        conn.login(self.user, self.password)
+        self._conn = conn
+        return conn
+
+    def _check(self, typ: str, data: List, what: str) -> List:
+        if typ != "OK":
+            raise SourceError(f"Fonte '{self.name}': {what} falhou: {data}")
+        return data
+
+    def fetch(self, cursor: Optional[Dict[str, Any]]) -> Tuple[List[Dict], Dict[str, Any]]:
+        try:
+            return self._fetch(cursor)
+        except (imaplib.IMAP4.error, OSError) as e:
+            self.close()
+            raise SourceError(f"Fonte '{self.name}': {e}")
+
+    def _fetch(self, cursor: Optional[Dict[str, Any]]) -> Tuple[List[Dict], Dict[str, Any]]:
+        conn = self._connect()
+        self._check(*conn.select(self.mailbox, readonly=True), "SELECT")
+        validity = conn.response("UIDVALIDITY")[1]
+        if not validity or validity[0] is None:
+            raise SourceError(f"Fonte '{self.name}': servidor não informou UIDVALIDITY")
+        uidvalidity = int(validity[-1])
+        last_uid = 0
+        if cursor and cursor.get("uidvalidity") == uidvalidity:
+            last_uid = int(cursor.get("last_uid", 0))
+        elif cursor:
+            print(f"AVISO: UIDVALIDITY da fonte '{self.name}' mudou; relendo a caixa inteira")
+
+        data = self._check(*conn.uid("SEARCH", "UID", f"{last_uid + 1}:*"), "SEARCH")
+        # "N:*" devolve o maior UID existente mesmo quando ele é menor que N
+        uids = sorted(uid for uid in map(int, (data[0] or b"").split()) if uid > last_uid)
+
+        tickets: List[Dict] = []
+        for start in range(0, len(uids), self.page_size):
+            batch = uids[start:start + self.page_size]
+            data = self._check(*conn.uid("FETCH", ",".join(map(str, batch)), "(BODY.PEEK[])"), "FETCH")
+            for item in data:
+                if not isinstance(item, tuple):
+                    continue
+                match = _UID_PATTERN.search(item[0])
+                if match:
+                    tickets.append(self._from_message(int(match.group(1)), item[1]))
+        return tickets, {"uidvalidity": uidvalidity, "last_uid": uids[-1] if uids else last_uid}
+
+    def _from_message(self, uid: int, raw: bytes) -> Dict[str, Any]:
+        """Converte uma mensagem RFC 822 em ticket."""
+        # Parser compat32 com decodificação manual: o policy.default é ~10x mais lento nos cabeçalhos
+        message = message_from_bytes(raw)
+        name, address = parseaddr(_header(message, "From"))
+        try:
+            created_at = parsedate_to_datetime(message["Date"]).isoformat()
+        except (TypeError, ValueError):
+            created_at = None
+        message_id = (message.get("Message-ID") or "").strip()
+        remote_id = hashlib.sha1(message_id.encode()).hexdigest()[:12] if message_id else f"uid{uid}"
+        return self._ticket(remote_id, {
+            "requester": address.lower(),
+            "requester_name": name or address.lower(),
+            "title": _header(message, "Subject").strip() or "(sem assunto)",
+            "description": " ".join(_body_text(message).split()),
+            "created_at": created_at,
+        })
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+            self._conn = None
+
+def _secret(spec: Dict[str, Any], field: str) -> Optional[str]:
+    # Segredos ficam no ambiente: o arquivo guarda só o nome da variável
+    if spec.get(f"{field}_env"):
+        return os.getenv(spec[f"{field}_env"])
+    return spec.get(field)
+
+def source_from_spec(spec: Dict[str, Any]) -> TicketSource:
+    """Cria a fonte descrita por uma entrada de ``sources.json``."""
+    common = {"tenant": spec.get("tenant"), "page_size": int(spec.get("page_size", CONNECTOR_PAGE_SIZE))}
+    if spec["type"] == "helpdesk":
+        return HelpdeskRESTSource(spec["name"], spec["base_url"], queue=spec.get("queue"),
+                                  token=_secret(spec, "token"), **common)
+    if spec["type"] == "imap":
+        return IMAPSource(spec["name"], spec["host"], spec["user"], _secret(spec, "password") or "",
+                          port=spec.get("port"), ssl=bool(spec.get("ssl", True)),
+                          mailbox=spec.get("mailbox", "INBOX"), **common)
+    raise ValueError(f"Tipo de fonte desconhecido: {spec['type']}")
+
+def load_sources(path: Path = SOURCES_PATH) -> List[TicketSource]:
+    """Fontes habilitadas de ``path``; lista vazia quando o arquivo não existe."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    return [source_from_spec(spec) for spec in data.get("sources", []) if spec.get("enabled", True)]
+
+def load_state(path: Path = CONNECTOR_STATE_PATH) -> Dict[str, Dict[str, Any]]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state: Dict[str, Dict[str, Any]], path: Path = CONNECTOR_STATE_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def sync_sources(sources: List[TicketSource], state_path: Path = CONNECTOR_STATE_PATH,
+                 workers: int = CONNECTOR_WORKERS) -> Dict[str, Any]:
+    """Busca as novidades de todas as fontes e grava no armazenamento local.
+
+    Devolve ``fetched`` (tickets recebidos), ``written`` (novos ou alterados
+    no armazenamento), ``errors`` e, por fonte, quantos tickets vieram e em
+    quanto tempo.
+    """
+    state = load_state(state_path)
+    started = time.monotonic()
+
+    def run(source: TicketSource) -> Tuple[List[Dict], Dict[str, Any], float]:
+        t0 = time.monotonic()
+        tickets, cursor = source.fetch(state.get(source.name))
+        return tickets, cursor, time.monotonic() - t0
+
+    tickets: List[Dict] = []
+    cursors: Dict[str, Dict[str, Any]] = {}
+    per_source: Dict[str, Dict[str, Any]] = {}
+    errors = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources) or 1)), thread_name_prefix="sync") as pool:
+        futures = [(source, pool.submit(run, source)) for source in sources]
+        for source, future in futures:
+            try:
+                fetched, cursor, seconds = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"AVISO: Sincronização da fonte '{source.name}' falhou: {e}")
+                per_source[source.name] = {"fetched": 0, "error": str(e)}
+                continue
+            tickets.extend(fetched)
+            cursors[source.name] = cursor
+            per_source[source.name] = {"fetched": len(fetched), "seconds": round(seconds, 3)}
+
+    # Cursores só avançam depois que os tickets estão gravados
+    written = ticket_manager.upsert_tickets(tickets)
+    if cursors:
+        state.update(cursors)
+        save_state(state, state_path)
+    return {"fetched": len(tickets), "written": written, "errors": errors,
+            "seconds": round(time.monotonic() - started, 3), "sources": per_source}
+
+def sync_from_config() -> Optional[Dict[str, Any]]:
+    """Uma rodada com as fontes de ``SOURCES_PATH``; None sem fontes configuradas."""
+    sources = load_sources()
+    if not sources:
+        return None
+    try:
+        return sync_sources(sources)
+    finally:
+        for source in sources:
+            source.close()
+
+class SyncLoop:
+    """Thread que sincroniza as fontes a cada ``interval`` segundos (modo daemon).
+
+    As fontes ficam abertas entre as rodadas, então o pool HTTP e as sessões
+    IMAP são reaproveitados.
+    """
+
+    def __init__(self, sources: List[TicketSource], interval: float = SYNC_INTERVAL_SECONDS):
+        self.sources = sources
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ticket-sync", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                report = sync_sources(self.sources)
+                if report["written"]:
+                    print(f"Sincronização: {report['written']} ticket(s) novo(s) ou alterado(s).")
+            except Exception as e:
+                print(f"ERRO na sincronização de fontes: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "SyncLoop":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=CONNECTOR_TIMEOUT)
+        for source in self.sources:
+            source.close()
@@ -0,0 +1,249 @@
+"""Fila de trabalho em SQLite com leases, para vários processos e hosts.
+
+Cada ticket é uma linha em ``tasks``. Um worker reivindica tickets com um
+lease (dono + validade); enquanto processa, renova o lease periodicamente.
+Leases vencidos (worker morto ou travado) são reivindicados de novo por
+qualquer outro worker, o que dá semântica de pelo menos uma vez: ações do
+playbook podem se repetir para um ticket cujo worker caiu no meio.
+
+O arquivo usa WAL e transações ``BEGIN IMMEDIATE`` para serializar as
+reivindicações. Para vários hosts, o arquivo precisa estar em um
+armazenamento compartilhado com locks POSIX confiáveis (NFS costuma não ter).
+"""
+
+# Imports de bibliotecas padrão para banco local, processos e relógio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import scheduler
+from worker_daemon import ticket_hash
+
+# Validade do lease; o dono renova a cada terço desse tempo
+LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "300"))
+
+# Tentativas antes de marcar o ticket como falho
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    ticket_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    claimed_hash TEXT,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, priority, enqueued_at);
+"""
+
+class WorkQueue:
+    """Operações da fila sobre um arquivo SQLite compartilhado."""
+
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Arquivos criados antes da coluna claimed_hash
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "claimed_hash" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN claimed_hash TEXT")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        # BEGIN IMMEDIATE pega o lock de escrita já no início: duas reivindicações nunca se cruzam
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, tickets: List[Dict[str, Any]]) -> int:
+        """Insere tickets novos e reabre os alterados; devolve quantos foram inseridos ou atualizados.
+
+        Um ticket alterado enquanto está com lease tem o conteúdo atualizado
+        na hora, mas continua com o dono atual; ``complete`` e ``fail``
+        percebem que o hash mudou desde a reivindicação e o devolvem à fila.
+        """
+        now = time.time()
+        rows = [
+            (str(t["id"]), json.dumps(t, ensure_ascii=False), ticket_hash(t),
+             scheduler.PRIORITY_RANK[scheduler.estimate_priority(t)], now, now)
+            for t in tickets
+        ]
+
+        def run(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            # Ticket já conhecido só volta para a fila se o conteúdo mudou; em processamento, mantém o lease
+            conn.executemany(
+                """
+                INSERT INTO tasks (ticket_id, payload, content_hash, priority, enqueued_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ticket_id) DO UPDATE SET
+                    payload = excluded.payload,
+                    content_hash = excluded.content_hash,
+                    priority = excluded.priority,
+                    status = CASE WHEN tasks.status = 'leased' THEN 'leased' ELSE 'pending' END,
+                    attempts = CASE WHEN tasks.status = 'leased' THEN tasks.attempts ELSE 0 END,
+                    updated_at = excluded.updated_at
+                WHERE tasks.content_hash != excluded.content_hash
+                """,
+                rows,
+            )
+            return conn.total_changes - before
+
+        return self._transaction(run)
+
+    def claim(self, owner: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Reivindica até ``limit`` tickets pendentes ou com lease vencido."""
+        now = time.time()
+
+        def run(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+            # Leases vencidos que esgotaram as tentativas não voltam mais para a fila
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'Lease vencido após todas as tentativas', "
+                "lease_owner = NULL, updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                """
+                SELECT ticket_id, payload FROM tasks
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY priority, enqueued_at
+                LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, claimed_hash = content_hash, updated_at = ? WHERE ticket_id = ?",
+                    (owner, now + self.lease_seconds, now, row["ticket_id"]),
+                )
+            return [json.loads(row["payload"]) for row in rows]
+
+        return self._transaction(run)
+
+    def renew(self, ticket_id: Any, owner: str) -> bool:
+        """Estende o lease; False quando o ticket já não pertence a ``owner``."""
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+            "WHERE ticket_id = ? AND lease_owner = ? AND status = 'leased'",
+            (now + self.lease_seconds, now, str(ticket_id), owner),
+        ).rowcount == 1)
+
+    def complete(self, ticket_id: Any, owner: str, result: Dict[str, Any]) -> bool:
+        """Marca como concluído; ignorado se o lease foi perdido para outro worker.
+
+        Se o conteúdo mudou durante o processamento, o ticket volta a pendente
+        para a versão nova ser processada.
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET status = CASE WHEN content_hash != claimed_hash THEN 'pending' ELSE 'done' END, "
+            "attempts = CASE WHEN content_hash != claimed_hash THEN 0 ELSE attempts END, "
+            "result = ?, lease_owner = NULL, updated_at = ? "
+            "WHERE ticket_id = ? AND lease_owner = ? AND status = 'leased'",
+            (json.dumps(result, ensure_ascii=False, default=str), now, str(ticket_id), owner),
+        ).rowcount == 1)
+
+    def fail(self, ticket_id: Any, owner: str, error: str) -> bool:
+        """Devolve o ticket à fila ou o marca como falho após ``max_attempts``.
+
+        Conteúdo alterado durante o processamento volta à fila com as tentativas zeradas.
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET status = CASE WHEN content_hash != claimed_hash THEN 'pending' "
+            "WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "attempts = CASE WHEN content_hash != claimed_hash THEN 0 ELSE attempts END, "
+            "error = ?, lease_owner = NULL, updated_at = ? "
+            "WHERE ticket_id = ? AND lease_owner = ? AND status = 'leased'",
+            (self.max_attempts, error, now, str(ticket_id), owner),
+        ).rowcount == 1)
+
+    def stats(self) -> Dict[str, int]:
+        """Quantidade de tickets por status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def has_open_work(self) -> bool:
+        """Há tickets pendentes ou em processamento (com lease)."""
+        stats = self.stats()
+        return bool(stats.get("pending") or stats.get("leased"))
+
+def run_worker(
+    path: str,
+    handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+    owner: Optional[str] = None,
+    poll_interval: float = 1.0,
+    stop_when_empty: bool = True,
+) -> int:
+    """Reivindica e processa tickets até a fila esvaziar; devolve quantos concluiu.
+
+    Um thread de heartbeat renova o lease do ticket em andamento a cada terço
+    da validade. Com ``stop_when_empty``, o worker sai quando não há
+    pendentes nem leases ativos; caso contrário, espera novos tickets.
+    """
+    queue = WorkQueue(path)
+    owner = owner or f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    current: Dict[str, Any] = {}
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(queue.lease_seconds / 3):
+            ticket_id = current.get("id")
+            if ticket_id is not None and not queue.renew(ticket_id, owner):
+                print(f"AVISO: Lease do ticket #{ticket_id} perdido por {owner}")
+
+    threading.Thread(target=heartbeat, daemon=True, name="lease-heartbeat").start()
+    completed = 0
+    try:
+        while True:
+            claimed = queue.claim(owner)
+            if not claimed:
+                if stop_when_empty and not queue.has_open_work():
+                    return completed
+                time.sleep(poll_interval)
+                continue
+            ticket = claimed[0]
+            current["id"] = ticket["id"]
+            try:
+                result = handler(ticket)
+            except Exception as e:
+                queue.fail(ticket["id"], owner, str(e))
+            else:
+                if queue.complete(ticket["id"], owner, result):
+                    completed += 1
+            finally:
+                current.pop("id", None)
+    finally:
+        stop.set()
+        queue.close()
@@ -0,0 +1,217 @@
+"""Modo daemon: mantém o grafo e os clientes aquecidos e processa tickets conforme chegam.
+
+O daemon observa ``data/tickets.json`` (mtime e tamanho, a cada
+``DAEMON_POLL_SECONDS``) e enfileira no escalonador os tickets abertos novos
+ou alterados, identificados pelo hash do conteúdo. Os hashes já processados
+ficam em ``DAEMON_STATE_PATH`` para sobreviver a reinícios; o arquivo é
+regravado no máximo uma vez por verificação, não a cada ticket. Tickets cujo
+processamento terminou em erro não entram no estado e são tentados de novo
+após ``DAEMON_RETRY_SECONDS``.
+
+SIGTERM/SIGINT param a observação e drenam a fila: tickets em andamento e já
+enfileirados terminam antes da saída. Um segundo sinal descarta os que ainda
+não começaram.
+"""
+
+# Imports de bibliotecas padrão para sinais, threads, hashing e arquivos
+import hashlib
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import scheduler
+from tools import ticket_manager
+
+# Intervalo entre verificações do arquivo de tickets
+POLL_SECONDS = float(os.getenv("DAEMON_POLL_SECONDS", "1.0"))
+
+# Hashes dos tickets já processados (id -> hash do conteúdo)
+STATE_PATH = Path(os.getenv("DAEMON_STATE_PATH", str(Path(__file__).parent / "data" / "daemon_state.json")))
+
+# Espera antes de tentar de novo um ticket cujo processamento terminou em erro
+RETRY_SECONDS = float(os.getenv("DAEMON_RETRY_SECONDS", "60"))
+
+def ticket_hash(ticket: Dict[str, Any]) -> str:
+    """Hash estável do conteúdo do ticket; muda quando qualquer campo muda.
+
+    Os atributos derivados (``features``) ficam de fora: anexá-los não torna
+    o ticket novo.
+    """
+    content = {key: value for key, value in ticket.items() if key != "features"}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+class TicketDaemon:
+    """Observa o armazenamento de tickets e alimenta o escalonador continuamente."""
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any], str], Any],
+        workers: int = 1,
+        urgent_workers: int = 0,
+        poll_interval: float = POLL_SECONDS,
+        state_path: Path = STATE_PATH,
+        retry_seconds: float = RETRY_SECONDS,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.urgent_workers = urgent_workers
+        self.poll_interval = poll_interval
+        self.state_path = Path(state_path)
+        self.retry_seconds = retry_seconds
+        self.queue = scheduler.TicketScheduler()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._processed: Dict[str, str] = self._load_state()
+        self._queued: Dict[str, str] = {}
+        # Tickets que falharam: id -> (hash, instante da próxima tentativa)
+        self._failed: Dict[str, Tuple[str, float]] = {}
+        self._dirty = False
+        self._file_version: Optional[Tuple[int, int]] = None
+        self._stats = {"enqueued": 0, "processed": 0, "failed": 0, "discarded": 0}
+
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"AVISO: Estado do daemon ilegível, reprocessando tickets abertos: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        """Grava o estado se houve tickets concluídos desde a última gravação."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = json.dumps(self._processed)
+        # Grava em arquivo temporário e renomeia para não deixar o estado pela metade
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _file_changed(self) -> bool:
+        try:
+            stat = Path(ticket_manager.DATA_PATH).stat()
+        except FileNotFoundError:
+            return False
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._file_version:
+            return False
+        self._file_version = version
+        return True
+
+    def scan(self) -> int:
+        """Enfileira tickets abertos novos ou alterados; devolve quantos entraram."""
+        now = time.time()
+        with self._lock:
+            retry_due = any(retry_at <= now for _, retry_at in self._failed.values())
+        if not self._file_changed() and not retry_due:
+            return 0
+        try:
+            tickets = ticket_manager.get_open_tickets()
+        except json.JSONDecodeError:
+            # Arquivo no meio de uma gravação: tenta de novo na próxima verificação
+            self._file_version = None
+            return 0
+
+        added = 0
+        with self._lock:
+            # Falhas de tickets que já não estão abertos não são mais tentadas
+            open_keys = {str(ticket["id"]) for ticket in tickets}
+            self._failed = {key: failed for key, failed in self._failed.items() if key in open_keys}
+        for ticket in scheduler.priority_order(tickets):
+            key, digest = str(ticket["id"]), ticket_hash(ticket)
+            with self._lock:
+                if self._processed.get(key) == digest or self._queued.get(key) == digest:
+                    continue
+                failed = self._failed.get(key)
+                if failed is not None and failed[0] == digest and failed[1] > now:
+                    continue
+                self._failed.pop(key, None)
+                self._queued[key] = digest
+            ticket["_detected_at"] = time.time()
+            self.queue.put(ticket)
+            added += 1
+        if added:
+            with self._lock:
+                self._stats["enqueued"] += added
+            print(f"Daemon: {added} ticket(s) novo(s) ou alterado(s) na fila.")
+        return added
+
+    def _handle(self, ticket: Dict[str, Any], priority: str) -> Any:
+        detected_at = ticket.pop("_detected_at", None)
+        key = str(ticket["id"])
+        result = None
+        try:
+            result = self.handler(ticket, priority)
+            return result
+        finally:
+            failed = not isinstance(result, dict) or result.get("final_status") == "Erro"
+            with self._lock:
+                digest = self._queued.pop(key, None)
+                if digest is not None and failed:
+                    # Fica fora do estado para ser tentado de novo, sem repetir a cada verificação
+                    self._failed[key] = (digest, time.time() + self.retry_seconds)
+                elif digest is not None:
+                    self._processed[key] = digest
+                    self._dirty = True
+                self._stats["failed" if failed else "processed"] += 1
+            if detected_at is not None:
+                print(f"Daemon: ticket #{key} concluído {time.time() - detected_at:.1f}s após a detecção.")
+
+    def request_stop(self, signum: Optional[int] = None, frame: Any = None) -> None:
+        """Primeiro pedido drena a fila; o segundo descarta o que não começou."""
+        if not self._stop.is_set():
+            print("Daemon: encerrando após drenar a fila (repita o sinal para descartar pendentes)...")
+            self._stop.set()
+            self.queue.close()
+            return
+        discarded = self.queue.discard_pending()
+        with self._lock:
+            self._stats["discarded"] += discarded
+            # Descartados voltam a ser detectados na próxima execução
+            self._queued.clear()
+        print(f"Daemon: {discarded} ticket(s) pendente(s) descartado(s).")
+
+    def run(self) -> Dict[str, int]:
+        """Executa até receber SIGTERM/SIGINT (ou ``request_stop``) e a fila drenar."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+
+        workers = threading.Thread(
+            target=scheduler.serve,
+            args=(self.queue, self._handle, self.workers, self.urgent_workers),
+            name="ticket-workers",
+            daemon=True,
+        )
+        workers.start()
+        print(f"Daemon: observando {ticket_manager.DATA_PATH} a cada {self.poll_interval}s.")
+
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except OSError as e:
+                print(f"AVISO: Falha ao ler tickets: {e}")
+            try:
+                self._save_state()
+            except OSError as e:
+                print(f"AVISO: Falha ao gravar o estado do daemon: {e}")
+            self._stop.wait(self.poll_interval)
+
+        # Com a fila fechada, os workers saem assim que ela esvazia
+        while workers.is_alive():
+            workers.join(0.5)
+        self._save_state()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "pending": len(self.queue)}